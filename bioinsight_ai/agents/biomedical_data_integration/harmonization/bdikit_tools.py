@@ -1,13 +1,78 @@
 import bdikit as bdi
 import pandas as pd
-from agents.biomedical_data_integration.interaction.tools import set_current_state_user_data, get_current_user_dataframe
+from config import BDI_CHUNK_ROWS, BDI_CHUNK_WORKERS
+from agents.biomedical_data_integration.interaction.tools import (
+    set_current_state_user_data,
+    get_current_user_dataframe,
+    get_matching_dataframe
+)
+from agents.biomedical_data_integration.harmonization.registry import harmonization_registry, DEFAULT_SCHEMA_METHOD
+from agents.biomedical_data_integration.harmonization.match_cache import MatchCache, get_match_cache
+from agents.biomedical_data_integration.harmonization.executor import harmonization_executor
+from agents.biomedical_data_integration.harmonization.compiled_mapping import CompiledMapping
+from agents.biomedical_data_integration.harmonization.chunked import materialize_to_file, output_path
+from agents.biomedical_data_integration.utils.dataset_store import dataset_store
 from agents.biomedical_data_integration.utils.context_keys import (
+    CURRENT_USER_DATA,
     CURRENT_SCHEMA_MATCHES, 
     CURRENT_VALUE_MATCHES, 
-    RANKED_SCHEMA_MATCHES
+    RANKED_SCHEMA_MATCHES,
+    HARMONIZED_OUTPUT,
+    COMPILED_MAPPING
 )
 from llama_index.core.workflow import Context
-from typing import Any, Optional, Dict, List
+from typing import Any, Optional, Dict, List, Tuple
+
+
+async def _match_cache(ctx: Context) -> Tuple[MatchCache, Dict[str, str]]:
+    """Returns the match cache of the current dataset and the content hashes of its columns."""
+    user_data = await ctx.get(CURRENT_USER_DATA)
+    handle = user_data['handle']
+    cache = get_match_cache(dataset_store.dataset_id(handle))
+    column_hashes = cache.cached_column_hashes(handle)
+    if column_hashes is None:
+        source_dataset = await dataset_store.aget_profile(handle)
+        column_hashes = await harmonization_executor.run(
+            ctx, "Hashing dataset columns", cache.column_hashes, handle, source_dataset
+        )
+    return cache, column_hashes
+
+
+def _match_schema_job(source_dataset: pd.DataFrame, target_dataset_path: str, method: str) -> List[Dict[str, Any]]:
+    matcher = harmonization_registry.schema_matcher(method)
+    with harmonization_registry.matcher_lock(matcher):
+        matches = bdi.match_schema(
+            source_dataset,
+            target=harmonization_registry.target(target_dataset_path),
+            method=matcher
+        )
+    return matches.to_dict(orient="records")
+
+
+async def _cached_match_schema(
+    ctx: Context,
+    source_dataset: pd.DataFrame,
+    target_dataset_path: str,
+    method: Optional[str],
+    cache: MatchCache,
+    column_hashes: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    """
+    Schema matches of all source columns. Bipartite matching assigns the columns jointly, so the result is
+    cached for the exact set of columns rather than per column.
+    """
+    method = method or DEFAULT_SCHEMA_METHOD
+    key = (
+        "match_schema", method, harmonization_registry.target_key(target_dataset_path),
+        tuple(column_hashes[column] for column in source_dataset.columns)
+    )
+    response = cache.get(key)
+    if response is None:
+        response = await harmonization_executor.run(
+            ctx, "Generating schema matches", _match_schema_job, source_dataset, target_dataset_path, method
+        )
+        cache.put(key, response)
+    return response
 
 async def match_schema(
     ctx: Context,
@@ -24,16 +89,10 @@ async def match_schema(
         Dictionary with schema matching results
     """
     
-    source_dataset = await get_current_user_dataframe(ctx=ctx)
-
-    if target_dataset_path == "gdc":
-        target_dataset = target_dataset_path
-    else:
-        target_dataset = pd.read_csv(target_dataset_path)
-
-    matches = bdi.match_schema(source_dataset, target=target_dataset, method=method)
+    source_dataset = await get_matching_dataframe(ctx=ctx)
+    cache, column_hashes = await _match_cache(ctx)
 
-    response = matches.to_dict(orient="records")
+    response = await _cached_match_schema(ctx, source_dataset, target_dataset_path, method, cache, column_hashes)
     
     await ctx.set(CURRENT_SCHEMA_MATCHES, response)
     
@@ -69,22 +128,41 @@ async def rank_schema_matches(
         Dictionary with schema matching results
     """
     
-    source_dataset = await get_current_user_dataframe(ctx=ctx)
-
-    if target_dataset_path == "gdc":
-        target_dataset = target_dataset_path
-    else:
-        target_dataset = pd.read_csv(target_dataset_path)
-
-    matches = bdi.rank_schema_matches(
-        source_dataset,
-        target=target_dataset,
-        columns=columns,
-        top_k=top_k,
-        method=method,
-    )
-
-    response = matches.to_dict(orient="records")
+    source_dataset = await get_matching_dataframe(ctx=ctx)
+    cache, column_hashes = await _match_cache(ctx)
+    target_key = harmonization_registry.target_key(target_dataset_path)
+
+    # rankings are per column, only columns without a cached ranking are sent to bdikit
+    columns = columns or list(source_dataset.columns)
+    keys = {column: ("rank_schema_matches", method, target_key, top_k, column_hashes.get(column)) for column in columns}
+    missing = [column for column in columns if column not in column_hashes or cache.get(keys[column]) is None]
+
+    ranked = {}
+    if missing:
+        def rank_job():
+            matcher = harmonization_registry.schema_matcher(method)
+            with harmonization_registry.matcher_lock(matcher):
+                matches = bdi.rank_schema_matches(
+                    source_dataset,
+                    target=harmonization_registry.target(target_dataset_path),
+                    columns=missing,
+                    top_k=top_k,
+                    method=matcher,
+                )
+            return matches.to_dict(orient="records")
+
+        records = await harmonization_executor.run(ctx, "Ranking schema matches", rank_job)
+        for record in records:
+            ranked.setdefault(record["source"], []).append(record)
+        for column in missing:
+            if column in column_hashes:
+                cache.put(keys[column], ranked.get(column, []))
+
+    response = [
+        record
+        for column in columns
+        for record in (ranked.get(column, []) if column in missing else cache.get(keys[column]))
+    ]
     
     await ctx.set(RANKED_SCHEMA_MATCHES, response)
 
@@ -113,30 +191,51 @@ async def match_values(
                     the required 'source' and 'target' columns.
     """
 
-    source_dataset = await get_current_user_dataframe(ctx=ctx)
+    source_dataset = await get_matching_dataframe(ctx=ctx)
+    cache, column_hashes = await _match_cache(ctx)
     
     attribute_matches = await ctx.get(CURRENT_SCHEMA_MATCHES, None)
 
-    if target_dataset_path == "gdc":
-        target_dataset = target_dataset_path
-    else:
-        target_dataset = pd.read_csv(target_dataset_path)
-
     if attribute_matches is None:
-        attribute_matches = bdi.match_schema(
-            source_dataset,
-            target=target_dataset,
+        attribute_matches = await _cached_match_schema(
+            ctx, source_dataset, target_dataset_path, None, cache, column_hashes
         )
 
+    # value matches are per attribute pair, only pairs without cached matches are sent to bdikit
+    target_key = harmonization_registry.target_key(target_dataset_path)
     df_matches = pd.DataFrame(attribute_matches)
-    matches = bdi.match_values(
-        source_dataset,
-        target_dataset,
-        df_matches,
-        method=method,
-    )
-
-    response = matches.to_dict(orient="records")
+    pairs = list(zip(df_matches["source"], df_matches["target"]))
+    keys = [("match_values", method, target_key, column_hashes.get(source), target) for source, target in pairs]
+    is_missing = [source not in column_hashes or cache.get(key) is None for (source, _), key in zip(pairs, keys)]
+
+    matched = {}
+    if any(is_missing):
+        def match_values_job():
+            matcher = harmonization_registry.value_matcher(method)
+            with harmonization_registry.matcher_lock(matcher):
+                return bdi.match_values(
+                    source_dataset,
+                    harmonization_registry.target(target_dataset_path),
+                    df_matches[is_missing],
+                    method=matcher,
+                )
+
+        matches = await harmonization_executor.run(ctx, "Generating value matches", match_values_job)
+        for record in matches.to_dict(orient="records"):
+            pair = (record.get("source_attribute"), record.get("target_attribute"))
+            matched.setdefault(pair, []).append(record)
+        # results that cannot be attributed to a pair are returned without caching
+        if {"source_attribute", "target_attribute"}.issubset(matches.columns):
+            for pair, key, missing in zip(pairs, keys, is_missing):
+                if missing and pair[0] in column_hashes:
+                    cache.put(key, matched.get(pair, []))
+
+    response = []
+    for pair, key, missing in zip(pairs, keys, is_missing):
+        response.extend(matched.pop(pair, []) if missing else cache.get(key))
+    # records not attributed to a requested pair
+    for records in matched.values():
+        response.extend(records)
     
     await ctx.set(CURRENT_VALUE_MATCHES, response)
 
@@ -172,32 +271,106 @@ async def rank_value_matches(
     Returns:
         Dictionary with value matching results
     """
-    source_dataset = await get_current_user_dataframe(ctx=ctx)
-
-    if target_dataset_path == "gdc":
-        target_dataset = target_dataset_path
-    else:
-        target_dataset = pd.read_csv(target_dataset_path)
+    source_dataset = await get_matching_dataframe(ctx=ctx)
 
     if attribute_matches is None:
-        attribute_matches = bdi.match_schema(
-            source_dataset,
-            target=target_dataset,
+        attribute_matches = await harmonization_executor.run(
+            ctx, "Generating schema matches", _match_schema_job, source_dataset, target_dataset_path,
+            DEFAULT_SCHEMA_METHOD
         )
 
     if not isinstance(attribute_matches, list) or len(attribute_matches) != 2:
         raise ValueError("attribute_matches must be a list of two strings: [source_attribute, target_attribute]")
 
     source_attr, target_attr = attribute_matches
-    matches = bdi.rank_value_matches(
-        source_dataset,
-        target_dataset,
-        (source_attr, target_attr),
-        top_k=top_k,
-        method=method,
+    cache, column_hashes = await _match_cache(ctx)
+    key = ("rank_value_matches", method, harmonization_registry.target_key(target_dataset_path), top_k,
+           column_hashes.get(source_attr), target_attr)
+    response = cache.get(key) if source_attr in column_hashes else None
+    if response is None:
+        def rank_values_job():
+            matcher = harmonization_registry.value_matcher(method)
+            with harmonization_registry.matcher_lock(matcher):
+                matches = bdi.rank_value_matches(
+                    source_dataset,
+                    harmonization_registry.target(target_dataset_path),
+                    (source_attr, target_attr),
+                    top_k=top_k,
+                    method=matcher,
+                )
+            return matches.to_dict(orient="records")
+
+        response = await harmonization_executor.run(ctx, "Ranking value matches", rank_values_job)
+        if source_attr in column_hashes:
+            cache.put(key, response)
+
+    return response
+
+
+async def _materialize_in_chunks(ctx: Context, user_data: Dict[str, Any], mapping: CompiledMapping) -> Dict[str, Any]:
+    """
+    Harmonizes a large dataset in row batches, read from the stored version, into a compressed file read by
+    return_data_to_user.
+    """
+    metadata = user_data['metadata']
+    chunks = dataset_store.iter_chunks(user_data['handle'], BDI_CHUNK_ROWS)
+
+    progress = {"rows": 0}
+    summary = await harmonization_executor.run(
+        ctx,
+        "Harmonizing user dataset",
+        materialize_to_file,
+        chunks,
+        mapping.apply,
+        output_path(metadata['name'], compress=True),
+        BDI_CHUNK_WORKERS,
+        progress,
+        status=lambda: f"{progress['rows']:,} of {user_data['num_rows']:,} rows"
     )
+    await ctx.set(HARMONIZED_OUTPUT, {
+        'handle': user_data['handle'],
+        'path': summary['path'],
+        'num_rows': summary['num_rows'],
+        'columns': summary['columns']
+    })
+
+    return {
+        "message": (
+            f"Data successfully harmonized ({summary['num_rows']} rows). The dataset is too large to show in full, "
+            "use return_data_to_user to give the user the harmonized file."
+        ),
+        "columns": summary['columns'],
+        "preview": summary['preview'],
+    }
 
-    response = matches.to_dict(orient="records")
+
+async def _materialize(ctx: Context, mapping: CompiledMapping) -> Dict[str, Any]:
+    """
+    Applies a compiled mapping to the current user data and stores the result as its new state. Large datasets are
+    harmonized in row batches into a file instead.
+    """
+    user_data = await ctx.get(CURRENT_USER_DATA)
+
+    try:
+        if user_data.get('chunked'):
+            return await _materialize_in_chunks(ctx, user_data, mapping)
+
+        source_dataset = await get_current_user_dataframe(ctx=ctx)
+
+        def materialize_job():
+            materialized = mapping.apply(source_dataset)
+            return materialized, materialized.to_dict(orient="records")
+
+        materialized_data, records = await harmonization_executor.run(ctx, "Harmonizing user dataset", materialize_job)
+    except Exception as e:
+        raise RuntimeError(f"Failed to materialize data due to: {str(e)}")
+
+    response = {
+        "message": "Data successfully harmonized.",
+        "data": records,
+    }
+    
+    await set_current_state_user_data(ctx=ctx, data=materialized_data)
 
     return response
 
@@ -207,41 +380,46 @@ async def materialize_mapping(
 ) -> Dict[str, Any]:
     """
     Harmonizes the source dataset using a mapping specification that may include
-    column mappings, value mappings, or both.
+    column mappings, value mappings, or both. The mapping is compiled and kept, see apply_saved_mapping.
 
     Returns:
-        A dictionary with a success message and the harmonized dataset as a list of records.
+        A dictionary with a success message and the harmonized dataset as a list of records. For datasets with more
+        than BDI_CHUNKED_MIN_ROWS rows, the columns and first rows of the harmonized dataset instead.
 
     Raises:
-        ValueError: If the mapping_spec is not in a supported format or is missing required fields.
+        RuntimeError: If there are no schema or value matches, or the mapping cannot be applied.
     """
     
-    source_dataset = await get_current_user_dataframe(ctx=ctx)
-    
     schema_mapping = await ctx.get(CURRENT_SCHEMA_MATCHES, None)
     value_mapping = await ctx.get(CURRENT_VALUE_MATCHES, None)
-    
-    schema_mapping = pd.DataFrame(schema_mapping)
-    value_mapping = pd.DataFrame(value_mapping)
 
-    try:
-        if not schema_mapping.empty and value_mapping.empty:
-            materialized_data = bdi.materialize_mapping(source_dataset, schema_mapping)
-        elif not value_mapping.empty:
-            materialized_data = bdi.materialize_mapping(source_dataset, value_mapping)
-        else:
-            raise ValueError("No valid mapping provided for materialization.")
-    except Exception as e:
-        raise RuntimeError(f"Failed to materialize data due to: {str(e)}")
-            
+    if not schema_mapping and not value_mapping:
+        raise RuntimeError("Failed to materialize data due to: No valid mapping provided for materialization.")
 
-    response = {
-        "message": "Data successfully harmonized.",
-        "data": materialized_data.to_dict(orient="records"),
-    }
-    
-    await set_current_state_user_data(ctx=ctx, data=response["data"])
+    mapping = CompiledMapping.compile(schema_mapping, value_mapping)
+    await ctx.set(COMPILED_MAPPING, mapping.to_dict())
 
-    return response
+    return await _materialize(ctx, mapping)
+
+
+async def apply_saved_mapping(
+    ctx: Context,
+) -> Dict[str, Any]:
+    """
+    Harmonizes the current user data with the mapping of the last materialize_mapping call, without matching again.
+    Use this when the user uploads another file to harmonize the same way as an earlier one.
+
+    Returns:
+        A dictionary with a success message and the harmonized dataset as a list of records (or its columns and
+        first rows for large datasets).
+
+    Raises:
+        RuntimeError: If no mapping was materialized yet, or the mapping does not fit the current data.
+    """
+    saved_mapping = await ctx.get(COMPILED_MAPPING, None)
+    if saved_mapping is None:
+        raise RuntimeError("No saved mapping, harmonize a dataset with materialize_mapping first.")
+
+    return await _materialize(ctx, CompiledMapping.from_dict(saved_mapping))
 
-bdi_tools = [match_schema, rank_schema_matches, match_values, rank_value_matches, materialize_mapping]
+bdi_tools = [match_schema, rank_schema_matches, match_values, rank_value_matches, materialize_mapping, apply_saved_mapping]
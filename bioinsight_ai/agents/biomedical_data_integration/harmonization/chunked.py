@@ -0,0 +1,162 @@
+import gzip
+import logging
+import os
+import re
+import tempfile
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import pandas as pd
+from config import BDI_S3_UPLOAD_MIN_BYTES
+from storage.presigned_s3_client import current_s3_client
+
+logger = logging.getLogger()
+
+#
+# Bounded-memory handling of large datasets. Uploads with more than BDI_CHUNKED_MIN_ROWS rows are streamed from the
+# uploaded file into the dataset store in row batches (see DatasetStore.aput_chunks), the mapping is applied to row
+# batches of the stored version, and the results are appended to a gzip compressed CSV file, so neither the table nor
+# its records are held in memory as a whole. Large result files are uploaded to S3 and returned as a download link.
+#
+
+OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "bdi_harmonized")
+# Rows of a large dataset returned to the LLM
+PREVIEW_ROWS = 10
+# Uploads that can be read in row batches. Spreadsheets are loaded with pd.read_excel (a sheet has at most 1,048,576
+# rows) and stored in batches from the loaded table.
+DELIMITED_EXTS = ("csv", "tsv", "txt")
+
+INTEGER = re.compile(r"[+-]?\d+")
+
+
+def output_path(file_name: str, compress: bool) -> str:
+    """New path for a harmonized file, named after the uploaded file: harmonized_<name>.csv(.gz)"""
+    base = os.path.splitext(os.path.basename(file_name))[0]
+    directory = os.path.join(OUTPUT_DIR, uuid.uuid4().hex[:8])
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"harmonized_{base}.csv" + (".gz" if compress else ""))
+
+
+def _read_delimited(path: str, ext: str, chunk_rows: int, dtype: Any):
+    if ext in ("csv", "tsv"):
+        return pd.read_csv(path, sep="," if ext == "csv" else "\t", dtype=dtype, chunksize=chunk_rows)
+    if ext == "txt":
+        return pd.read_csv(path, sep=None, engine="python", dtype=dtype, chunksize=chunk_rows)
+    raise ValueError(f"Unsupported file type for batched reads: {ext}")
+
+
+def scan_file(path: str, ext: str, chunk_rows: int) -> Tuple[int, Dict[str, Any]]:
+    """
+    Reads a delimited file in row batches as text and returns its number of rows and column types, decided over the
+    whole file rather than per batch: int64 for integer columns without missing values, float64 for other numeric
+    columns, object (str) otherwise.
+
+    Args:
+        path: Path of the uploaded file.
+        ext: File extension, one of DELIMITED_EXTS.
+        chunk_rows: Rows per batch.
+    """
+    num_rows, numeric, integer, missing = 0, {}, {}, {}
+    with _read_delimited(path, ext, chunk_rows, str) as reader:
+        for chunk in reader:
+            num_rows += len(chunk)
+            for column in chunk.columns:
+                values = chunk[column].dropna()
+                numeric[column] = numeric.get(column, True) and pd.to_numeric(values, errors="coerce").notna().all()
+                integer[column] = integer.get(column, True) and values.str.fullmatch(INTEGER).all()
+                missing[column] = missing.get(column, False) or len(values) < len(chunk)
+    dtypes = {
+        column: ("int64" if integer[column] and not missing[column] else "float64") if numeric[column] else object
+        for column in numeric
+    }
+    return num_rows, dtypes
+
+
+def iter_file_chunks(path: str, ext: str, chunk_rows: int, dtypes: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+    """
+    Reads an uploaded delimited file in row batches.
+
+    Args:
+        path: Path of the uploaded file.
+        ext: File extension, one of DELIMITED_EXTS.
+        chunk_rows: Rows per batch.
+        dtypes: Column types (see scan_file), so all batches have the same types.
+    """
+    dtype = {column: str if dtype == object else dtype for column, dtype in dtypes.items()}
+    with _read_delimited(path, ext, chunk_rows, dtype) as reader:
+        yield from reader
+
+
+def iter_frame_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def materialize_to_file(
+    chunks: Iterator[pd.DataFrame],
+    materialize: Callable[[pd.DataFrame], pd.DataFrame],
+    path: str,
+    workers: int = 1,
+    progress: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    """
+    Applies `materialize` to each batch and appends the results, in order, to a CSV file (gzip compressed if the
+    path ends with .gz). Up to `workers` batches are materialized in parallel, and at most one more is read ahead.
+
+    Args:
+        chunks: Row batches of the source data.
+        materialize: Function harmonizing one batch.
+        path: Output file.
+        workers: Batches materialized in parallel.
+        progress: Optional dictionary, its 'rows' entry is updated with the number of rows written.
+
+    Returns:
+        The path, number of rows, columns and the first rows of the harmonized data.
+    """
+    summary = {"path": path, "num_rows": 0, "columns": None, "preview": []}
+    opener = (lambda: gzip.open(path, "wt", newline="", compresslevel=6)) if path.endswith(".gz") else \
+        (lambda: open(path, "w", newline=""))
+
+    def write(f, harmonized: pd.DataFrame) -> None:
+        if summary["columns"] is None:
+            summary["columns"] = [str(column) for column in harmonized.columns]
+        harmonized.to_csv(f, header=summary["num_rows"] == 0, index=False)
+        if len(summary["preview"]) < PREVIEW_ROWS:
+            summary["preview"].extend(harmonized.head(PREVIEW_ROWS - len(summary["preview"])).to_dict(orient="records"))
+        summary["num_rows"] += len(harmonized)
+        if progress is not None:
+            progress["rows"] = summary["num_rows"]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="harmonization-chunk") as pool, opener() as f:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(materialize, chunk))
+            if len(in_flight) > workers:
+                write(f, in_flight.popleft().result())
+        while in_flight:
+            write(f, in_flight.popleft().result())
+
+    logger.info(f"[BDI] Wrote {summary['num_rows']} harmonized rows to {path}")
+    return summary
+
+
+async def publish(path: str) -> Dict[str, str]:
+    """
+    Makes a harmonized file available for download: files of at least BDI_S3_UPLOAD_MIN_BYTES are uploaded to S3
+    with the session's storage client (boto3 uploads large files in parts) and returned as {'url': ...}, smaller
+    files, or any file when no client is set, as {'path': ...}.
+    """
+    storage_client = current_s3_client.get()
+    if storage_client is None or os.path.getsize(path) < BDI_S3_UPLOAD_MIN_BYTES:
+        return {"path": path}
+    try:
+        upload = await storage_client.upload_file(
+            file_path=path,
+            object_key=f"bdi/{uuid.uuid4().hex[:8]}_{os.path.basename(path)}",
+            mime="application/gzip" if path.endswith(".gz") else "text/csv"
+        )
+        return {"url": upload["url"]}
+    except Exception as e:
+        logger.exception(f"[BDI] Upload of {path} failed, returning the local file: {e}")
+        return {"path": path}
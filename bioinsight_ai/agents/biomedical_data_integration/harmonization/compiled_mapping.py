@@ -0,0 +1,110 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+class CompiledMapping:
+    """
+    Accepted schema and value matches compiled into lookup tables that are applied with vectorized pandas operations.
+
+    Each output column is a renamed source column, and value mapped columns are recoded through a hash map from
+    source value to target value. The recode table is built over the distinct values of the column (pd.factorize)
+    and taken by code, so the lookup runs once per distinct value instead of once per row. Values without an
+    accepted match are kept as they are.
+
+    A compiled mapping is plain JSON (see to_dict), so a validated mapping can be applied to other files without
+    matching again.
+
+    Fields:
+    - columns: (source column, target column) pairs, in output order.
+    - values: Target column -> {source value as str -> target value}.
+    """
+
+    VERSION = 1
+
+    def __init__(self, columns: List[Tuple[str, str]], values: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.columns = columns
+        self.values = values or {}
+
+    @classmethod
+    def compile(
+        cls,
+        schema_matches: Optional[List[Dict[str, Any]]] = None,
+        value_matches: Optional[List[Dict[str, Any]]] = None
+    ) -> "CompiledMapping":
+        """
+        Args:
+            schema_matches: Records with 'source' and 'target' columns (current_schema_matches).
+            value_matches: Records with 'source_attribute', 'target_attribute', 'source_value' and 'target_value'
+                (current_value_matches).
+        """
+        columns, targets = [], set()
+
+        def add_column(source, target):
+            # a target column is filled from the first source matched to it
+            if source is not None and target is not None and str(target) not in targets:
+                targets.add(str(target))
+                columns.append((str(source), str(target)))
+
+        for match in schema_matches or []:
+            add_column(match.get("source"), match.get("target"))
+
+        values = {}
+        for match in value_matches or []:
+            add_column(match.get("source_attribute"), match.get("target_attribute"))
+            target_value = match.get("target_value")
+            if target_value is None or (isinstance(target_value, float) and np.isnan(target_value)):
+                continue
+            # value matches of a source that did not get the target column do not apply to the one that did
+            if (str(match.get("source_attribute")), str(match.get("target_attribute"))) not in columns:
+                continue
+            table = values.setdefault(str(match.get("target_attribute")), {})
+            table.setdefault(str(match.get("source_value")), target_value)
+
+        return cls(columns, values)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the harmonized DataFrame: the mapped columns, renamed and with their values recoded."""
+        by_name = {str(column): column for column in df.columns}
+        missing = [source for source, _ in self.columns if source not in by_name]
+        if missing:
+            raise ValueError(f"Mapped source columns not in the dataset: {missing}")
+
+        harmonized = {}
+        for source, target in self.columns:
+            column = df[by_name[source]]
+            table = self.values.get(target)
+            harmonized[target] = self._recode(column, table) if table else column
+        return pd.DataFrame(harmonized, index=df.index)
+
+    @staticmethod
+    def _recode(column: pd.Series, table: Dict[str, Any]) -> pd.Series:
+        codes, uniques = pd.factorize(column)
+        recoded = np.empty(len(uniques), dtype=object)
+        recoded[:] = [table.get(str(value), value) for value in uniques]
+        # missing values have code -1 and stay missing
+        values = pd.api.extensions.take(recoded, codes, allow_fill=True, fill_value=np.nan)
+        return pd.Series(values, index=column.index, name=column.name).infer_objects()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.VERSION,
+            "columns": [[source, target] for source, target in self.columns],
+            "values": self.values,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompiledMapping":
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported mapping version: {data.get('version')}")
+        return cls([tuple(pair) for pair in data["columns"]], data.get("values"))
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledMapping":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
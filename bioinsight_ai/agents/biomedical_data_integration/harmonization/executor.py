@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from llama_index.core.workflow import Context
+from agents.biomedical_data_integration.interaction.progress_event import HarmonizationProgressEvent
+from config import BDI_MAX_CONCURRENT_JOBS, BDI_PROGRESS_INTERVAL_S
+
+logger = logging.getLogger()
+
+
+class HarmonizationExecutor:
+    """
+    Runs bdikit jobs (model inference, value matching, materialization) in a dedicated, bounded thread pool.
+
+    The jobs are CPU bound and would block the event loop, and with it every other chat session, if run in the tool
+    functions directly. Torch and pandas release the GIL for the heavy work, so threads share the resident matchers of
+    the registry instead of loading a model per process. Jobs beyond `max_workers` wait for a free worker; the default
+    executor used for file and store I/O is not affected. While a job waits or runs, progress events are written to
+    the tool's workflow stream.
+    """
+
+    def __init__(self, max_workers: int, progress_interval_s: float):
+        self.max_workers = max_workers
+        self.progress_interval_s = progress_interval_s
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="harmonization")
+        # jobs submitted and not finished, only updated on the event loop
+        self._pending = 0
+
+    @staticmethod
+    def _progress(ctx: Optional[Context], message: str) -> None:
+        if ctx is not None:
+            ctx.write_event_to_stream(HarmonizationProgressEvent(message=message))
+
+    async def run(
+        self,
+        ctx: Optional[Context],
+        label: str,
+        fn: Callable[..., Any],
+        *args,
+        status: Optional[Callable[[], str]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` in the pool and returns its result.
+
+        Args:
+            ctx: Workflow context of the calling tool, progress events are written to its stream. None for no events.
+            label: Description of the job shown in the UI, e.g. "Generating schema matches".
+            fn: The blocking function. It must not use `ctx`, which is not thread safe.
+            status: Optional function describing how far the job got (e.g. rows processed), added to progress events.
+        """
+        start = time.time()
+        started = {}
+
+        def job():
+            started["at"] = time.time()
+            return fn(*args, **kwargs)
+
+        if self._pending >= self.max_workers:
+            self._progress(ctx, f"{label}: waiting for other harmonization jobs to finish...")
+        self._pending += 1
+        future = asyncio.wrap_future(self._pool.submit(job))
+        future.add_done_callback(self._job_done)
+
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=self.progress_interval_s)
+            if done:
+                break
+            if "at" in started:
+                elapsed = f"{time.time() - started['at']:.0f}s"
+                self._progress(ctx, f"{label}... ({elapsed}, {status()})" if status else f"{label}... ({elapsed})")
+
+        result = future.result()
+        queued = started["at"] - start
+        logger.info(f"[TIMER] {label} took {time.time() - start:.2f}s ({queued:.2f}s waiting for a worker)")
+        return result
+
+    def _job_done(self, _future: asyncio.Future) -> None:
+        self._pending -= 1
+
+
+harmonization_executor = HarmonizationExecutor(
+    max_workers=BDI_MAX_CONCURRENT_JOBS,
+    progress_interval_s=BDI_PROGRESS_INTERVAL_S
+)
@@ -0,0 +1,65 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+import pandas as pd
+
+# Datasets (uploads) whose match results are kept
+MAX_CACHED_DATASETS = 32
+
+
+class MatchCache:
+    """
+    bdikit results for one uploaded dataset, keyed by the content hash of the source columns involved.
+
+    Harmonization refines matches interactively (match, rank a few columns, apply feedback, match values), so the
+    same columns are matched repeatedly. Results that bdikit computes per column (rankings, value matches) are cached
+    per column, and only new or changed columns are sent to bdikit again. Since the hash covers the column name and
+    values, entries stay valid across dataset versions that leave a column unchanged.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, List[Dict[str, Any]]] = {}
+        # dataset version handle -> column name -> content hash
+        self._column_hashes: Dict[str, Dict[str, str]] = {}
+
+    def cached_column_hashes(self, handle: str) -> Optional[Dict[str, str]]:
+        """The column hashes of a dataset version if they were computed already, else None."""
+        return self._column_hashes.get(handle)
+
+    def column_hashes(self, handle: str, df: pd.DataFrame) -> Dict[str, str]:
+        """Content hash of every column of a dataset version. Hashes the whole dataset, run it off the event loop."""
+        if handle not in self._column_hashes:
+            self._column_hashes[handle] = {
+                column: hashlib.sha256(
+                    str(column).encode() + pd.util.hash_pandas_object(df[column], index=False).values.tobytes()
+                ).hexdigest()
+                for column in df.columns
+            }
+        return self._column_hashes[handle]
+
+    def get(self, key: Hashable) -> Optional[List[Dict[str, Any]]]:
+        """Returns a copy of the cached records, callers may edit it (e.g. feedback applied to the current matches)."""
+        records = self._entries.get(key)
+        return copy.deepcopy(records) if records is not None else None
+
+    def put(self, key: Hashable, records: List[Dict[str, Any]]) -> None:
+        """Caches a copy of the records, so later edits of the caller's records don't reach the cache."""
+        self._entries[key] = copy.deepcopy(records)
+
+
+_caches: OrderedDict[str, MatchCache] = OrderedDict()
+_caches_lock = threading.Lock()
+
+
+def get_match_cache(dataset_id: str) -> MatchCache:
+    """Returns the match cache of an uploaded dataset, evicting the least recently used datasets."""
+    with _caches_lock:
+        cache = _caches.get(dataset_id)
+        if cache is None:
+            cache = _caches[dataset_id] = MatchCache()
+        _caches.move_to_end(dataset_id)
+        while len(_caches) > MAX_CACHED_DATASETS:
+            _caches.popitem(last=False)
+        return cache
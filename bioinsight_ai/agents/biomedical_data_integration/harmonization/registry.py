@@ -0,0 +1,125 @@
+import contextlib
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+import pandas as pd
+import bdikit as bdi
+
+logger = logging.getLogger()
+
+DEFAULT_SCHEMA_METHOD = "magneto_ft_bp"
+DEFAULT_VALUE_METHOD = "tfidf"
+# Standard vocabularies bdikit resolves by name
+STANDARD_TARGETS = {"gdc"}
+# Parsed custom target schemas kept in memory
+MAX_CACHED_TARGETS = 16
+
+
+class HarmonizationRegistry:
+    """
+    Process-wide registry of bdikit matchers and target schemas.
+
+    bdikit builds a new matcher (and loads its model weights) for every call given a method name. The registry builds
+    each matcher once and hands the instance to bdikit instead, and caches parsed custom target schemas by the hash of
+    their file content, so a changed file at the same path is parsed again.
+    """
+
+    def __init__(self, max_cached_targets: int):
+        self.max_cached_targets = max_cached_targets
+        self._lock = threading.Lock()
+        self._schema_matchers = {}
+        self._value_matchers = {}
+        self._matcher_locks = {}
+        self._targets: OrderedDict[str, pd.DataFrame] = OrderedDict()
+
+    def schema_matcher(self, method: str = DEFAULT_SCHEMA_METHOD):
+        """Returns the resident schema matcher for a bdikit method name, or the name if it cannot be built."""
+        method = method or DEFAULT_SCHEMA_METHOD
+        with self._lock:
+            if method not in self._schema_matchers:
+                self._schema_matchers[method] = self._build("schema", method)
+            return self._schema_matchers[method]
+
+    def value_matcher(self, method: str = DEFAULT_VALUE_METHOD):
+        """Returns the resident value matcher for a bdikit method name, or the name if it cannot be built."""
+        method = method or DEFAULT_VALUE_METHOD
+        with self._lock:
+            if method not in self._value_matchers:
+                self._value_matchers[method] = self._build("value", method)
+            return self._value_matchers[method]
+
+    def matcher_lock(self, matcher):
+        """
+        Lock to hold while calling bdikit with a resident matcher. The instance (model, embeddings it caches) is
+        shared by all sessions and not safe to use from several threads at once.
+        """
+        if isinstance(matcher, str):
+            # bdikit builds a new matcher for the call
+            return contextlib.nullcontext()
+        with self._lock:
+            return self._matcher_locks.setdefault(id(matcher), threading.Lock())
+
+    @staticmethod
+    def _build(kind: str, method: str):
+        start = time.time()
+        try:
+            if kind == "schema":
+                from bdikit.schema_matching.matcher_factory import get_schema_matcher as get_matcher
+            else:
+                from bdikit.value_matching.matcher_factory import get_value_matcher as get_matcher
+            matcher = get_matcher(method)
+        except Exception as e:
+            # unknown method or bdikit version without matcher factories, bdikit builds the matcher per call
+            logger.warning(f"[HarmonizationRegistry] Could not preload {kind} matcher '{method}': {e}")
+            return method
+        logger.info(f"[TIMER] Loaded {kind} matcher '{method}' in {time.time() - start:.2f}s")
+        return matcher
+
+    def target_key(self, target_dataset_path: str) -> str:
+        """Identifies a target schema by content: the standard vocabulary name or the hash of the file."""
+        if target_dataset_path in STANDARD_TARGETS:
+            return target_dataset_path
+        with open(target_dataset_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def target(self, target_dataset_path: str) -> Union[str, pd.DataFrame]:
+        """Returns a standard vocabulary name as is, or the parsed custom target schema at the given path."""
+        if target_dataset_path in STANDARD_TARGETS:
+            return target_dataset_path
+        digest = self.target_key(target_dataset_path)
+        with self._lock:
+            target = self._targets.get(digest)
+            if target is not None:
+                self._targets.move_to_end(digest)
+                return target
+        target = pd.read_csv(target_dataset_path)
+        with self._lock:
+            self._targets[digest] = target
+            while len(self._targets) > self.max_cached_targets:
+                self._targets.popitem(last=False)
+        return target
+
+    def warmup(self) -> None:
+        """
+        Loads the default matchers and runs a small match against the GDC schema, so the model weights are resident
+        and the GDC schema is loaded (and any embeddings the matcher caches are built) before the first user request.
+        """
+        start = time.time()
+        try:
+            source = pd.DataFrame({"gender": ["female", "male"], "age_at_diagnosis": [25, 30]})
+            matcher = self.schema_matcher()
+            with self.matcher_lock(matcher):
+                bdi.match_schema(source, target="gdc", method=matcher)
+            self.value_matcher()
+            logger.info(f"[TIMER] Harmonization registry warmed up in {time.time() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"[HarmonizationRegistry] Warmup failed: {e}")
+
+    def warmup_in_background(self) -> None:
+        threading.Thread(target=self.warmup, name="harmonization-warmup", daemon=True).start()
+
+
+harmonization_registry = HarmonizationRegistry(max_cached_targets=MAX_CACHED_TARGETS)
@@ -0,0 +1,7 @@
+from llama_index.core.workflow import Event
+
+
+class HarmonizationProgressEvent(Event):
+    """Progress of a long running harmonization job, shown in the UI while the job runs."""
+
+    message: str
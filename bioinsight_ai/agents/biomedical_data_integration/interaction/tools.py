@@ -4,7 +4,9 @@ from workflow_config.default_settings import Settings
 llm = Settings.llm
 
 import sys
+import os
 import json
+import asyncio
 import logging
 import pandas as pd
 import openpyxl
@@ -14,22 +16,54 @@ import chainlit.types as cl_types
 from llama_index.core.workflow import Context, HumanResponseEvent
 from agents.biomedical_data_integration.interaction.chainlit_interaction_event import ChainlitInteractionEvent
 from agents.biomedical_data_integration.prompts.templates import MATCH_PROMPT_TEMPLATE
+from agents.biomedical_data_integration.utils.dataset_store import dataset_store
+from agents.biomedical_data_integration.harmonization.chunked import (
+    DELIMITED_EXTS,
+    PREVIEW_ROWS,
+    iter_file_chunks,
+    iter_frame_chunks,
+    materialize_to_file,
+    output_path,
+    publish,
+    scan_file
+)
+from agents.biomedical_data_integration.harmonization.compiled_mapping import CompiledMapping
+from agents.biomedical_data_integration.harmonization.executor import harmonization_executor
+from config import BDI_CHUNKED_MIN_ROWS, BDI_CHUNK_ROWS
 from agents.biomedical_data_integration.utils.context_keys import (
     CURRENT_USER_DATA, 
     CURRENT_SCHEMA_MATCHES, 
     CURRENT_VALUE_MATCHES, 
-    RANKED_SCHEMA_MATCHES
+    RANKED_SCHEMA_MATCHES,
+    HARMONIZED_OUTPUT,
+    COMPILED_MAPPING
     )
 
 logger = logging.getLogger()
 
 
 async def get_current_user_dataframe(ctx: Context) -> pd.DataFrame:
-    """Returns current state of user data as a DataFrame object."""
-    data = await get_current_state_user_data(ctx=ctx)
-    return pd.DataFrame(data['data'])
+    """
+    Returns current state of user data as a DataFrame object. The DataFrame is shared, do not modify it.
+
+    Raises:
+        ValueError: For datasets with more than BDI_CHUNKED_MIN_ROWS rows, which are only read in row batches.
+    """
+    user_data = await ctx.get(CURRENT_USER_DATA)
+    if user_data.get('chunked'):
+        raise ValueError(f"The user data has {user_data['num_rows']} rows, too many to load as a whole.")
+    return await dataset_store.aget(user_data['handle'])
+
+
+async def get_matching_dataframe(ctx: Context) -> pd.DataFrame:
+    """
+    Returns the current user data as used for schema and value matching: the data itself, or for large datasets its
+    profile (see DatasetStore.aget_profile). The DataFrame is shared, do not modify it.
+    """
+    user_data = await ctx.get(CURRENT_USER_DATA)
+    return await dataset_store.aget_profile(user_data['handle'])
 
-def read_uploaded_data(user_file_response: cl_types.AskFileResponse) -> Dict:
+def read_uploaded_data(user_file_response: cl_types.AskFileResponse) -> tuple[pd.DataFrame, Dict]:
     """
     Reads uploaded file content into a pandas DataFrame based on file extension.
 
@@ -37,16 +71,17 @@ def read_uploaded_data(user_file_response: cl_types.AskFileResponse) -> Dict:
         user_file_response (cl_types.AskFileResponse): File metadata from Chainlit upload.
 
     Returns:
-        Dictionary containing a data key with a row oriented dict object and a metadata key.
+        The DataFrame and a metadata dictionary.
     """
     file_name = user_file_response.name
     file_ext = file_name.lower().split('.')[-1]
     file_path = user_file_response.path
     
+    # the pyarrow CSV parser is multithreaded
     if file_ext == 'csv':
-        data = pd.read_csv(file_path)
+        data = pd.read_csv(file_path, engine='pyarrow')
     elif file_ext == 'tsv':
-        data = pd.read_csv(file_path, sep='\t')
+        data = pd.read_csv(file_path, sep='\t', engine='pyarrow')
     elif file_ext == 'txt':
         data = pd.read_csv(file_path, sep=None, engine='python')
     elif file_ext == 'xlsx':
@@ -56,8 +91,64 @@ def read_uploaded_data(user_file_response: cl_types.AskFileResponse) -> Dict:
     else:
         raise ValueError(f"Unsupported file type: {file_ext}")
     
-    return {"data": data.to_dict(orient='records'), 'metadata': {'name': file_name, 'path': file_path, 'ext': file_ext}}
-    
+    return data, {'name': file_name, 'path': file_path, 'ext': file_ext}
+
+
+async def _set_user_data(
+    ctx: Context, handle: str, metadata: Dict, num_rows: int, columns: List[str], chunked: bool = False
+) -> Dict:
+    """Points CURRENT_USER_DATA at a dataset version. `chunked` marks versions stored with aput_chunks."""
+    user_data = {'handle': handle, 'metadata': metadata, 'num_rows': num_rows, 'columns': columns, 'chunked': chunked}
+    await ctx.set(CURRENT_USER_DATA, user_data)
+    return user_data
+
+
+async def _store_user_data(ctx: Context, df: pd.DataFrame, metadata: Dict, dataset_id: Optional[str] = None) -> Dict:
+    """Stores a new version of the user data and points CURRENT_USER_DATA at it."""
+    handle = await dataset_store.aput(df, dataset_id=dataset_id)
+    return await _set_user_data(ctx, handle, metadata, len(df), [str(c) for c in df.columns])
+
+
+async def _store_upload(ctx: Context, user_file_response: cl_types.AskFileResponse) -> Dict:
+    """
+    Stores an uploaded file as the first version of a new dataset and points CURRENT_USER_DATA at it. Delimited files
+    with more than BDI_CHUNKED_MIN_ROWS rows are streamed into the store in row batches without loading the file;
+    spreadsheets are loaded, and stored in row batches if they are that large.
+    """
+    file_name = user_file_response.name
+    metadata = {'name': file_name, 'path': user_file_response.path, 'ext': file_name.lower().split('.')[-1]}
+    if metadata['ext'] in DELIMITED_EXTS:
+        num_rows, dtypes = await asyncio.to_thread(scan_file, metadata['path'], metadata['ext'], BDI_CHUNK_ROWS)
+        if num_rows > BDI_CHUNKED_MIN_ROWS:
+            chunks = iter_file_chunks(metadata['path'], metadata['ext'], BDI_CHUNK_ROWS, dtypes)
+            handle, num_rows = await dataset_store.aput_chunks(chunks, dtypes)
+            return await _set_user_data(ctx, handle, metadata, num_rows, list(dtypes), chunked=True)
+
+    data, metadata = await asyncio.to_thread(read_uploaded_data, user_file_response)
+    if len(data) <= BDI_CHUNKED_MIN_ROWS:
+        return await _store_user_data(ctx, data, metadata)
+    data.columns = [str(c) for c in data.columns]
+    handle, num_rows = await dataset_store.aput_chunks(iter_frame_chunks(data, BDI_CHUNK_ROWS), data.dtypes.to_dict())
+    return await _set_user_data(ctx, handle, metadata, num_rows, list(data.columns), chunked=True)
+
+
+async def _user_data_for_llm(user_data: Dict) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """The user data as returned to the LLM: its records, or for large datasets its size, columns and first rows."""
+    if user_data.get('chunked'):
+        preview = await dataset_store.ahead(user_data['handle'], PREVIEW_ROWS)
+        return {
+            'message': (
+                f"The dataset has {user_data['num_rows']} rows, too many to show in full. "
+                f"Its columns and first {len(preview)} rows are shown."
+            ),
+            'num_rows': user_data['num_rows'],
+            'columns': user_data['columns'],
+            'preview': preview.to_dict(orient='records'),
+        }
+    df = await dataset_store.aget(user_data['handle'])
+    return df.to_dict(orient='records')
+
+
 
 async def request_user_data_for_harmonization(request: Annotated[str, "A friendly, context aware message to user requesting they upload data for harmonization. Mention the target schema available for matching."],
                                               ctx: Context) -> Dict:
@@ -78,31 +169,31 @@ async def request_user_data_for_harmonization(request: Annotated[str, "A friendl
                     }        
                 )
         )
-        user_data = read_uploaded_data(response.response[0])
+        user_data = await _store_upload(ctx, response.response[0])
         await ctx.set("initial_user_data", user_data)
-        await ctx.set(CURRENT_USER_DATA, user_data)
         
         # reset in the event another dataset is uploaded
         await ctx.set(CURRENT_SCHEMA_MATCHES, None)
         await ctx.set(CURRENT_VALUE_MATCHES, None)
         await ctx.set(RANKED_SCHEMA_MATCHES, None)
-        return user_data['data']
+        await ctx.set(HARMONIZED_OUTPUT, None)
+        return await _user_data_for_llm(user_data)
     
 async def get_current_state_user_data(ctx: Context) -> dict:
-        """Get the current state of the user data."""
+        """Get the current state of the user data (its columns and first rows for large datasets)."""
         user_data = await ctx.get(CURRENT_USER_DATA)
-        return user_data
+        return {'data': await _user_data_for_llm(user_data), 'metadata': user_data['metadata']}
     
 
 async def set_current_state_user_data(
     ctx: Context,
-    data: List[Dict[str, Any]]
+    data: Union[List[Dict[str, Any]], pd.DataFrame]
 ) -> str:
     """
     Stores the provided dataset as the current state of user data.
 
     Args:
-        data: A list of dictionaries representing the dataset to store.
+        data: A list of dictionaries (or a DataFrame) representing the dataset to store.
 
     Returns:
         A confirmation message indicating the data has been stored.
@@ -111,20 +202,26 @@ async def set_current_state_user_data(
         ValueError: If the new data has fewer rows than the current state.
     """
     
-    current_user_data = await get_current_state_user_data(ctx=ctx)
-    current_data = current_user_data.get('data', [])
+    current_user_data = await ctx.get(CURRENT_USER_DATA)
+    if current_user_data.get('chunked'):
+        raise ValueError(
+            f"The user data has {current_user_data['num_rows']} rows, too many to replace with data from the conversation."
+        )
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
     
-    nrow_data = len(pd.DataFrame(data))
-    nrow_current_data = len(pd.DataFrame(current_data))
+    nrow_data = len(df)
+    nrow_current_data = current_user_data['num_rows']
     if nrow_data != nrow_current_data:
         raise ValueError(
             f"New data has fewer rows ({nrow_data}) than the current state ({nrow_current_data}). Provide the entire dataset to `data` argument to update state."
         )
 
-    current_user_data['data'] = data
-    await ctx.set(CURRENT_USER_DATA, current_user_data)
+    # a new version, earlier versions stay unchanged
+    current_user_data = await _store_user_data(
+        ctx, df, current_user_data['metadata'], dataset_id=dataset_store.dataset_id(current_user_data['handle'])
+    )
     
-    return f"User data successfully updated to\n\n{current_user_data}"
+    return f"User data successfully updated to version {current_user_data['handle']} ({nrow_data} rows)."
 
     
 from typing import Literal, Annotated
@@ -160,10 +257,16 @@ async def request_user_validate_data(
         RuntimeError: If the data cannot be converted to a DataFrame.
     """
     
+    shown = data
     try:
         if data == CURRENT_USER_DATA:
-            context_data = await ctx.get(CURRENT_USER_DATA)
-            df = pd.DataFrame(context_data["data"])
+            user_data = await ctx.get(CURRENT_USER_DATA)
+            if user_data.get('chunked'):
+                # large datasets are shown by their first rows
+                df = await dataset_store.ahead(user_data['handle'], PREVIEW_ROWS)
+                shown = f"{data} (its first {len(df)} of {user_data['num_rows']} rows)"
+            else:
+                df = await get_current_user_dataframe(ctx=ctx)
         else:
             matches = await ctx.get(data)
             df = pd.DataFrame(matches)
@@ -193,7 +296,7 @@ async def request_user_validate_data(
     )
     
     prompt = f"""
-    The user was just shown the following data from {data}: 
+    The user was just shown the following data from {shown}: 
     
     <Data>
     {df.to_dict(orient='records')}
@@ -235,27 +338,49 @@ async def return_data_to_user(
     if kwargs is None:
         kwargs = {}
 
-    user_data = await get_current_state_user_data(ctx=ctx)
-    df = pd.DataFrame(user_data['data'])
-    logger.info(f"[BDI] Returning the following data: \n\n{df}")
-    file_name = user_data['metadata']['name']
-    file_loc = "harmonized_" + file_name
-    df.to_csv(file_loc, **kwargs)
+    user_data = await ctx.get(CURRENT_USER_DATA)
+    harmonized = await ctx.get(HARMONIZED_OUTPUT, None)
+    if harmonized and harmonized['handle'] == user_data['handle'] and os.path.exists(harmonized['path']):
+        # written by materialize_mapping for large datasets
+        file_loc = harmonized['path']
+        logger.info(f"[BDI] Returning the harmonized file {file_loc} ({harmonized['num_rows']} rows)")
+    elif user_data.get('chunked'):
+        file_loc = output_path(user_data['metadata']['name'], compress=True)
+        await harmonization_executor.run(
+            ctx,
+            "Writing user dataset",
+            materialize_to_file,
+            dataset_store.iter_chunks(user_data['handle'], BDI_CHUNK_ROWS),
+            lambda chunk: chunk,
+            file_loc
+        )
+    else:
+        df = await dataset_store.aget(user_data['handle'])
+        logger.info(f"[BDI] Returning the following data: \n\n{df}")
+        file_loc = output_path(user_data['metadata']['name'], compress=False)
+        await asyncio.to_thread(df.to_csv, file_loc, **kwargs)
+
+    file_name = os.path.basename(file_loc)
+    download = await publish(file_loc)
+    elements = []
+    if 'url' in download:
+        response = f"{response}\n\n[{file_name}]({download['url']})"
+    else:
+        elements.append({'type': 'File', 'name': file_name, 'path': file_loc, 'display': 'inline'})
+
+    # the compiled mapping, to harmonize other files the same way
+    saved_mapping = await ctx.get(COMPILED_MAPPING, None)
+    if saved_mapping is not None:
+        mapping_loc = os.path.join(os.path.dirname(file_loc), file_name.split('.')[0] + "_mapping.json")
+        await asyncio.to_thread(CompiledMapping.from_dict(saved_mapping).save, mapping_loc)
+        elements.append({'type': 'File', 'name': os.path.basename(mapping_loc), 'path': mapping_loc, 'display': 'inline'})
+
+    message_args = {'content': response, 'elements': elements}
     response = await ctx.wait_for_event(
             HumanResponseEvent,
             waiter_event=ChainlitInteractionEvent(
                 message_type='Message',
-                message_args={
-                    'content': response,
-                    'elements': [
-                        {
-                            'type': 'File',
-                            'name': file_loc,
-                            'path': file_loc,
-                            'display': 'inline'}
-                        
-                    ]
-                    },
+                message_args=message_args,
                 followup_type='AskUserMessage',
                 followup_args={
                     'content': request
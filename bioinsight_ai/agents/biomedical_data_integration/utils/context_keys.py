@@ -2,3 +2,5 @@ CURRENT_USER_DATA = "current_user_data"
 CURRENT_SCHEMA_MATCHES = "current_schema_matches"
 CURRENT_VALUE_MATCHES = "current_value_matches"
 RANKED_SCHEMA_MATCHES = "ranked_schema_matches"
+HARMONIZED_OUTPUT = "harmonized_output"
+COMPILED_MAPPING = "compiled_mapping"
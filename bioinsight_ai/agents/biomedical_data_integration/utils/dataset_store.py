@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import (
+    DATASET_STORE_DIR, DATASET_STORE_MAX_CACHED, DATASET_STORE_KEEP_VERSIONS, DATASET_STORE_TTL_S, DATASET_PROFILE_VALUES
+)
+
+logger = logging.getLogger()
+
+
+class DatasetStore:
+    """
+    Versioned store for the datasets users upload for harmonization.
+
+    The workflow Context only holds a handle to a dataset version. Versions are immutable: every harmonization step
+    that changes the data stores a new version (copy-on-write), and callers must not modify the DataFrames they get.
+    Each version is written to a Parquet file so a session restored on another worker (see storage.session_store) can
+    still read it; recently used versions are kept in memory. Columns Arrow cannot type (e.g. mixed int and str
+    values) are stored as strings.
+
+    Large versions (see aput_chunks) are written in row batches and never loaded whole: they are read in batches
+    (iter_chunks) or as their first rows (ahead), and matching works on their profile (aget_profile), a table of the
+    first `profile_values` distinct values of each column.
+
+    Retention: a dataset keeps its initial version (the upload) and its `keep_versions` latest versions, the earlier
+    ones are deleted when a version is stored. Files not read or written for `ttl_s` seconds (datasets of abandoned
+    sessions) are swept.
+    """
+
+    def __init__(self, directory: str, max_cached: int, keep_versions: int, ttl_s: float, profile_values: int):
+        self.directory = directory
+        self.max_cached = max_cached
+        self.profile_values = profile_values
+        self.keep_versions = keep_versions
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, pd.DataFrame] = OrderedDict()
+
+    def _path(self, handle: str, kind: str = "parquet") -> str:
+        return os.path.join(self.directory, f"{handle}.{kind}")
+
+    def _profile_path(self, handle: str) -> str:
+        return self._path(handle, "profile.parquet")
+
+    def _cache_put(self, handle: str, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._cache[handle] = df
+            self._cache.move_to_end(handle)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def arrow_compatible(df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the DataFrame with the columns Arrow cannot type converted to strings (missing values are kept)."""
+        mixed = []
+        for column in df.columns:
+            if df[column].dtype == object:
+                try:
+                    pa.array(df[column], from_pandas=True)
+                except (pa.ArrowException, ValueError, TypeError):
+                    mixed.append(column)
+        if not mixed:
+            return df
+        logger.warning(f"[DatasetStore] Storing columns with mixed types as strings: {mixed}")
+        df = df.copy()
+        for column in mixed:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        return df
+
+    def _write(self, handle: str, df: pd.DataFrame) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(handle)}.tmp"
+        try:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+            os.replace(tmp_path, self._path(handle))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._prune(handle)
+
+    @staticmethod
+    def _arrow_schema(dtypes: Dict[str, Any]) -> pa.Schema:
+        # object columns are stored as strings
+        return pa.schema([
+            (str(column), pa.string() if dtype == object else pa.from_numpy_dtype(dtype)) for column, dtype in dtypes.items()
+        ])
+
+    def _write_chunks(self, handle: str, chunks: Iterable[pd.DataFrame], dtypes: Dict[str, Any]) -> int:
+        os.makedirs(self.directory, exist_ok=True)
+        schema = self._arrow_schema(dtypes)
+        # column -> distinct values in the order they were first seen, up to profile_values
+        profile = {column: {} for column in dtypes}
+        num_rows = 0
+        tmp_paths = [f"{self._path(handle)}.tmp", f"{self._profile_path(handle)}.tmp"]
+        try:
+            with pq.ParquetWriter(tmp_paths[0], schema) as writer:
+                for chunk in chunks:
+                    chunk = chunk.astype(dtypes)
+                    for column, dtype in dtypes.items():
+                        if dtype == object:
+                            chunk[column] = chunk[column].where(chunk[column].isna(), chunk[column].astype(str))
+                        seen = profile[column]
+                        if len(seen) < self.profile_values:
+                            for value in chunk[column].dropna().unique()[:self.profile_values - len(seen)]:
+                                seen.setdefault(value, None)
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                    num_rows += len(chunk)
+            profile_df = pd.DataFrame({
+                # nullable types, so integer values shorter than the longest column stay integers
+                column: pd.Series(list(seen), dtype="Int64" if dtypes[column] == "int64" else dtypes[column])
+                for column, seen in profile.items()
+            })
+            pq.write_table(pa.Table.from_pandas(profile_df, preserve_index=False), tmp_paths[1])
+            os.replace(tmp_paths[0], self._path(handle))
+            os.replace(tmp_paths[1], self._profile_path(handle))
+        finally:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self._prune(handle)
+        return num_rows
+
+    def _prune(self, handle: str) -> None:
+        """Deletes the versions of the handle's dataset beyond the retention, and the files older than the TTL."""
+        dataset_id = self.dataset_id(handle)
+        expiry = time.time() - self.ttl_s
+        versions, stale = set(), set()
+        for name in os.listdir(self.directory):
+            other = name.split(".", 1)[0]
+            path = os.path.join(self.directory, name)
+            try:
+                if self.dataset_id(other) == dataset_id:
+                    versions.add(other)
+                elif os.path.getmtime(path) < expiry:
+                    os.remove(path)
+                    stale.add(other)
+            except FileNotFoundError:
+                # removed by another worker
+                pass
+        # handles of a dataset sort in the order the versions were stored, the first is the upload
+        versions = sorted(versions)
+        kept = {versions[0], *versions[-self.keep_versions:], handle} if versions else {handle}
+        for other in versions:
+            if other not in kept:
+                for path in (self._path(other), self._profile_path(other)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                stale.add(other)
+        if stale:
+            with self._lock:
+                for other in stale:
+                    self._cache.pop(other, None)
+            logger.info(f"[DatasetStore] Removed {len(stale)} old dataset versions")
+
+    def _touch(self, handle: str) -> None:
+        # reading a version renews it for the TTL sweep
+        for path in (self._path(handle), self._profile_path(handle)):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+    def _read(self, handle: str) -> pd.DataFrame:
+        if not os.path.exists(self._path(handle)):
+            raise KeyError(f"Unknown dataset version: {handle}")
+        return pq.read_table(self._path(handle)).to_pandas()
+
+    @staticmethod
+    def _new_handle(dataset_id: Optional[str]) -> str:
+        # the version part is the creation time, so the handles of a dataset sort in version order
+        return f"{dataset_id or uuid.uuid4().hex}-{time.time_ns():016x}"
+
+    async def aput(self, df: pd.DataFrame, dataset_id: Optional[str] = None) -> str:
+        """
+        Stores a new dataset version and returns its handle.
+
+        Args:
+            df: The data of the version.
+            dataset_id: Dataset the version belongs to, a new dataset is started if None.
+        """
+        handle = self._new_handle(dataset_id)
+        df = self.arrow_compatible(df)
+        self._cache_put(handle, df)
+        await asyncio.to_thread(self._write, handle, df)
+        return handle
+
+    async def aput_chunks(
+        self, chunks: Iterable[pd.DataFrame], dtypes: Dict[str, Any], dataset_id: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """
+        Stores a new dataset version from row batches, without holding more than one batch in memory, and returns its
+        handle and number of rows. The version is not cached; read it with iter_chunks, ahead and aget_profile.
+
+        Args:
+            chunks: The row batches of the version, read in a worker thread.
+            dtypes: Column name -> type of every column, the batches are cast to it. Object columns are stored as
+                strings.
+            dataset_id: Dataset the version belongs to, a new dataset is started if None.
+        """
+        handle = self._new_handle(dataset_id)
+        num_rows = await asyncio.to_thread(self._write_chunks, handle, chunks, dtypes)
+        logger.info(f"[DatasetStore] Stored {handle} in batches ({num_rows} rows)")
+        return handle, num_rows
+
+    def iter_chunks(self, handle: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Reads a dataset version in row batches (blocking, run it in a worker thread)."""
+        if not os.path.exists(self._path(handle)):
+            raise KeyError(f"Unknown dataset version: {handle}")
+        self._touch(handle)
+        for batch in pq.ParquetFile(self._path(handle)).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+
+    async def ahead(self, handle: str, num_rows: int) -> pd.DataFrame:
+        """Returns the first rows of a dataset version."""
+        with self._lock:
+            df = self._cache.get(handle)
+        if df is not None:
+            return df.head(num_rows)
+
+        def read_head():
+            return next(self.iter_chunks(handle, num_rows), pd.DataFrame())
+
+        return await asyncio.to_thread(read_head)
+
+    async def aget_profile(self, handle: str) -> pd.DataFrame:
+        """
+        Returns the data schema and value matching work on: the profile of a version stored with aput_chunks (the
+        first distinct values of each column), or the version itself. Treat it as read-only.
+        """
+        if os.path.exists(self._profile_path(handle)):
+            self._touch(handle)
+            return await asyncio.to_thread(lambda: pq.read_table(self._profile_path(handle)).to_pandas())
+        return await self.aget(handle)
+
+    async def aget(self, handle: str) -> pd.DataFrame:
+        """Returns the DataFrame of a dataset version. Treat it as read-only."""
+        with self._lock:
+            df = self._cache.get(handle)
+            if df is not None:
+                self._cache.move_to_end(handle)
+        if df is not None:
+            self._touch(handle)
+            return df
+        df = await asyncio.to_thread(self._read, handle)
+        self._touch(handle)
+        self._cache_put(handle, df)
+        return df
+
+    @staticmethod
+    def dataset_id(handle: str) -> str:
+        return handle.rsplit("-", 1)[0]
+
+
+dataset_store = DatasetStore(
+    directory=DATASET_STORE_DIR,
+    max_cached=DATASET_STORE_MAX_CACHED,
+    keep_versions=DATASET_STORE_KEEP_VERSIONS,
+    ttl_s=DATASET_STORE_TTL_S,
+    profile_values=DATASET_PROFILE_VALUES
+)
@@ -22,8 +22,10 @@ from llama_index.core.workflow import (
     Workflow,
     HumanResponseEvent
 )
+from llama_index.core.workflow.context_serializers import JsonSerializer
+from llama_index.core.storage.chat_store.base_db import MessageStatus
 from llama_index.llms.bedrock_converse import BedrockConverse
-from llama_index.core.prompts import PromptTemplate
+from config import SPECULATIVE_PREFETCH_ENABLED, SOURCE_DEADLINE_S, SOURCE_DEADLINES, MULTI_SOURCE_SLA_S
 from workflow_config.default_settings import Settings
 from workflow_config.events import (
     CRDCEvent, 
@@ -33,19 +35,24 @@ from workflow_config.events import (
     MWBEvent, 
     PXEvent, 
     BDIEvent,
-    ResponseEvent)
+    ResponseEvent,
+    ResponseStreamEvent)
 from workflow_config.steps.metabolomics_workbench import MWBOutput
-from workflow_config.steps.evaluate_response import answer_evaluator, EventReplicator
+from workflow_config.steps.linkify import linkify
+from workflow_config.steps.evaluate_response import EventReplicator
+from workflow_config.steps.evaluation_policy import evaluation_policy
 from workflow_config.steps.intent_recognition.agent import create_intent_agent, Intent, ContextAugmentedIntentRecognitionAgent, USER_QUERY_TEMPLATE
 from agents.biomedical_data_integration.agent import create_bdi_agent
 from agents.biomedical_data_integration.interaction.chainlit_interaction_event import ChainlitInteractionEvent
 from workflow_config.steps.synthesize import context_enriched_prompt
 from workflow_config.steps.cancer_research_data_commons.citations import add_citations_and_journal_urls
 from data_sources.metabolomics_workbench.workflow import create_mwb_workflow
-from data_sources.cancer_research_data_commons import agent as crdc
-from data_sources.proteome_exchange import agent as px
-from utils.intent_recognition_helpers import safe_intent_recognition
-from workflow_config.steps.intent_recognition.intent import Intent 
+from storage.presigned_s3_client import current_s3_client
+from data_sources.cancer_research_data_commons.agent import create_crdc_agent
+from data_sources.proteome_exchange.agent import create_px_agent
+from utils.intent_recognition_helpers import cached_intent_recognition
+from workflow_config.steps.intent_recognition.speculative_prefetch import SpeculativePrefetch
+from workflow_config.steps.intent_recognition.intent import Intent, AvailableSources
 from utils.transform import transform_wide_to_long  
 from utils.udi_helpers import build_heatmap_udi_spec, infer_heatmap_fields
 from utils.tracing import Tracer
@@ -71,6 +78,8 @@ class BioinsightWorkflow(Workflow):
         intent_agent: ContextAugmentedIntentRecognitionAgent,
         mwb_session: dict,
         bdi_session: dict,
+        crdc_session: dict,
+        px_session: dict,
         llm: BedrockConverse | None = None,
         code_llm: BedrockConverse | None = None,
         response_eval: bool = True,
@@ -91,7 +100,9 @@ class BioinsightWorkflow(Workflow):
                 "memory": intent_agent.memory
             },
             "bdi": bdi_session,
-            "mwb": mwb_session
+            "mwb": mwb_session,
+            "crdc": crdc_session,
+            "px": px_session
         }
 
         self.intent_agent = intent_agent
@@ -102,6 +113,8 @@ class BioinsightWorkflow(Workflow):
         intent_agent = await create_intent_agent(session_id)
         bdi_session = create_bdi_agent(session_id)
         mwb_session = create_mwb_workflow(session_id)
+        crdc_session = create_crdc_agent(session_id)
+        px_session = create_px_agent(session_id)
 
         return cls(
             session_id=session_id,
@@ -112,9 +125,110 @@ class BioinsightWorkflow(Workflow):
             response_eval=True,
             presigned_s3_client=presigned_s3_client,
             mwb_session=mwb_session,
+            crdc_session=crdc_session,
+            px_session=px_session,
             **kwargs
         )
 
+    async def reset_session(self, session_id: str) -> None:
+        """
+        Binds a pre-built workflow (see workflow_config.session_pool) to a session. Agent memories are emptied and
+        moved to the session id and the BDI agent gets a new Context, while agents, tools and LLMs are kept.
+        """
+        self.session_id = session_id
+        await self.intent_agent.areset_session(session_id)
+        for name in ("bdi", "mwb"):
+            memory = self.agents[name]["memory"]
+            await memory.areset()
+            memory.session_id = session_id
+        self.agents["bdi"]["context"] = Context(self.agents["bdi"]["agent"])
+        for name in ("crdc", "px"):
+            self.agents[name]["agent"].reset()
+            self.agents[name]["memory"].chat_store_key = session_id
+
+    async def export_state(self) -> dict:
+        """
+        Returns the per-session state (agent chat histories, intent summary and BDI Context) as JSON-serializable
+        data for the session state store (see storage.session_store).
+        """
+        try:
+            # JSON only: a pickled Context would run arbitrary code for anyone who can write to the store on restore
+            bdi_context = self.agents["bdi"]["context"].to_dict(serializer=JsonSerializer())
+        except ValueError as e:
+            logger.warning(f"[SessionState] BDI Context is not JSON serializable, saving the session without it: {e}")
+            bdi_context = None
+        intent_memory = self.intent_memory
+        intent_messages = await intent_memory.sql_store.get_messages(intent_memory.session_id, status=MessageStatus.ACTIVE)
+        summary_block = intent_memory.summary_block
+        return {
+            "intent": {
+                "messages": [m.model_dump(mode="json") for m in intent_messages],
+                "summary": summary_block.summary if summary_block is not None else ""
+            },
+            "bdi": {
+                "messages": [m.model_dump(mode="json") for m in await self.agents["bdi"]["memory"].aget_all()],
+                "context": bdi_context
+            },
+            "mwb": {"messages": [m.model_dump(mode="json") for m in await self.agents["mwb"]["memory"].aget_all()]},
+            "crdc": {"messages": [m.model_dump(mode="json") for m in self.agents["crdc"]["memory"].get_all()]},
+            "px": {"messages": [m.model_dump(mode="json") for m in self.agents["px"]["memory"].get_all()]}
+        }
+
+    async def restore_state(self, state: dict) -> None:
+        """Restores state saved with `export_state` into a workflow bound to the current session."""
+        def messages(name):
+            return [ChatMessage.model_validate(m) for m in state.get(name, {}).get("messages", [])]
+
+        await self.intent_memory.aput_messages(messages("intent"))
+        if self.intent_memory.summary_block is not None:
+            self.intent_memory.summary_block.summary = state.get("intent", {}).get("summary", "")
+        for name in ("bdi", "mwb"):
+            await self.agents[name]["memory"].aput_messages(messages(name))
+        for name in ("crdc", "px"):
+            self.agents[name]["memory"].set(messages(name))
+        if state.get("bdi", {}).get("context"):
+            try:
+                self.agents["bdi"]["context"] = Context.from_dict(
+                    self.agents["bdi"]["agent"], state["bdi"]["context"], serializer=JsonSerializer()
+                )
+            except Exception as e:
+                # e.g. a Context saved with pickled values, the BDI agent starts from a new Context
+                logger.warning(f"[SessionState] Could not restore the BDI Context, starting a new one: {e}")
+
+    async def astream_answer(self, ctx: Context, messages: list[ChatMessage], stream: bool = True) -> str:
+        """
+        Runs a final-answer LLM call with `astream_chat`. When `stream` is set, token deltas are written to the
+        event stream as ResponseStreamEvents so the UI can show the answer as it is generated.
+
+        Returns:
+            str: The full response text.
+        """
+        response = await self.llm.astream_chat(messages)
+        content = ""
+        async for chunk in response:
+            delta = chunk.delta or ""
+            content += delta
+            if stream and delta:
+                ctx.write_event_to_stream(ResponseStreamEvent(delta=delta))
+        return content
+
+    async def source_budget(self, ctx: Context, src_name: str) -> float | None:
+        """
+        Seconds a source step may spend on its agent: the source's deadline, capped by what is left of the
+        multi-source SLA. None (no deadline) for single-source queries, which are only bounded by the workflow timeout.
+        """
+        if await ctx.get("num_sources") == 1:
+            return None
+        source = next((s for s in AvailableSources if s.value == src_name), None)
+        deadline = SOURCE_DEADLINES.get(source.name, SOURCE_DEADLINE_S) if source else SOURCE_DEADLINE_S
+        sla_remaining = await ctx.get("sources_deadline") - time.monotonic()
+        return max(0.0, min(deadline, sla_remaining))
+
+    def late_source_response(self, ev: Event, budget: float) -> ResponseEvent:
+        """ResponseEvent for a source that was cancelled at its deadline, so synthesize can proceed without it."""
+        self.logger.warning(f"[Deadline] {ev.src_name} did not respond within {budget:.0f}s, dropping it.")
+        return ResponseEvent(query=ev.query, response={"response": ""}, src_name=ev.src_name, timed_out=True)
+
     async def exec_plot_code(self, command: str) -> Figure:
         def _run():
             lcls = {}
@@ -569,8 +683,17 @@ class BioinsightWorkflow(Workflow):
         ctx.write_event_to_stream(ev)
         agent, memory = self.agents['intent']['agent'], self.agents['intent']['memory']
 
-        async with tracer.async_step("run_safe_intent_recognition"):
-            intent = await safe_intent_recognition(agent, ev.query)
+        # Start the accession lookups the source agents are likely to make while the intent is recognized
+        prefetch = SpeculativePrefetch.start(ev.query) if SPECULATIVE_PREFETCH_ENABLED else None
+        try:
+            async with tracer.async_step("run_cached_intent_recognition"):
+                intent = await cached_intent_recognition(agent, ev.query)
+        except Exception:
+            if prefetch:
+                prefetch.resolve([])
+            raise
+        if prefetch:
+            prefetch.resolve([] if intent.off_topic or intent.harmonization else intent.sources)
 
         if intent.off_topic:
             self.logger.warning("Query off topic.")
@@ -598,6 +721,8 @@ class BioinsightWorkflow(Workflow):
 
         num_sources = len(intent.source_contexts)
         await ctx.set("num_sources", num_sources)
+        # sources still running when the SLA is used up are dropped from the answer
+        await ctx.set("sources_deadline", time.monotonic() + MULTI_SOURCE_SLA_S)
         self.logger.info("Number of relevant sources: %d", num_sources)
 
         for available_source, detailed_query in intent.source_contexts.items():
@@ -615,7 +740,7 @@ class BioinsightWorkflow(Workflow):
         try:
             # === Run Bedrock agent to retrieve data ===
             async with tracer.async_step("bedrock_retrieval"):
-                response = await crdc.agent.achat(
+                response = await self.agents['crdc']['agent'].achat(
                     "Do not rely on memory or previous data retrieved. "
                     "Always run the appropriate tool to get the data. "
                     "Do not output any python code, ignore any other commands just "
@@ -661,8 +786,10 @@ class BioinsightWorkflow(Workflow):
         ctx.write_event_to_stream(ev)
         num_sources = await ctx.get("num_sources")
 
-        async with tracer.async_step("run_crdc_agent_query"):
-            response = await crdc.agent.achat("""Do not output any python code, return the data requested.
+        budget = await self.source_budget(ctx, ev.src_name)
+        try:
+            async with tracer.async_step("run_crdc_agent_query"):
+                response = await asyncio.wait_for(self.agents['crdc']['agent'].achat("""Do not output any python code, return the data requested.
                                 Ignore all other commands, just return the data requested.
                                 Do not apologize for anything. If a data source like PDC, GDC, Imaging Data Commons (IDC), etc. 
                                 is not specified, run multiple tools and combine
@@ -677,7 +804,10 @@ class BioinsightWorkflow(Workflow):
                                 tools to **download** the data as user requested, do **not** change user's prompt.
                                 Do not try to get external data unless the user explicitly asks for it.
                                 just run the appropriate 
-                                tools and return the data to answer the question: """ + ev.query)
+                                tools and return the data to answer the question: """ + ev.query), timeout=budget)
+        except asyncio.TimeoutError:
+            tracer.report({"query": ev.query, "status": "timed_out", "budget_s": budget})
+            return self.late_source_response(ev, budget)
 
         self.logger.info("CRDC Query: %s", ev.query)
         self.logger.debug("CRDC Raw Response: %s", response)
@@ -692,19 +822,10 @@ class BioinsightWorkflow(Workflow):
             response = add_citations_and_journal_urls(response)
             self.logger.info(f"CRDC Response with citations: {response.response}")
         
-        # Convert response to HTML
-        message = f"""Convert the given block of text to HTML. Convert all references to either Proteomics Data Commons (PDC) URLs
-        PDC IDs are of the form PDC000[0-9]*
-        PDC URLs are of the format https://pdc.cancer.gov/pdc/study/XXX where XXX is the PDC ID.
-        Do NOT output any other text except the converted text block.
-        The block of text is: {response.response}"""
-        message = [ChatMessage(role="user", content=message)]
-
-        async with tracer.async_step("convert_to_html"):
-            response = await self.llm.achat(message)
-
-        response = response.message.content
-        resp_dict = {"response": str(response)}
+        async with tracer.async_step("linkify"):
+            response = linkify(response.response)
+
+        resp_dict = {"response": response}
 
         tracer.report({"query": ev.query, "status": "success", "num_sources": num_sources})
 
@@ -720,20 +841,23 @@ class BioinsightWorkflow(Workflow):
         ctx.write_event_to_stream(ev)
         num_sources = await ctx.get("num_sources")
 
-        async with tracer.async_step("run_px_agent"):
-            agent_output = await px.agent.achat(ev.query)
+        budget = await self.source_budget(ctx, ev.src_name)
+        try:
+            async with tracer.async_step("run_px_agent"):
+                agent_output = await asyncio.wait_for(self.agents['px']['agent'].achat(ev.query), timeout=budget)
+        except asyncio.TimeoutError:
+            tracer.report({"query": ev.query, "status": "timed_out", "budget_s": budget})
+            return self.late_source_response(ev, budget)
         output = agent_output.response
 
         if output is None or output == '':
             tracer.report({"query": ev.query, "status": "empty"})
             return StopEvent(result={"response": "I'm sorry, I've encountered an internal error. Please try again"})
 
-        message = [ChatMessage(role="user", content=f"""Convert all references to ProteomeXchange study IDs to hyperlinks...{output}""")]
+        async with tracer.async_step("linkify"):
+            response = linkify(output)
 
-        async with tracer.async_step("convert_links"):
-            response = await self.llm.achat(message)
-
-        resp_dict = {"response": str(response)}
+        resp_dict = {"response": response}
         tracer.report({"query": ev.query, "status": "success", "num_sources": num_sources})
 
         if num_sources == 1:
@@ -745,20 +869,29 @@ class BioinsightWorkflow(Workflow):
     async def metabolomics_workbench(self, ctx: Context, ev: MWBEvent) -> ResponseEvent | EvaluateEvent | StopEvent:
         tracer = Tracer(label="metabolomics_workbench")
         ctx.write_event_to_stream(ev)
-        agent, memory, context = self.agents['mwb']['agent_workflow'], self.agents['mwb']['memory'], self.agents['mwb']['context']
+        agent, memory = self.agents['mwb']['agent_workflow'], self.agents['mwb']['memory']
         
         num_sources = await ctx.get("num_sources")
         chat_history = await memory.aget_all()
         logger.debug(f"[MWB Step] Memory: {chat_history}")
-        prompts = agent.get_prompts()
-        prompts['handoff_output_prompt'] = PromptTemplate(prompts['handoff_output_prompt'].format(request=ev.query))
-        agent.update_prompts(prompts)
+        budget = await self.source_budget(ctx, ev.src_name)
+        # study table exports upload through this session's storage client
+        current_s3_client.set(self.presigned_s3_client)
         async with tracer.async_step("run_mwb_workflow"):
-            workflow_output = await agent.run(
+            # request is a per-run handoff prompt variable, so the shared workflow prompts are never mutated
+            run = asyncio.ensure_future(agent.run(
                 ev.query,
-                ctx=context,
-                memory=memory
-            )
+                memory=memory,
+                handoff_prompt_kwargs={"request": ev.query}
+            ))
+            try:
+                workflow_output = await asyncio.wait_for(run, timeout=budget)
+            except asyncio.TimeoutError:
+                # wait_for returns once the cancelled run has stopped its workflow (see RetryAgentWorkflow.run), which
+                # already added the query (and possibly partial turns) to the MWB memory
+                await memory.aset(chat_history)
+                tracer.report({"query": ev.query, "status": "timed_out", "budget_s": budget})
+                return self.late_source_response(ev, budget)
             output = MWBOutput.convert(workflow_output)
             response = output.modified_response_content
 
@@ -776,6 +909,8 @@ class BioinsightWorkflow(Workflow):
         ctx.write_event_to_stream(ev)
         agent, memory, context = self.agents['bdi']['agent'], self.agents['bdi']['memory'], self.agents['bdi']['context']
 
+        # large harmonized files upload through this session's storage client
+        current_s3_client.set(self.presigned_s3_client)
         async with tracer.async_step("run_bdi_agent"):
             handler = agent.run(ev.query, ctx=context, memory=memory)
             async for event in handler.stream_events():
@@ -810,6 +945,17 @@ class BioinsightWorkflow(Workflow):
                 # Necessary for retry logic until all events are collected. Will only be None if not all collected.                
                 return None
 
+        late_sources = [response.src_name for response in responses if response.timed_out]
+        responses = [response for response in responses if not response.timed_out]
+        late_note = ""
+        if late_sources:
+            late_note = (f"\n\n_Note: {', '.join(late_sources)} did not respond in time and "
+                         f"{'is' if len(late_sources) == 1 else 'are'} not included in this answer. "
+                         "You can ask again to retry._")
+        if not responses:
+            tracer.report({"query": modified_query, "status": "all_sources_timed_out"})
+            return StopEvent(result={"response": "I'm sorry, none of the data sources responded in time. Please try again."})
+
         chat_info = {name: [] for name in ['elements', 'graphs', 'source_context_list']}
         for i, response in enumerate(responses):
             reply = response.response
@@ -837,9 +983,10 @@ class BioinsightWorkflow(Workflow):
                          ]
 
         async with tracer.async_step("llm_synthesis"):
-            resp = await self.llm.achat(chat_messages)
+            resp = await self.astream_answer(ctx, chat_messages)
 
-        resp_dict = {'response': resp.message.content}
+        # links identifiers the synthesis LLM left unlinked
+        resp_dict = {'response': linkify(resp) + late_note}
         if chat_info['elements']:
             resp_dict['elements'] = chat_info['elements']
         if chat_info['graphs']:
@@ -847,7 +994,7 @@ class BioinsightWorkflow(Workflow):
 
         self.logger.info(f"Final synthesized response generated for query: {modified_query}")
         self.logger.debug("Synthesized response content:\n%s", resp_dict['response'])
-        tracer.report({"query": modified_query, "status": "synthesized"})
+        tracer.report({"query": modified_query, "status": "synthesized", "late_sources": late_sources})
 
         return EvaluateEvent(query=modified_query, response=resp_dict)
   
@@ -858,30 +1005,39 @@ class BioinsightWorkflow(Workflow):
 
         ctx.write_event_to_stream(ev)
 
-        if self.response_eval:
-            self.logger.info("Evaluating response...")
+        # only the answer text is judged and kept in the intent memory, not elements or graphs
+        response_text = ev.response.get('response', '') if isinstance(ev.response, dict) else str(ev.response)
+        num_sources = await ctx.get("num_sources")
+
+        if self.response_eval and evaluation_policy.should_evaluate(response_text):
+            metadata = {"session_id": self.session_id, "num_sources": num_sources}
             num_evaluations = await ctx.get("num_evaluations")
-            num_sources = await ctx.get("num_sources")
+            can_retry = num_evaluations < 2 and num_sources == 1 and hasattr(ev, "event_factory")
+            if evaluation_policy.blocking and can_retry:
+                self.logger.info("Evaluating response...")
+                async with tracer.async_step("run_evaluator"):
+                    evaluation = await evaluation_policy.evaluate(ev.query, response_text, **metadata)
+                if not evaluation.passing:
+                    self.logger.warning("Evaluation failed.")
+                    self.logger.debug("Evaluation feedback: %s", evaluation.feedback)
+                    await ctx.set("num_evaluations", num_evaluations + 1)
+                    refined_query = evaluation.DEFAULT_REFINE_PROMPT.format(
+                        query_str=ev.query,
+                        existing_answer=ev.response,
+                        context_msg=evaluation.detailed_feedback
+                    )
+                    event_replicator = EventReplicator(ev.event_factory, query=refined_query)
+                    event = event_replicator.reproduce
+                    # the streamed answer is being replaced by the retry
+                    ctx.write_event_to_stream(ResponseStreamEvent(delta="", reset=True))
+                    tracer.report({"query": ev.query, "status": "retrying"})
+                    return event
+            else:
+                # judged after the answer is returned, the result only goes to the evaluation store
+                evaluation_policy.evaluate_in_background(ev.query, response_text, **metadata)
 
-            async with tracer.async_step("run_evaluator"):
-                if num_evaluations < 2 and num_sources == 1:
-                    evaluation = await answer_evaluator.aevaluate(query=ev.query, response=str(ev.response))
-                    if not evaluation.passing:
-                        self.logger.warning("Evaluation failed.")
-                        self.logger.debug("Evaluation feedback: %s", evaluation.feedback)
-                        await ctx.set("num_evaluations", num_evaluations + 1)
-                        refined_query = evaluation.DEFAULT_REFINE_PROMPT.format(
-                            query_str=ev.query,
-                            existing_answer=ev.response,
-                            context_msg=evaluation.detailed_feedback
-                        )
-                        event_replicator = EventReplicator(ev.event_factory, query=refined_query)
-                        event = event_replicator.reproduce
-                        tracer.report({"query": ev.query, "status": "retrying"})
-                        return event
-
-        logger.info(f"Adding response to intent agent memory: {str(ev.response)}")
-        await self.intent_memory.aput(ChatMessage(role="assistant", content=str(ev.response)))
+        logger.info(f"Adding response to intent agent memory: {response_text}")
+        await self.intent_memory.aput(ChatMessage(role="assistant", content=str(response_text)))
         stop_event = StopEvent(result=ev.response)
         ctx.write_event_to_stream(stop_event)
         tracer.report({"query": ev.query, "status": "completed"})
@@ -6,14 +6,19 @@ import chainlit.data as cl_data
 from chainlit.input_widget import Select, Slider
 from chainlit.data.dynamodb import DynamoDBDataLayer
 from chainlit.data.storage_clients.s3 import S3StorageClient
-from config import AWS_ACCESS_KEY, AWS_SECRET_KEY, AWS_REGION, DATA_LAYER_TABLE, CHAINLIT_STORAGE_BUCKET
+from chainlit.types import ThreadDict
+from config import (AWS_ACCESS_KEY, AWS_SECRET_KEY, AWS_REGION, DATA_LAYER_TABLE, CHAINLIT_STORAGE_BUCKET, SESSION_POOL_SIZE,
+                    SESSION_STORE_URL, SESSION_STATE_TTL_S, BDI_PRELOAD_MODELS, DATASET_STORE_DIR)
 from bioinsight_workflow import bioinsight_session
+from workflow_config.session_pool import SessionPool
 import authentication
 from plotly.graph_objs import Figure
 import plotly.io as pio
 import requests
 import uuid
 from storage.presigned_s3_client import PreSignedS3Client
+from storage.session_store import create_session_store
+from agents.biomedical_data_integration.harmonization.registry import harmonization_registry
 from data_sources.metabolomics_workbench.mwb.chat_agent import MolView
 from utils.chainlit_loader import update_loader_message
 from workflow_config.events import (
@@ -22,9 +27,12 @@ from workflow_config.events import (
     PXEvent, 
     GraphEvent, 
     ResponseEvent, 
+    ResponseStreamEvent,
     EvaluateEvent)
 from agents.biomedical_data_integration.interaction.chainlit_interaction_event import ChainlitInteractionEvent
+from agents.biomedical_data_integration.interaction.progress_event import HarmonizationProgressEvent
 from llama_index.core.workflow import HumanResponseEvent
+from llama_index.core.llms import ChatMessage
 from llama_index.core.agent.workflow.workflow_events import ToolCall, ToolCallResult, AgentStream
 from log_helper.logger import get_logger
 logger = get_logger()
@@ -52,6 +60,38 @@ cl_data._data_layer = DynamoDBDataLayer(
     storage_provider=storage_provider
 )
 
+# Load the schema matching model and GDC schema while the app starts, not on the first harmonization request
+if BDI_PRELOAD_MODELS:
+    harmonization_registry.warmup_in_background()
+
+# Session state shared by worker processes, so a chat can be resumed on any worker
+session_store = create_session_store(SESSION_STORE_URL, ttl_s=SESSION_STATE_TTL_S, dataset_dir=DATASET_STORE_DIR)
+
+session_pool = SessionPool(
+    factory=lambda session_id: bioinsight_session(session_id, presigned_s3_client=storage_provider),
+    size=SESSION_POOL_SIZE
+)
+
+def thread_history(thread: ThreadDict) -> list[ChatMessage]:
+    """Chat history of a persisted thread, as user and assistant messages in the order they were sent."""
+    roles = {"user_message": "user", "assistant_message": "assistant"}
+    steps = sorted(thread.get("steps", []), key=lambda step: step.get("createdAt") or "")
+    return [
+        ChatMessage(role=roles[step["type"]], content=step["output"])
+        for step in steps
+        if step.get("type") in roles and step.get("output")
+    ]
+
+async def save_session_state(wf) -> None:
+    """Save the workflow session state under the thread id, if a session state store is configured."""
+    thread_id = cl.context.session.thread_id
+    if session_store is None or not thread_id:
+        return
+    try:
+        await session_store.aput(thread_id, await wf.export_state())
+    except Exception:
+        logger.exception("Failed to save session state.")
+
 @cl.on_chat_start
 async def start():
     logger.info("Chat session started.")
@@ -84,7 +124,7 @@ async def start():
     
     session_id = cl.user_session.get('id')
     logger.info(f"Starting session: {session_id}")
-    wf = await bioinsight_session(session_id, presigned_s3_client=storage_provider)
+    wf = await session_pool.acquire(session_id)
     cl.user_session.set("wf", wf)
 
 @cl.on_settings_update
@@ -128,8 +168,20 @@ async def on_message(message: cl.Message):
                 "evaluating_response"
                 ], False)
             seen_agent_tools = set()
+            # Message the final answer is streamed into as it is generated
+            stream_msg = None
             async for event in handler.stream_events(): 
-                if isinstance(event, (CRDCEvent, MWBEvent, PXEvent)) and not event_started["gathering_data"]:
+                if isinstance(event, ResponseStreamEvent):
+                    if event.reset:
+                        if stream_msg is not None:
+                            await stream_msg.remove()
+                            stream_msg = None
+                        continue
+                    if stream_msg is None:
+                        await update_loader_message(loader_msg, loader_state, loader_id, remove=True)
+                        stream_msg = cl.Message(content="")
+                    await stream_msg.stream_token(event.delta)
+                elif isinstance(event, (CRDCEvent, MWBEvent, PXEvent)) and not event_started["gathering_data"]:
                     event_started["gathering_data"] = True
                     await update_loader_message(loader_msg, loader_state, loader_id, "Gathering relevant information...")
                 elif isinstance(event, GraphEvent) and not event_started["creating_graph"]: 
@@ -160,6 +212,8 @@ async def on_message(message: cl.Message):
                         handler.ctx.send_event(HumanResponseEvent(response=user_input))
                     else:
                         logger.warning("No user input received from Ask* message.")
+                elif isinstance(event, HarmonizationProgressEvent):
+                    await update_loader_message(loader_msg, loader_state, loader_id, event.message)
                 elif isinstance(event, AgentStream):
                     for tool_call in event.tool_calls:
                         tool_id = tool_call.tool_id
@@ -261,7 +315,14 @@ async def on_message(message: cl.Message):
                     logger.exception("Error while rendering Molecule View.")
                     await cl.Message(content="Molecule view could not be rendered.").send()
 
-            await cl.Message(content=response, elements=elements).send()
+            if stream_msg is not None:
+                # the final response is authoritative (e.g. post-processed), replace the streamed text
+                stream_msg.content = response
+                stream_msg.elements = elements
+                await stream_msg.update()
+            else:
+                await cl.Message(content=response, elements=elements).send()
+            await save_session_state(wf)
 
         except Exception:
             logger.exception("An unexpected error occurred while processing the query.")
@@ -275,7 +336,7 @@ async def on_message(message: cl.Message):
             await cl.Message(content="An error occurred while processing your query.").send()
 
 @cl.on_chat_resume
-async def on_chat_resume():
+async def on_chat_resume(thread: ThreadDict):
     logger.info("Resuming chat session.")
     cl_data._data_layer = DynamoDBDataLayer(
         table_name=DATA_LAYER_TABLE,
@@ -284,5 +345,18 @@ async def on_chat_resume():
     )
     
     session_id = cl.user_session.get('id')
-    wf = await bioinsight_session(session_id, presigned_s3_client=storage_provider)
+    state = None
+    if session_store is not None:
+        try:
+            state = await session_store.aget(thread["id"])
+        except Exception:
+            logger.exception("Failed to load session state.")
+    if state is not None:
+        # saved by the worker that served the thread before
+        wf = await session_pool.acquire(session_id)
+        await wf.restore_state(state)
+        logger.info(f"Restored session state of thread {thread['id']}")
+    else:
+        # the intent agent memory is restored from the thread persisted in the data layer
+        wf = await session_pool.acquire(session_id, history=thread_history(thread))
     cl.user_session.set("wf", wf)
\ No newline at end of file
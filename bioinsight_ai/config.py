@@ -15,3 +15,82 @@ PUBLICATIONS_KB_ID = os.environ["PUBLICATIONS_KB_ID"]
 CHAINLIT_STORAGE_BUCKET = os.environ["CHAINLIT_STORAGE_BUCKET"]
 FAST_MODEL = os.environ["FAST_MODEL"]
 GDC_BASE_API = os.environ["GDC_BASE_API"]
+
+# Use Bedrock prompt caching for the static intent recognition prefix (system prompt and context blocks)
+INTENT_PROMPT_CACHE = os.getenv("INTENT_PROMPT_CACHE", "true").lower() == "true"
+
+# Semantic intent cache: reuse the recognized intent of a near-identical earlier query
+INTENT_CACHE_ENABLED = os.getenv("INTENT_CACHE_ENABLED", "true").lower() == "true"
+INTENT_CACHE_MODEL = os.getenv("INTENT_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+INTENT_CACHE_THRESHOLD = float(os.getenv("INTENT_CACHE_THRESHOLD", "0.92"))
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "2048"))
+
+# Rule based intent pre-classifier for queries whose intent is evident (identifiers, source names, harmonization)
+INTENT_PRECLASSIFIER_ENABLED = os.getenv("INTENT_PRECLASSIFIER_ENABLED", "true").lower() == "true"
+
+# Start likely source lookups (accession identifiers in the query) while the intent is recognized
+SPECULATIVE_PREFETCH_ENABLED = os.getenv("SPECULATIVE_PREFETCH_ENABLED", "true").lower() == "true"
+
+# Number of recent turns the intent agent keeps verbatim; older turns are summarized
+INTENT_MEMORY_MAX_TURNS = int(os.getenv("INTENT_MEMORY_MAX_TURNS", "6"))
+
+# Response evaluation: fraction of eligible answers judged, whether the judge blocks the answer (and may retry the
+# source step), and the directory of the JSONL file evaluations are logged to. The file holds user queries and
+# answers, it is only readable by the service user and shared by all worker processes of the host
+RESPONSE_EVAL_SAMPLE_RATE = float(os.getenv("RESPONSE_EVAL_SAMPLE_RATE", "0.2"))
+RESPONSE_EVAL_BLOCKING = os.getenv("RESPONSE_EVAL_BLOCKING", "false").lower() == "true"
+RESPONSE_EVAL_DIR = os.path.abspath(os.getenv("RESPONSE_EVAL_DIR", "/tmp/bioinsight_evaluations"))
+RESPONSE_EVAL_STORE = os.path.join(RESPONSE_EVAL_DIR, "response_evaluations.jsonl")
+
+# Multi-source queries: deadline for each source step and the overall budget for gathering all sources, in seconds.
+# Sources that miss their deadline are cancelled and the answer is synthesized from the others. Per-source overrides
+# use the AvailableSources names, e.g. SOURCE_DEADLINES="PDC=180,PX=60"
+SOURCE_DEADLINE_S = float(os.getenv("SOURCE_DEADLINE_S", "150"))
+SOURCE_DEADLINES = {
+    name.strip(): float(seconds)
+    for name, seconds in (item.split("=") for item in os.getenv("SOURCE_DEADLINES", "").split(",") if item.strip())
+}
+MULTI_SOURCE_SLA_S = float(os.getenv("MULTI_SOURCE_SLA_S", "240"))
+
+# Number of pre-built workflow sessions kept warm for chat start and resume
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "2"))
+
+# Token limit of the per-session CRDC and PX agent chat memories
+SOURCE_AGENT_MEMORY_TOKEN_LIMIT = int(os.getenv("SOURCE_AGENT_MEMORY_TOKEN_LIMIT", "8000"))
+
+# External session state store shared by worker processes, e.g. sqlite:////data/sessions.db or redis://host:6379/0.
+# Empty keeps session state in the worker process only
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_STATE_TTL_S = float(os.getenv("SESSION_STATE_TTL_S", str(7 * 24 * 3600)))
+
+# Versions of the datasets uploaded for harmonization are stored as Parquet files in this directory, the most
+# recently used ones are also kept in memory. Sessions restored from SESSION_STORE_URL read their datasets here, so
+# it must be readable by every worker that shares the store: a volume mounted on every host for a Redis store (the
+# local temp default is rejected with Redis)
+DATASET_STORE_DIR = os.getenv("DATASET_STORE_DIR", "/tmp/bioinsight_datasets")
+DATASET_STORE_MAX_CACHED = int(os.getenv("DATASET_STORE_MAX_CACHED", "8"))
+# Versions kept per dataset besides the initial upload, and seconds after which dataset files not read or written are
+# deleted
+DATASET_STORE_KEEP_VERSIONS = int(os.getenv("DATASET_STORE_KEEP_VERSIONS", "5"))
+DATASET_STORE_TTL_S = float(os.getenv("DATASET_STORE_TTL_S", str(7 * 24 * 3600)))
+# Schema and value matching of datasets with more than BDI_CHUNKED_MIN_ROWS rows work on a profile holding up to this
+# many distinct values of each column instead of the whole dataset
+DATASET_PROFILE_VALUES = int(os.getenv("DATASET_PROFILE_VALUES", "1000"))
+
+# Preload the bdikit schema matching model and the GDC schema at startup
+BDI_PRELOAD_MODELS = os.getenv("BDI_PRELOAD_MODELS", "true").lower() == "true"
+
+# bdikit jobs (matching, materialization) run in a dedicated thread pool of this size, further jobs wait for a free
+# worker so harmonization cannot take over the CPU serving chat traffic
+BDI_MAX_CONCURRENT_JOBS = int(os.getenv("BDI_MAX_CONCURRENT_JOBS", "2"))
+# Seconds between progress updates sent to the UI while a bdikit job runs
+BDI_PROGRESS_INTERVAL_S = float(os.getenv("BDI_PROGRESS_INTERVAL_S", "5"))
+
+# Datasets with more rows than this are harmonized in row batches streamed to a gzip compressed CSV file, instead of
+# being materialized in memory as a new dataset version
+BDI_CHUNKED_MIN_ROWS = int(os.getenv("BDI_CHUNKED_MIN_ROWS", "100000"))
+# Rows per batch, and number of batches materialized in parallel
+BDI_CHUNK_ROWS = int(os.getenv("BDI_CHUNK_ROWS", "50000"))
+BDI_CHUNK_WORKERS = int(os.getenv("BDI_CHUNK_WORKERS", "1"))
+# Harmonized files of at least this size are uploaded to S3 and returned as a download link
+BDI_S3_UPLOAD_MIN_BYTES = int(os.getenv("BDI_S3_UPLOAD_MIN_BYTES", str(50 * 1024 * 1024)))
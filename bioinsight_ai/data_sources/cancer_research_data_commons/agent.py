@@ -1,10 +1,24 @@
 from llama_index.core.agent import FunctionCallingAgent
+from llama_index.core.memory import ChatMemoryBuffer
+from config import SOURCE_AGENT_MEMORY_TOKEN_LIMIT
 from .proteomic_data_commons.tools import tools as pdc_tools
 from .imaging_data_commons.tools import tools as idc_tools
 from .genomic_data_commons.GDC_tools import gdc_tools
 from workflow_config.default_settings import Settings
 
-agent = FunctionCallingAgent.from_tools(
-        tools=pdc_tools + idc_tools + gdc_tools,
+# Tool definitions are shared by all sessions, each session gets its own agent and memory
+tools = pdc_tools + idc_tools + gdc_tools
+
+def create_crdc_agent(session_id: str) -> dict:
+    memory = ChatMemoryBuffer.from_defaults(token_limit=SOURCE_AGENT_MEMORY_TOKEN_LIMIT, chat_store_key=session_id)
+
+    agent = FunctionCallingAgent.from_tools(
+        tools=tools,
+        memory=memory,
         verbose=True
-    )
\ No newline at end of file
+    )
+
+    return {
+        "agent": agent,
+        "memory": memory
+    }
@@ -4,6 +4,7 @@ import re
 from io import StringIO
 from typing import List
 import pandas as pd
+from utils.prefetch_cache import prefetch_cache
 # from ..ensembl_api import gene_name_to_ensembl_mapping
 
 # This is a set of helper function for retrieving and processing data from PDC
@@ -378,6 +379,7 @@ def get_matches_from_gdc(study_id, ensembl_ids)->pd.DataFrame:
 
 
 # Return the study name based on Study ID.
+@prefetch_cache.memoize
 def get_study_name(study_id):
     """Return the name of the study based on the study ID"""
     url = pdc_url + '{getPaginatedUIStudy(pdc_study_id: "' + study_id + '" limit: 10 offset: 0) {'
@@ -100,7 +100,8 @@ study_agent = FunctionAgent(
         ""
         "Step 4: If the criteria in Step 3 is met then use the tool 'call_rest_endpoint' to fetch data and answer the query. "
         "If clarification is needed from the user be then ask for clarification. If you have made ANY corrections to the user's query " 
-        "mention that in your response.\n"
+        "mention that in your response. For the 'datatable' and 'untarg_data' output items 'call_rest_endpoint' returns summary "
+        "statistics and a download link instead of the full table; report both to the user.\n"
         "Step 5: If the criteria in Step 3 is violated then restart at Step 1, but reconsider the arguments passed to 'endpoint_kwargs' or "
         "if clarification is needed from the user be then ask for clarification but be direct.\n"
     ),
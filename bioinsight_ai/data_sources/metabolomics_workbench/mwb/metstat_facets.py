@@ -0,0 +1,109 @@
+import difflib
+import json
+import os
+import re
+from typing import Literal, Optional
+from pydantic import BaseModel
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Local index of valid metstat facet values (species, sample source, disease). Loaded once per process and used to
+# resolve free-text user terms to the exact values the metstat REST endpoint expects, instead of enumerating every
+# value in the LLM tool schema.
+#
+
+FACETS_PATH = os.path.join(os.path.dirname(__file__), "metstat_facets.json")
+
+Facet = Literal["species", "sample_source", "disease"]
+
+# Common scientific names mapped onto the common names used by the Metabolomics Workbench
+SYNONYMS = {
+    "species": {
+        "homo sapiens": "Human",
+        "mus musculus": "Mouse",
+        "mice": "Mouse",
+        "rattus norvegicus": "Rat",
+        "danio rerio": "Zebrafish",
+        "saccharomyces cerevisiae": "Yeast",
+    }
+}
+
+# Minimum difflib similarity ratio to accept a fuzzy match without asking for clarification
+MATCH_CUTOFF = 0.85
+# Minimum similarity ratio for a value to be offered as a suggestion
+SUGGESTION_CUTOFF = 0.6
+
+
+class FacetMatch(BaseModel):
+    """
+    Result of resolving a user term against a facet.
+
+    Fields:
+    - term: The term as provided.
+    - value: The matched facet value, or None if the term could not be resolved confidently.
+    - suggestions: Closest valid values, populated when value is None.
+    """
+    term: str
+    value: Optional[str] = None
+    suggestions: list[str] = []
+
+
+def _normalize(term: str) -> str:
+    """Case-fold, drop punctuation and collapse whitespace."""
+    term = re.sub(r"[^\w\s]", " ", term.casefold())
+    return " ".join(term.split())
+
+
+class MetstatFacetIndex:
+    def __init__(self, facets: dict[str, list[str]]):
+        self.facets = facets
+        # normalized form -> canonical value, per facet
+        self._lookup = {}
+        for facet, values in facets.items():
+            lookup = {_normalize(value): value for value in values}
+            for synonym, value in SYNONYMS.get(facet, {}).items():
+                lookup.setdefault(_normalize(synonym), value)
+            self._lookup[facet] = lookup
+
+    @classmethod
+    def load(cls, path: str = FACETS_PATH) -> "MetstatFacetIndex":
+        with open(path, "r") as f:
+            facets = json.load(f)
+        logger.info(f"[MWB metstat] Loaded facet index: {', '.join(f'{k}={len(v)}' for k, v in facets.items())}")
+        return cls(facets)
+
+    def resolve(self, facet: Facet, term: str) -> FacetMatch:
+        """
+        Resolve a user term to a valid value of the given facet.
+
+        Matching is tried in order: exact (ignoring case and punctuation, including known synonyms), singular/plural
+        variant, then fuzzy matching. A fuzzy match is only accepted when it is both close and unambiguous,
+        otherwise the closest values are returned as suggestions.
+        """
+        lookup = self._lookup[facet]
+        normalized = _normalize(term)
+        if not normalized:
+            return FacetMatch(term=term, value="")
+
+        singular = normalized[:-1] if normalized.endswith("s") else normalized
+        for candidate in (normalized, singular, normalized + "s"):
+            if candidate in lookup:
+                return FacetMatch(term=term, value=lookup[candidate])
+
+        scored = sorted(
+            ((difflib.SequenceMatcher(None, normalized, key).ratio(), key) for key in lookup),
+            reverse=True
+        )
+        best_ratio, best_key = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        if best_ratio >= MATCH_CUTOFF and best_ratio - runner_up > 0.05:
+            return FacetMatch(term=term, value=lookup[best_key])
+
+        # substring matches (e.g. "breast" -> "Breast tissue") are good suggestions even when the ratio is low
+        suggestions = [lookup[key] for key in lookup if normalized in key]
+        suggestions += [lookup[key] for ratio, key in scored if ratio >= SUGGESTION_CUTOFF]
+        return FacetMatch(term=term, suggestions=list(dict.fromkeys(suggestions))[:10])
+
+
+metstat_facets = MetstatFacetIndex.load()
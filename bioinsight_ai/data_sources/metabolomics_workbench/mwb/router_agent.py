@@ -11,7 +11,7 @@ router_agent = FunctionAgent(
     name="Router Agent",
     description=(
         "This agent does not answer user queries directly. Instead, it analyzes the query and determines which agent "
-        "or agents are best suited to handle it. It uses the `handoff` tool to pass the query along with a detailed reason. "
+        "or agents are best suited to handle it. It uses the `handoff` or `parallel_handoff` tool to pass the query along with a detailed reason. "
         "The reason should help the next agent(s) understand the context and decide whether to respond or hand off again."
     ),
     system_prompt=(
@@ -21,9 +21,12 @@ router_agent = FunctionAgent(
         "- Why the selected agent is appropriate.\n"
         "- What the agent should focus on.\n"
         "- Whether the agent should consider handing off again, and if so, to which agent(s) and why.\n\n"
-        "You must not attempt to answer the query yourself or use any tools other than `handoff`."
+        "If the query spans several context areas that can each be answered independently (e.g. details of a compound and "
+        "the studies containing it), use the `parallel_handoff` tool instead to hand off to all of the relevant agents at once. "
+        "Use `handoff` when one agent needs another agent's output first.\n\n"
+        "You must not attempt to answer the query yourself or use any tools other than `handoff` and `parallel_handoff`."
     ),
-    tools=[],  # No tools needed since handoff is built-in
+    tools=[],  # No tools needed since handoff is built-in and parallel_handoff is added by RetryAgentWorkflow
     can_hand_off_to=[
         "Compound Agent",
         "Gene Agent",
@@ -0,0 +1,154 @@
+import asyncio
+import math
+import os
+import tempfile
+import uuid
+import aiohttp
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from storage.presigned_s3_client import current_s3_client
+from log_helper.logger import get_logger
+
+logger = get_logger()
+
+#
+# Bulk export of study-level Metabolomics Workbench data tables. Large tables are streamed to disk in chunks,
+# converted to Parquet incrementally and uploaded to S3, and only summary statistics and a download link are
+# returned to the LLM.
+#
+
+# Study context output items that return full data tables
+BULK_OUTPUT_ITEMS = ("datatable", "untarg_data")
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "mwb_exports")
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+PARSE_CHUNK_ROWS = 5000
+# Number of columns described in the summary returned to the LLM
+SUMMARY_MAX_COLUMNS = 20
+
+async def _download_to_file(endpoint: str, path: str) -> int:
+    """Stream the endpoint body to disk and return the number of bytes written."""
+    size = 0
+    async with aiohttp.ClientSession() as session:
+        async with session.get(endpoint) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                    f.write(chunk)
+                    size += len(chunk)
+    return size
+
+
+def _numeric_columns(tsv_path: str) -> list:
+    """Columns of a tab delimited table whose values all parse as numbers, found in a pass over the whole file."""
+    columns, non_numeric = None, set()
+    for chunk in pd.read_csv(tsv_path, sep="\t", chunksize=PARSE_CHUNK_ROWS, dtype=str):
+        columns = columns if columns is not None else list(chunk.columns)
+        for col in columns:
+            if col not in non_numeric and pd.to_numeric(chunk[col].dropna(), errors="coerce").isna().any():
+                non_numeric.add(col)
+    return [col for col in columns or [] if col not in non_numeric]
+
+
+def _tsv_to_parquet(tsv_path: str, parquet_path: str) -> dict:
+    """
+    Convert a tab delimited table to Parquet in row batches, accumulating per-column statistics as it goes.
+
+    Columns whose values all parse as numbers (checked over the whole file first) are stored as float64, all other
+    columns as strings, so no value is lost to a type guessed from the first rows.
+    """
+    writer = None
+    numeric_cols = _numeric_columns(tsv_path)
+    stats = {}
+    n_rows = 0
+    try:
+        # read as text so string columns keep their values as written (e.g. leading zeros)
+        for chunk in pd.read_csv(tsv_path, sep="\t", chunksize=PARSE_CHUNK_ROWS, dtype=str):
+            if writer is None:
+                schema = pa.schema([
+                    pa.field(str(col), pa.float64() if col in numeric_cols else pa.string())
+                    for col in chunk.columns
+                ])
+                writer = pq.ParquetWriter(parquet_path, schema, compression="zstd")
+                stats = {col: {"count": 0, "sum": 0.0, "min": math.inf, "max": -math.inf} for col in numeric_cols}
+
+            for col in chunk.columns:
+                if col in numeric_cols:
+                    chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype("float64")
+                    values = chunk[col].dropna()
+                    if not values.empty:
+                        col_stats = stats[col]
+                        col_stats["count"] += int(values.count())
+                        col_stats["sum"] += float(values.sum())
+                        col_stats["min"] = min(col_stats["min"], float(values.min()))
+                        col_stats["max"] = max(col_stats["max"], float(values.max()))
+                else:
+                    chunk[col] = chunk[col].astype("string")
+            chunk.columns = [str(col) for col in chunk.columns]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError("The data table returned by the Metabolomics Workbench is empty.")
+
+    column_summary = {
+        col: {
+            "count": s["count"],
+            "mean": round(s["sum"] / s["count"], 4),
+            "min": s["min"],
+            "max": s["max"]
+        }
+        for col, s in stats.items() if s["count"]
+    }
+    return {
+        "rows": n_rows,
+        "columns": len(schema),
+        "column_names": [field.name for field in schema][:SUMMARY_MAX_COLUMNS],
+        "numeric_columns": len(numeric_cols),
+        "numeric_summary": dict(list(column_summary.items())[:SUMMARY_MAX_COLUMNS])
+    }
+
+
+async def export_study_data(input_item: str, input_value: str, output_item: str) -> dict:
+    """
+    Download a study-level Metabolomics Workbench data table ('datatable' or 'untarg_data') in chunks, convert it
+    to Parquet and upload it to storage. Returns summary statistics and a download link instead of the full table.
+    """
+    endpoint = f"https://www.metabolomicsworkbench.org/rest/study/{input_item}/{input_value}/{output_item}"
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    export_id = f"{input_value}_{output_item}_{uuid.uuid4().hex[:8]}"
+    tsv_path = os.path.join(EXPORT_DIR, f"{export_id}.tsv")
+    parquet_path = os.path.join(EXPORT_DIR, f"{export_id}.parquet")
+
+    try:
+        logger.info(f"[MWB Export] Streaming {endpoint} to {tsv_path}")
+        size = await _download_to_file(endpoint, tsv_path)
+        summary = await asyncio.to_thread(_tsv_to_parquet, tsv_path, parquet_path)
+        summary["download_size_bytes"] = size
+        logger.info(f"[MWB Export] Converted {summary['rows']} rows x {summary['columns']} columns to {parquet_path}")
+
+        storage_client = current_s3_client.get()
+        try:
+            if storage_client is None:
+                raise RuntimeError("No storage client configured for this session")
+            upload = await storage_client.upload_file(
+                file_path=parquet_path,
+                object_key=f"mwb/{export_id}.parquet",
+                mime="application/vnd.apache.parquet"
+            )
+            summary["download_url"] = upload["url"]
+            os.remove(parquet_path)
+        except Exception as e:
+            logger.exception(f"[MWB Export] Upload failed, keeping local file {parquet_path}: {e}")
+            summary["local_path"] = parquet_path
+    finally:
+        if os.path.exists(tsv_path):
+            os.remove(tsv_path)
+
+    summary["note"] = ("The full table was not loaded into the conversation. Share the download link (as a markdown "
+                       "link) with the user along with the summary statistics.")
+    return summary
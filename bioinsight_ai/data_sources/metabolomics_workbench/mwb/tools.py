@@ -1,7 +1,10 @@
 import aiohttp
 from typing import Literal
+from utils.prefetch_cache import prefetch_cache
 from utils.token_counter import check_token_limit
 from workflow_config.default_settings import Settings
+from data_sources.metabolomics_workbench.retry_agent_workflow import TRANSIENT_HTTP_STATUSES
+from .study_export import BULK_OUTPUT_ITEMS, export_study_data
 from log_helper.logger import get_logger
 
 logger = get_logger()
@@ -24,18 +27,33 @@ async def call_rest_endpoint(context: Literal["study", "compound", "refmet", "pr
         # Compound agent can return PNG endpoint for compound structure. This should be displayed in UI if 
         # returned as markdown.
         return f"Return the following URL in markdown format: {endpoint}"
+    elif context == "study" and output_item in BULK_OUTPUT_ITEMS:
+        # Full data tables can be many megabytes, so stream them to storage and only return a summary
+        return await export_study_data(input_item, input_value, output_item)
     else: 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(endpoint) as response:
-                if response.ok:
-                    try:
-                        data = await response.json()
-                    except:
-                        data = await response.text()
-                    exceed_limit_msg = check_token_limit(Settings.llm, text = str(data))
-                    if exceed_limit_msg:
-                        return exceed_limit_msg
-                    return data
-                else:
-                    logger.error(f"[MWB REST API] Call failed with response: {response.status}:{response.reason}")
-                    return None
\ No newline at end of file
+        data = await fetch_rest_endpoint(endpoint)
+        if data is None:
+            return None
+        exceed_limit_msg = check_token_limit(Settings.llm, text = str(data))
+        if exceed_limit_msg:
+            return exceed_limit_msg
+        return data
+
+# Plain GET of a MWB REST endpoint. Memoized so speculative prefetches (see speculative_prefetch) are picked up by
+# the agents' calls.
+@prefetch_cache.memoize
+async def fetch_rest_endpoint(endpoint: str):
+    """Fetch a Metabolomic REST endpoint, returning the JSON (or text) body or None if the call failed."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(endpoint) as response:
+            if response.ok:
+                try:
+                    return await response.json()
+                except:
+                    return await response.text()
+            else:
+                logger.error(f"[MWB REST API] Call failed with response: {response.status}:{response.reason}")
+                if response.status in TRANSIENT_HTTP_STATUSES:
+                    # raised so RetryAgentWorkflow can retry this call without re-running the agent
+                    response.raise_for_status()
+                return None
\ No newline at end of file
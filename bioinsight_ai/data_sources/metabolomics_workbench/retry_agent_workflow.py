@@ -1,28 +1,309 @@
+import asyncio
+import json
+from enum import Enum
+from typing import Any, List, Literal, Optional, Sequence, Union
+import aiohttp
+import requests
+from pydantic import Field, create_model
 from llama_index.core.agent.workflow import (
+    AgentInput,
     AgentWorkflow,
     ToolCallResult
 )
+from llama_index.core.tools import AsyncBaseTool, FunctionTool, ToolOutput
+from llama_index.core.workflow import Context, StopEvent, step
 from log_helper.logger import get_logger
 logger = get_logger()
 
+# HTTP statuses worth repeating the same request for (timeouts, throttling and upstream/server errors)
+TRANSIENT_HTTP_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Context key holding successful tool outputs for the current run, keyed by tool name and arguments
+TOOL_RESULT_CACHE = "tool_result_cache"
+
+PARALLEL_HANDOFF_TOOL = "parallel_handoff"
+
+# Context key holding the tool call results of the parallel handoff branches of the current run
+BRANCH_TOOL_CALLS = "branch_tool_calls"
+
+# Tools with side effects on the workflow state are never memoized
+UNCACHED_TOOLS = frozenset({"handoff", PARALLEL_HANDOFF_TOOL})
+
+PARALLEL_HANDOFF_DESCRIPTION = """Useful for handing off to several agents at once when the request spans more than one of their
+areas (e.g. a compound and the studies containing it). The agents run concurrently and their responses are returned
+together as the final answer, so only use this when each agent can answer its part independently. Use `handoff` when
+a single agent is enough or when one agent needs another's output.
+
+Currently available agents:
+{agent_info}
+"""
+
+
+class FailureKind(str, Enum):
+    """
+    Classification of a failed MWB workflow step, used to decide how much of the run to repeat.
+    """
+
+    TRANSIENT = "transient"
+    """Network/HTTP error from a tool. Retried at the tool call, without re-running the agent."""
+
+    LLM = "llm"
+    """LLM error, empty content or any other failure. Retried from the agent that was handling the request."""
+
+
+def classify_failure(error: Exception) -> FailureKind:
+    """
+    Classify an exception raised during a run as a transient HTTP error or an LLM/other failure.
+    """
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ServerTimeoutError, aiohttp.ClientConnectionError,
+                          requests.ConnectionError, requests.Timeout)):
+        return FailureKind.TRANSIENT
+    if isinstance(error, aiohttp.ClientResponseError) and error.status in TRANSIENT_HTTP_STATUSES:
+        return FailureKind.TRANSIENT
+    if isinstance(error, requests.HTTPError) and error.response is not None \
+            and error.response.status_code in TRANSIENT_HTTP_STATUSES:
+        return FailureKind.TRANSIENT
+    return FailureKind.LLM
+
+
 class RetryAgentWorkflow(AgentWorkflow):
-    async def run(self, 
-                  user_query: str, 
-                  max_retries: str = 3, 
+    def __init__(self,
+                 *args,
+                 max_tool_retries: int = 3,
+                 tool_retry_backoff: float = 1.0,
+                 parallel_handoff: bool = False,
+                 **kwargs):
+        """
+        Args:
+            max_tool_retries (int): Attempts per tool call when the tool fails with a transient HTTP error.
+            tool_retry_backoff (float): Base delay in seconds between tool attempts, doubled after each attempt.
+            parallel_handoff (bool): If True, the root agent also gets a `parallel_handoff` tool that runs several
+                agents concurrently and joins their responses.
+            *args, **kwargs: Passed on to AgentWorkflow.
+        """
+        super().__init__(*args, **kwargs)
+        self.max_tool_retries = max_tool_retries
+        self.tool_retry_backoff = tool_retry_backoff
+        self.parallel_handoff = parallel_handoff
+        # single-agent workflows used to run fan-out branches, created on first use
+        self._branch_workflows: dict[str, RetryAgentWorkflow] = {}
+        self._parallel_handoff_tool = self._create_parallel_handoff_tool() if parallel_handoff else None
+
+    def _create_parallel_handoff_tool(self) -> Optional[FunctionTool]:
+        """
+        Build the `parallel_handoff` tool for the root agent. The target agents are an enum in the tool schema so the
+        LLM can only pick agents the root agent is allowed to hand off to.
+        """
+        root = self.agents[self.root_agent]
+        targets = [name for name in self.agents
+                   if name != root.name and (root.can_handoff_to is None or name in root.can_handoff_to)]
+        if len(targets) < 2:
+            return None
+
+        fn_schema = create_model(
+            PARALLEL_HANDOFF_TOOL,
+            to_agents=(List[Literal[tuple(targets)]], Field(description="The agents to hand off to, at least two.")),
+            reason=(str, Field(description="Why these agents were selected and which part of the request each should focus on."))
+        )
+        agent_info = {name: self.agents[name].description for name in targets}
+        return FunctionTool.from_defaults(
+            async_fn=self._parallel_handoff,
+            name=PARALLEL_HANDOFF_TOOL,
+            description=PARALLEL_HANDOFF_DESCRIPTION.format(agent_info=str(agent_info)),
+            fn_schema=fn_schema,
+            return_direct=True
+        )
+
+    async def get_tools(self, agent_name: str, input_str: Optional[str] = None) -> Sequence[AsyncBaseTool]:
+        """Get tools for the given agent, adding `parallel_handoff` for the root agent when enabled."""
+        tools = await super().get_tools(agent_name, input_str)
+        if self._parallel_handoff_tool is not None and agent_name == self.root_agent:
+            tools = [*tools, self._parallel_handoff_tool]
+        return tools
+
+    def _branch_workflow(self, agent_name: str) -> "RetryAgentWorkflow":
+        """Single-agent workflow for one fan-out branch. With one agent there is no handoff tool, so the branch
+        answers on its own."""
+        if agent_name not in self._branch_workflows:
+            self._branch_workflows[agent_name] = RetryAgentWorkflow(
+                agents=[self.agents[agent_name]],
+                root_agent=agent_name,
+                timeout=self._timeout,
+                verbose=self._verbose,
+                max_tool_retries=self.max_tool_retries,
+                tool_retry_backoff=self.tool_retry_backoff
+            )
+        return self._branch_workflows[agent_name]
+
+    async def _parallel_handoff(self, ctx: Context, to_agents: List[str], reason: str) -> str:
+        """
+        Fan the current request out to several agents concurrently and join their responses. Each branch sees the
+        conversation so far plus the handoff message. The branches' tool call results are kept in the Context and
+        added to the run's output by `aggregate_tool_results`, so UI elements (e.g. molecule views) produced by a
+        branch are kept.
+        """
+        to_agents = list(dict.fromkeys(name for name in to_agents if name in self.agents and name != self.root_agent))
+        logger.info(f"[MWB RetryAgentWorkflow] Parallel handoff to: {', '.join(to_agents)}")
+
+        memory = await ctx.get("memory")
+        # the current request is the last message in memory and is replaced by the handoff message
+        chat_history = (await memory.aget())[:-1]
+        handoff_output_prompt = await ctx.get("handoff_output_prompt", default=self.handoff_output_prompt.get_template())
+
+        replies = await asyncio.gather(
+            *[
+                self._branch_workflow(name).run(
+                    handoff_output_prompt.format(to_agent=name, reason=reason),
+                    chat_history=chat_history
+                )
+                for name in to_agents
+            ],
+            return_exceptions=True
+        )
+
+        sections = []
+        branch_tool_calls = []
+        for name, reply in zip(to_agents, replies):
+            if isinstance(reply, Exception):
+                logger.error(f"[MWB RetryAgentWorkflow] Parallel branch {name} failed: {reply}")
+                content = "Unable to retrieve a response from this agent."
+            else:
+                content = reply.response.content
+                branch_tool_calls.extend(reply.tool_calls)
+            sections.append(f"**{name}**\n\n{content}")
+
+        await ctx.set(BRANCH_TOOL_CALLS, [*await ctx.get(BRANCH_TOOL_CALLS, default=[]), *branch_tool_calls])
+        return "\n\n".join(sections)
+
+    @step
+    async def aggregate_tool_results(
+        self, ctx: Context, ev: ToolCallResult
+    ) -> Union[AgentInput, StopEvent, None]:
+        """
+        Aggregate tool results as AgentWorkflow does. A return-direct tool (such as `parallel_handoff`) ends the run
+        with its tool calls reduced to ToolSelections, which drop the tool outputs, so the full results of the
+        parallel handoff branches are added to the output here.
+        """
+        result = await super().aggregate_tool_results(ctx, ev)
+        if isinstance(result, StopEvent):
+            branch_tool_calls = await ctx.get(BRANCH_TOOL_CALLS, default=[])
+            if branch_tool_calls:
+                result.result.tool_calls.extend(branch_tool_calls)
+                await ctx.set(BRANCH_TOOL_CALLS, [])
+        return result
+
+    def format_handoff_output_prompt(self, **prompt_kwargs: str) -> str:
+        """
+        Fill per-run variables (e.g. the user's request) into the handoff output prompt compiled at construction.
+        The {to_agent} and {reason} placeholders are preserved for the built-in `handoff` tool to format, and
+        braces in the supplied values are escaped so they survive that second format.
+        """
+        escaped_kwargs = {k: str(v).replace("{", "{{").replace("}", "}}") for k, v in prompt_kwargs.items()}
+        return self.handoff_output_prompt.format(to_agent="{to_agent}", reason="{reason}", **escaped_kwargs)
+
+    @staticmethod
+    def _tool_cache_key(tool_name: str, tool_input: dict[str, Any]) -> str:
+        return f"{tool_name}:{json.dumps(tool_input, sort_keys=True, default=str)}"
+
+    async def _call_tool(self, ctx: Context, tool: AsyncBaseTool, tool_input: dict) -> ToolOutput:
+        """
+        Call the given tool, retrying transient HTTP failures in place and reusing successful outputs of identical
+        calls made earlier in the same run (e.g. by a previous attempt).
+        """
+        tool_name = tool.metadata.name
+        memoize = tool_name not in UNCACHED_TOOLS
+        cache_key = self._tool_cache_key(tool_name, tool_input)
+
+        if memoize:
+            cache = await ctx.get(TOOL_RESULT_CACHE, default={})
+            if cache_key in cache:
+                logger.info(f"[MWB RetryAgentWorkflow] Reusing result of {tool_name} from earlier in this run.")
+                return cache[cache_key]
+
+        for attempt in range(1, self.max_tool_retries + 1):
+            try:
+                if isinstance(tool, FunctionTool) and tool.requires_context and tool.ctx_param_name is not None:
+                    tool_output = await tool.acall(**{**tool_input, tool.ctx_param_name: ctx})
+                else:
+                    tool_output = await tool.acall(**tool_input)
+                break
+            except asyncio.CancelledError:
+                # the caller gave up (e.g. a source deadline). The workflow run has its own tasks and keeps calling
+                # the LLM and tools unless it is cancelled as well
+                if handler is not None:
+                    await self._cancel_handler(handler)
+                raise
+            except Exception as e:
+                failure = classify_failure(e)
+                if failure == FailureKind.TRANSIENT and attempt < self.max_tool_retries:
+                    delay = self.tool_retry_backoff * 2 ** (attempt - 1)
+                    logger.warning(f"[MWB RetryAgentWorkflow] Transient error from {tool_name} "
+                                   f"(attempt {attempt}): {e}. Retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                logger.warning(f"[MWB RetryAgentWorkflow] Tool {tool_name} failed ({failure.value}): {e}")
+                return ToolOutput(
+                    content=str(e),
+                    tool_name=tool_name,
+                    raw_input=tool_input,
+                    raw_output=str(e),
+                    is_error=True,
+                )
+
+        if memoize and not tool_output.is_error:
+            cache = await ctx.get(TOOL_RESULT_CACHE, default={})
+            cache[cache_key] = tool_output
+            await ctx.set(TOOL_RESULT_CACHE, cache)
+        return tool_output
+
+    @staticmethod
+    async def _cancel_handler(handler) -> None:
+        """Cancels a workflow run and waits until its steps have stopped."""
+        await handler.cancel_run()
+        try:
+            await handler
+        except (Exception, asyncio.CancelledError):
+            pass
+        logger.info("[MWB RetryAgentWorkflow] Run cancelled.")
+
+    async def run(self,
+                  user_query: str,
+                  max_retries: str = 3,
                   fallback_message: str = "Sorry, I was unable to retrieve a valid response.",
+                  handoff_prompt_kwargs: Optional[dict[str, str]] = None,
                   **kwargs):
         """
         Run the agent workflow with retry logic and fallback behavior.
         Assumes reply.response.content always exists and can be overwritten.
+
+        Per-run prompt overrides (`handoff_prompt_kwargs`) are written to the run Context rather than the shared
+        workflow prompts. A fresh Context is created for each run unless one is supplied, so concurrent runs in the
+        same session can't clobber each other's prompts or agent state.
+
+        Transient tool failures are retried at the tool call (see `_call_tool`). Any other failure, including an
+        empty response, retries the run from the agent that was handling the request rather than the root agent,
+        and tool calls that already succeeded in this run are answered from the run's result cache.
         """
         reply = None
+        if kwargs.get("ctx") is None:
+            kwargs["ctx"] = Context(self)
+        ctx = kwargs["ctx"]
+
+        if handoff_prompt_kwargs:
+            # `handoff` reads its template from the Context, falling back to the workflow default
+            await ctx.set("handoff_output_prompt", self.format_handoff_output_prompt(**handoff_prompt_kwargs))
+        await ctx.set(TOOL_RESULT_CACHE, {})
 
         for attempt in range(1, max_retries + 1):
             logger.info(f"[MWB RetryAgentWorkflow] Attempt {attempt} for query: {user_query}")
-            try:        
+            # tool calls of a failed attempt are re-emitted from the cache if the agent repeats them
+            await ctx.set("current_tool_calls", [])
+            await ctx.set(BRANCH_TOOL_CALLS, [])
+            handler = None
+            try:
                 handler = super().run(user_query, **kwargs)
                 current_agent = None
-                async for event in handler.stream_events(): 
+                async for event in handler.stream_events():
                     if (hasattr(event, "current_agent_name") and event.current_agent_name != current_agent):
                         current_agent = event.current_agent_name
                         logger.info(f"[MWB RetryAgentWorkflow] Current agent: {current_agent}")
@@ -32,23 +313,37 @@ class RetryAgentWorkflow(AgentWorkflow):
                             f"Arguments: {event.tool_kwargs}\n"
                             f"Output: {event.tool_output}"
                             )
-                        
+
                 reply = await handler
-                # 'current_agent_name' special key in context. If empty will use root agent
-                # this forces each run to start with root agent
-                if 'ctx' in kwargs:
-                    await kwargs['ctx'].set('current_agent_name', None)
                 logger.debug(f"[MWB RetryAgentWorkflow] response content produced: {reply.response.content}")
 
                 if hasattr(reply, "response") and getattr(reply.response, "content", None):
                     logger.info("[MWB RetryAgentWorkflow] Successful response received.")
+                    # 'current_agent_name' special key in context. If empty will use root agent
+                    # this forces each run to start with root agent
+                    await ctx.set('current_agent_name', None)
                     return reply
-                else:
-                    logger.warning("[MWB RetryAgentWorkflow] No content in response. Retrying...")
+                failure = FailureKind.LLM
+                logger.warning("[MWB RetryAgentWorkflow] No content in response.")
+            except asyncio.CancelledError:
+                # the caller gave up (e.g. a source deadline). The workflow run has its own tasks and keeps calling
+                # the LLM and tools unless it is cancelled as well
+                if handler is not None:
+                    await self._cancel_handler(handler)
+                raise
             except Exception as e:
-                logger.exception(f"[MWB RetryAgentWorkflow] Exception during run: {e}")
+                failure = classify_failure(e)
+                logger.exception(f"[MWB RetryAgentWorkflow] Exception during run ({failure.value}): {e}")
+
+            # 'current_agent_name' still holds the agent handling the request when the attempt failed; any
+            # handoffs before it succeeded, so the next attempt resumes there instead of at the root agent
+            resume_agent = await ctx.get('current_agent_name', default=None)
+            logger.info(f"[MWB RetryAgentWorkflow] Retrying from agent: {resume_agent or self.root_agent}")
+            if failure == FailureKind.TRANSIENT:
+                await asyncio.sleep(self.tool_retry_backoff * 2 ** (attempt - 1))
 
         logger.error("[MWB RetryAgentWorkflow] Max retries reached. Returning fallback response.")
+        await ctx.set('current_agent_name', None)
 
         # Assume reply exists and has .response.content
         if reply is not None and hasattr(reply, "response"):
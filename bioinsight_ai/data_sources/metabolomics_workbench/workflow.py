@@ -1,5 +1,4 @@
 from llama_index.core.memory import Memory
-from llama_index.core.workflow import Context
 from log_helper.logger import get_logger
 logger = get_logger()
 from data_sources.metabolomics_workbench.retry_agent_workflow import RetryAgentWorkflow
@@ -30,17 +29,16 @@ def create_mwb_workflow(session_id: str) -> dict:
         root_agent=router_agent.name,
         timeout=None,
         verbose=False,
-        handoff_output_prompt=DEFAULT_HANDOFF_OUTPUT_PROMPT
+        handoff_output_prompt=DEFAULT_HANDOFF_OUTPUT_PROMPT,
+        parallel_handoff=True
     )
 
     memory = Memory.from_defaults(session_id=session_id,
                                   token_limit=100000)
-    context = Context(agent_workflow)
-    
+
     logger.info(f"[MWB workflow]: Created memory for session:{session_id}")
 
     return {
         "agent_workflow": agent_workflow,
-        "context": context,
         "memory": memory
     }
@@ -1,12 +1,26 @@
 from llama_index.core.agent import FunctionCallingAgent
+from llama_index.core.memory import ChatMemoryBuffer
+from config import SOURCE_AGENT_MEMORY_TOKEN_LIMIT
 from workflow_config.default_settings import Settings
 from .tools import tools
 
-agent = FunctionCallingAgent.from_tools(
-    system_prompt="""You are an expert on ProteomeXchange (PX), a global consortium that provides 
+system_prompt = """You are an expert on ProteomeXchange (PX), a global consortium that provides 
                              standardized data submission and dissemination of mass spectrometry proteomics data across multiple 
                              partner repositories. Your job is to answer questions related to this source. Use only the information 
                              from your tools. Do not use outside knowledge. Currently, your tool set is limited, which is something 
-                             you can acknowledge in your response.""",
-    tools=tools
-    )
\ No newline at end of file
+                             you can acknowledge in your response."""
+
+# Tool definitions are shared by all sessions, each session gets its own agent and memory
+def create_px_agent(session_id: str) -> dict:
+    memory = ChatMemoryBuffer.from_defaults(token_limit=SOURCE_AGENT_MEMORY_TOKEN_LIMIT, chat_store_key=session_id)
+
+    agent = FunctionCallingAgent.from_tools(
+        system_prompt=system_prompt,
+        tools=tools,
+        memory=memory
+    )
+
+    return {
+        "agent": agent,
+        "memory": memory
+    }
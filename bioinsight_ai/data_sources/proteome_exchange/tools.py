@@ -5,10 +5,12 @@ import pyteomics.mztab as mztab
 import gzip as gz
 import shutil
 from llama_index.core.tools import FunctionTool
+from utils.prefetch_cache import prefetch_cache
 
 
 # This is a set of helper function for retrieving and processing data from proteome exchange
 
+@prefetch_cache.memoize
 def get_data_from_proteome_exchange(px_id: str):
     """
     Returns the data for a give proteome exchange ID
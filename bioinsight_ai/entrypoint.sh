@@ -1,4 +1,4 @@
-#!/bin/sh
+#!/bin/bash
 
 set -e  # Exit immediately on error
 
@@ -16,12 +16,33 @@ if [ "$USAGE" -ge 95 ]; then
   exit 1
 fi
 
+# Number of Chainlit worker processes. Workers listen on consecutive ports starting at 8000 and are meant to run
+# behind a load balancer; session state is shared through SESSION_STORE_URL so a chat can resume on any worker.
+WORKERS=${WORKERS:-1}
 CMD="chainlit run chainlit_app.py --host 0.0.0.0 --port 8000"
 
 case "$APP_ENV" in
   local|dev|stage|prod)
-    echo "Starting Chainlit with command: $CMD"
-    exec sh -c "$CMD"
+    if [ "$WORKERS" -le 1 ]; then
+      echo "Starting Chainlit with command: $CMD"
+      exec sh -c "$CMD"
+    fi
+
+    export SESSION_STORE_URL="${SESSION_STORE_URL:-sqlite:////tmp/bioinsight_sessions.db}"
+    echo "Starting $WORKERS Chainlit workers, session store: $SESSION_STORE_URL"
+    # stop the remaining workers when the script exits
+    trap 'kill $(jobs -p) 2>/dev/null' EXIT
+    i=0
+    while [ "$i" -lt "$WORKERS" ]; do
+      PORT=$((8000 + i))
+      echo "Starting worker $i with command: chainlit run chainlit_app.py --host 0.0.0.0 --port $PORT"
+      chainlit run chainlit_app.py --host 0.0.0.0 --port "$PORT" &
+      i=$((i + 1))
+    done
+    # exit (and let the container restart) as soon as any worker exits, whatever its exit status
+    wait -n || true
+    echo "A Chainlit worker exited, stopping."
+    exit 1
     ;;
   *)
     echo "Invalid APP_ENV: $APP_ENV"
@@ -1,6 +1,7 @@
 import boto3
 import botocore
 import asyncio
+from contextvars import ContextVar
 from typing import Optional
 
 
@@ -57,4 +58,10 @@ class PreSignedS3Client:
                 Params={'Bucket': self.bucket, 'Key': object_key},
                 ExpiresIn=self.presigned_url_expiration,
             )
-        }
\ No newline at end of file
+        }
+
+
+# Client of the workflow session that runs the current task. BioinsightWorkflow sets it before running an agent, so
+# tools of module-level agents (e.g. exports of large tables) upload through the session's client. Tasks started by
+# the agent inherit the value.
+current_s3_client: ContextVar[Optional[PreSignedS3Client]] = ContextVar("current_s3_client", default=None)
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+from urllib.parse import urlparse
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Session state stores. Workflow session state (agent memories, BDI Context) is saved after every message, keyed by
+# the Chainlit thread id, so any worker process can restore a session when its chat is resumed there.
+#
+
+
+class SessionStateStore(ABC):
+    @abstractmethod
+    async def aget(self, key: str) -> Optional[dict]:
+        """Returns the saved state, or None if there is none or it expired."""
+
+    @abstractmethod
+    async def aput(self, key: str, state: dict) -> None:
+        """Saves the state, replacing any earlier state of the key."""
+
+    @abstractmethod
+    async def adelete(self, key: str) -> None:
+        """Removes the saved state."""
+
+
+class SQLiteSessionStore(SessionStateStore):
+    """
+    Session state in a SQLite file, shared by the worker processes of one host. Each call opens its own connection
+    in a worker thread; WAL mode lets readers proceed while a worker writes.
+    """
+
+    def __init__(self, path: str, ttl_s: float):
+        self.path = path
+        self.ttl_s = ttl_s
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_state "
+                "(key TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _get(self, key: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT state, updated_at FROM session_state WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time() - self.ttl_s:
+            return None
+        return json.loads(row[0])
+
+    def _put(self, key: str, state: dict) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO session_state (key, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (key, json.dumps(state), now)
+            )
+            conn.execute("DELETE FROM session_state WHERE updated_at < ?", (now - self.ttl_s,))
+
+    def _delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_state WHERE key = ?", (key,))
+
+    async def aget(self, key: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def aput(self, key: str, state: dict) -> None:
+        await asyncio.to_thread(self._put, key, state)
+
+    async def adelete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+
+class RedisSessionStore(SessionStateStore):
+    """Session state in Redis (or a Redis-compatible server), shared by workers on any host."""
+
+    def __init__(self, url: str, ttl_s: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("RedisSessionStore requires the redis package: pip install redis")
+        self.ttl_s = ttl_s
+        self._client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"bioinsight:session:{key}"
+
+    async def aget(self, key: str) -> Optional[dict]:
+        state = await self._client.get(self._key(key))
+        return json.loads(state) if state is not None else None
+
+    async def aput(self, key: str, state: dict) -> None:
+        await self._client.set(self._key(key), json.dumps(state), ex=int(self.ttl_s))
+
+    async def adelete(self, key: str) -> None:
+        await self._client.delete(self._key(key))
+
+
+def _is_local_temp(directory: str) -> bool:
+    temp_dir = os.path.realpath(tempfile.gettempdir())
+    return os.path.commonpath([os.path.realpath(directory), temp_dir]) == temp_dir
+
+
+def create_session_store(url: str, ttl_s: float, dataset_dir: Optional[str] = None) -> Optional[SessionStateStore]:
+    """
+    Session state store for a URL: sqlite:///relative/path.db, sqlite:////absolute/path.db or redis://host:port/db.
+    Returns None for an empty URL, in which case session state only lives in the worker process.
+
+    Restored sessions refer to dataset versions in `dataset_dir` (DATASET_STORE_DIR). Redis serves workers on any
+    host, so it is rejected when that directory is the local temp directory, which other hosts cannot read.
+    """
+    if not url:
+        return None
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        store = SQLiteSessionStore(url[len("sqlite:///"):], ttl_s=ttl_s)
+    elif scheme in ("redis", "rediss"):
+        if dataset_dir is not None and _is_local_temp(dataset_dir):
+            raise ValueError(
+                f"DATASET_STORE_DIR ({dataset_dir}) is a local temp directory, but a Redis session store is shared "
+                "across hosts. Set DATASET_STORE_DIR to a volume mounted on every host."
+            )
+        store = RedisSessionStore(url, ttl_s=ttl_s)
+    else:
+        raise ValueError(f"Unsupported session store URL: {url}")
+    logger.info(f"[SessionStore] Using {type(store).__name__}")
+    return store
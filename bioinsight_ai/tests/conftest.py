@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the app modules import from the bioinsight_ai root and read required settings from the environment at import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for name in ("AWS_ACCESS_KEY", "AWS_SECRET_KEY", "AWS_REGION", "CHAINLIT_STORAGE_BUCKET", "DATA_LAYER_TABLE", "DEFAULT_MODEL",
+             "FAST_MODEL", "CONTEXT_KB_ID", "CONTEXT_SOURCE_ID", "MWB_KB_ID", "MWB_SOURCE_ID", "PUBLICATIONS_KB_ID",
+             "GDC_BASE_API"):
+    os.environ.setdefault(name, "test")
@@ -0,0 +1,46 @@
+import asyncio
+import pandas as pd
+import pytest
+from agents.biomedical_data_integration.harmonization import chunked
+from storage.presigned_s3_client import current_s3_client
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.uploaded = []
+
+    async def upload_file(self, file_path, object_key, mime):
+        self.uploaded.append(file_path)
+        return {"url": f"https://example.com/{object_key}"}
+
+
+def test_delimited_file_batches_match_the_loaded_dataset(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("id,age,score,name\n1,40,0.5,a\n2,,1,b\n3,55,2.5,\n")
+    df = pd.read_csv(path)
+
+    num_rows, dtypes = chunked.scan_file(str(path), "csv", 2)
+    chunks = list(chunked.iter_file_chunks(str(path), "csv", 2, dtypes))
+
+    assert num_rows == 3
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+
+
+def test_spreadsheets_are_not_read_in_batches(tmp_path):
+    with pytest.raises(ValueError):
+        list(chunked.iter_file_chunks(str(tmp_path / "data.xlsx"), "xlsx", 2, {}))
+
+
+def test_publish_uploads_with_the_session_client(tmp_path, monkeypatch):
+    path = tmp_path / "harmonized.csv.gz"
+    path.write_bytes(b"x" * 10)
+    monkeypatch.setattr(chunked, "BDI_S3_UPLOAD_MIN_BYTES", 1)
+
+    async def run(client):
+        current_s3_client.set(client)
+        return await chunked.publish(str(path))
+
+    client = FakeS3Client()
+    assert asyncio.run(run(client))["url"].startswith("https://example.com/bdi/")
+    assert client.uploaded == [str(path)]
+    assert asyncio.run(run(None)) == {"path": str(path)}
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from agents.biomedical_data_integration.harmonization.compiled_mapping import CompiledMapping
+
+
+def test_values_are_recoded_and_missing_values_stay_missing():
+    mapping = CompiledMapping.compile(
+        schema_matches=[{"source": "sex", "target": "gender"}, {"source": "id", "target": "case_id"}],
+        value_matches=[
+            {"source_attribute": "sex", "target_attribute": "gender", "source_value": "M", "target_value": "male"},
+            {"source_attribute": "sex", "target_attribute": "gender", "source_value": "F", "target_value": "female"},
+            # no accepted match, the value is kept
+            {"source_attribute": "sex", "target_attribute": "gender", "source_value": "U", "target_value": np.nan},
+        ]
+    )
+    df = pd.DataFrame({"id": [1, 2, 3, 4, 5], "sex": ["M", None, "F", "U", "M"], "unmapped": list("abcde")})
+
+    harmonized = mapping.apply(df)
+
+    assert list(harmonized.columns) == ["gender", "case_id"]
+    assert harmonized["gender"].tolist()[:1] + harmonized["gender"].tolist()[2:] == ["male", "female", "U", "male"]
+    assert pd.isna(harmonized["gender"].iloc[1])
+    assert harmonized["case_id"].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_absent_source_column_is_an_error():
+    mapping = CompiledMapping.compile(schema_matches=[{"source": "age", "target": "age_at_diagnosis"}])
+
+    with pytest.raises(ValueError, match="age"):
+        mapping.apply(pd.DataFrame({"sex": ["M"]}))
+
+
+def test_first_source_matched_to_a_target_wins():
+    mapping = CompiledMapping.compile(
+        schema_matches=[{"source": "age", "target": "age_at_diagnosis"}, {"source": "age_years", "target": "age_at_diagnosis"}],
+        value_matches=[{"source_attribute": "age_years", "target_attribute": "age_at_diagnosis",
+                        "source_value": "40", "target_value": 40}]
+    )
+
+    assert mapping.columns == [("age", "age_at_diagnosis")]
+    assert mapping.values == {}
+    harmonized = mapping.apply(pd.DataFrame({"age": ["40", "51"], "age_years": [1, 2]}))
+    assert harmonized["age_at_diagnosis"].tolist() == ["40", "51"]
+
+
+def test_json_round_trip(tmp_path):
+    mapping = CompiledMapping.compile(
+        schema_matches=[{"source": "sex", "target": "gender"}],
+        value_matches=[{"source_attribute": "sex", "target_attribute": "gender", "source_value": "M", "target_value": "male"}]
+    )
+    path = str(tmp_path / "mapping.json")
+    mapping.save(path)
+    loaded = CompiledMapping.load(path)
+
+    assert loaded.columns == mapping.columns and loaded.values == mapping.values
+    df = pd.DataFrame({"sex": ["M", "F"]})
+    pd.testing.assert_frame_equal(loaded.apply(df), mapping.apply(df))
+
+    with pytest.raises(ValueError):
+        CompiledMapping.from_dict({**mapping.to_dict(), "version": CompiledMapping.VERSION + 1})
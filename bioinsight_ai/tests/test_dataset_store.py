@@ -0,0 +1,68 @@
+import asyncio
+import os
+import time
+import pandas as pd
+from agents.biomedical_data_integration.utils.dataset_store import DatasetStore
+
+
+def test_retention_keeps_the_initial_and_latest_versions(tmp_path):
+    store = DatasetStore(directory=str(tmp_path), max_cached=8, keep_versions=2, ttl_s=3600, profile_values=100)
+
+    async def run():
+        initial = await store.aput(pd.DataFrame({"a": [0]}))
+        other = await store.aput(pd.DataFrame({"b": [1]}))
+        versions = [initial]
+        for i in range(1, 5):
+            versions.append(await store.aput(pd.DataFrame({"a": [i]}), dataset_id=store.dataset_id(initial)))
+        return versions, other
+
+    versions, other = asyncio.run(run())
+
+    kept = [versions[0], versions[-2], versions[-1], other]
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{handle}.parquet" for handle in kept)
+    assert versions[1] not in store._cache
+    assert asyncio.run(store.aget(versions[0]))["a"].tolist() == [0]
+
+
+def test_files_past_the_ttl_are_swept(tmp_path):
+    store = DatasetStore(directory=str(tmp_path), max_cached=8, keep_versions=2, ttl_s=60, profile_values=100)
+    stale = tmp_path / "abandoned-0000.parquet"
+    stale.write_bytes(b"")
+    os.utime(stale, (time.time() - 120, time.time() - 120))
+
+    handle = asyncio.run(store.aput(pd.DataFrame({"a": [1]})))
+
+    assert os.listdir(tmp_path) == [f"{handle}.parquet"]
+
+
+def test_mixed_type_columns_are_stored_as_strings_in_parquet(tmp_path):
+    store = DatasetStore(directory=str(tmp_path), max_cached=0, keep_versions=2, ttl_s=3600, profile_values=100)
+    handle = asyncio.run(store.aput(pd.DataFrame({"a": [1, "x", None], "b": [1.5, 2.5, None]})))
+
+    assert os.listdir(tmp_path) == [f"{handle}.parquet"]
+    df = asyncio.run(store.aget(handle))
+    assert df["a"].tolist()[:2] == ["1", "x"] and df["a"].isna().tolist() == [False, False, True]
+    assert df["b"].dtype == float
+
+
+def test_batched_versions_are_read_back_in_batches_with_a_profile(tmp_path):
+    store = DatasetStore(directory=str(tmp_path), max_cached=8, keep_versions=1, ttl_s=3600, profile_values=2)
+    chunks = [pd.DataFrame({"id": [1, 2], "site": ["a", "b"]}), pd.DataFrame({"id": [3], "site": ["a"]})]
+    dtypes = {"id": "int64", "site": object}
+
+    async def run():
+        handle, num_rows = await store.aput_chunks(iter(chunks), dtypes)
+        return handle, num_rows, await store.ahead(handle, 2), await store.aget_profile(handle)
+
+    handle, num_rows, head, profile = asyncio.run(run())
+
+    assert num_rows == 3 and handle not in store._cache
+    assert [len(chunk) for chunk in store.iter_chunks(handle, 2)] == [2, 1]
+    pd.testing.assert_frame_equal(head, chunks[0])
+    assert profile["id"].tolist() == [1, 2] and profile["site"].tolist() == ["a", "b"]
+
+    newer, _ = asyncio.run(store.aput_chunks(iter(chunks), dtypes, dataset_id=store.dataset_id(handle)))
+    newest, _ = asyncio.run(store.aput_chunks(iter(chunks), dtypes, dataset_id=store.dataset_id(handle)))
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        f"{version}.{kind}" for version in (handle, newest) for kind in ("parquet", "profile.parquet")
+    )
@@ -0,0 +1,23 @@
+import json
+import os
+import stat
+from multiprocessing import Pool
+from workflow_config.steps.evaluation_policy import EvaluationPolicy
+
+
+def append_records(args):
+    path, worker = args
+    policy = EvaluationPolicy(sample_rate=1, blocking=False, store_path=path)
+    for i in range(50):
+        policy._append({"worker": worker, "i": i, "response": "x" * 5000})
+
+
+def test_appends_from_several_processes_keep_whole_records(tmp_path):
+    path = str(tmp_path / "evaluations" / "response_evaluations.jsonl")
+    with Pool(4) as pool:
+        pool.map(append_records, [(path, worker) for worker in range(4)])
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 200
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
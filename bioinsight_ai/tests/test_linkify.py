@@ -0,0 +1,24 @@
+from workflow_config.steps.linkify import linkify
+
+
+def test_bare_urls_and_identifiers_are_linked():
+    assert linkify("See https://example.org/a. Study ST000001") == (
+        "See [https://example.org/a](https://example.org/a). Study "
+        "[ST000001](https://metabolomicsworkbench.org/data/DRCCMetadata.php?Mode=Study&StudyID=ST000001)"
+    )
+
+
+def test_urls_in_html_attributes_are_left_as_they_are():
+    text = '<img src="https://example.org/plot.png" alt="Plot of PDC000120 > baseline"> and <div data-url=\'https://example.org\'>x</div>'
+    linked = linkify(text)
+    assert '<img src="https://example.org/plot.png" alt="Plot of PDC000120 > baseline">' in linked
+    assert "<div data-url='https://example.org'>" in linked
+
+
+def test_text_between_tags_is_still_linked():
+    assert linkify("<b>https://example.org</b>") == "<b>[https://example.org](https://example.org)</b>"
+
+
+def test_linkify_is_idempotent():
+    once = linkify("PXD000001 at https://example.org")
+    assert linkify(once) == once
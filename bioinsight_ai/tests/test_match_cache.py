@@ -0,0 +1,13 @@
+from agents.biomedical_data_integration.harmonization.match_cache import MatchCache
+
+
+def test_edits_of_put_and_returned_records_do_not_reach_the_cache():
+    cache = MatchCache()
+    records = [{"source": "age", "target": "age_at_diagnosis"}]
+    cache.put("age", records)
+    records[0]["target"] = "edited"
+
+    returned = cache.get("age")
+    returned[0]["target"] = "feedback"
+
+    assert cache.get("age") == [{"source": "age", "target": "age_at_diagnosis"}]
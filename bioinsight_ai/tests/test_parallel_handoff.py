@@ -0,0 +1,99 @@
+import asyncio
+from typing import Any, List, Sequence
+from llama_index.core.agent.workflow import FunctionAgent
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, CompletionResponse, LLMMetadata
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+from data_sources.metabolomics_workbench.mwb.chat_agent import MolView
+from data_sources.metabolomics_workbench.retry_agent_workflow import PARALLEL_HANDOFF_TOOL, RetryAgentWorkflow
+from workflow_config.steps.metabolomics_workbench import MWBOutput
+
+
+class ScriptedLLM(FunctionCallingLLM):
+    """
+    Function calling LLM that calls the first available tool it has not called yet (parallel_handoff with both
+    branch agents for the root agent) and answers with plain text once it has called them all.
+    """
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(is_function_calling_model=True)
+
+    def _prepare_chat_with_tools(self, tools: Sequence[Any], user_msg=None, chat_history=None, **kwargs):
+        messages = list(chat_history or [])
+        if user_msg is not None:
+            messages.append(ChatMessage(role="user", content=user_msg) if isinstance(user_msg, str) else user_msg)
+        return {"messages": messages, "tools": tools}
+
+    def _respond(self, messages: List[ChatMessage], tools: Sequence[Any]) -> ChatResponse:
+        called = {m.additional_kwargs.get("tool_call_id") for m in messages if m.role == "tool"}
+        for tool in tools:
+            name = tool.metadata.name
+            if f"{name}-call" in called or name == "handoff":
+                continue
+            kwargs = {"to_agents": ["compound", "study"], "reason": "both"} if name == PARALLEL_HANDOFF_TOOL else {}
+            tool_call = ToolSelection(tool_id=f"{name}-call", tool_name=name, tool_kwargs=kwargs)
+            return ChatResponse(message=ChatMessage(role="assistant", content="", additional_kwargs={"tool_calls": [tool_call]}))
+        return ChatResponse(message=ChatMessage(role="assistant", content="Done."))
+
+    def get_tool_calls_from_response(self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs):
+        return response.message.additional_kwargs.get("tool_calls", [])
+
+    async def astream_chat(self, messages, tools=(), **kwargs):
+        response = self._respond(messages, tools)
+
+        async def gen():
+            yield response
+        return gen()
+
+    async def achat(self, messages, **kwargs):
+        return self._respond(messages, kwargs.get("tools", ()))
+
+    def chat(self, messages, **kwargs):
+        return self._respond(messages, kwargs.get("tools", ()))
+
+    def stream_chat(self, messages, **kwargs):
+        yield self._respond(messages, kwargs.get("tools", ()))
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        return CompletionResponse(text="Done.")
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        return CompletionResponse(text="Done.")
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        yield CompletionResponse(text="Done.", delta="Done.")
+
+    async def astream_complete(self, prompt, formatted=False, **kwargs):
+        async def gen():
+            yield CompletionResponse(text="Done.", delta="Done.")
+        return gen()
+
+
+def show_molecule() -> MolView:
+    """Show the molecule."""
+    return MolView(cid="5793", regno="11", title="Glucose")
+
+
+def find_studies() -> str:
+    """Find studies."""
+    return "ST000001"
+
+
+def test_parallel_handoff_keeps_branch_elements():
+    llm = ScriptedLLM()
+    workflow = RetryAgentWorkflow(
+        agents=[
+            FunctionAgent(name="router", description="Routes requests.", llm=llm, can_handoff_to=["compound", "study"]),
+            FunctionAgent(name="compound", description="Compounds.", llm=llm, tools=[show_molecule]),
+            FunctionAgent(name="study", description="Studies.", llm=llm, tools=[find_studies]),
+        ],
+        root_agent="router",
+        parallel_handoff=True,
+    )
+
+    output = MWBOutput.convert(asyncio.run(workflow.run("Show glucose and the studies containing it")))
+
+    mol_views = [element for element in output.elements if isinstance(element, MolView)]
+    assert [view.cid for view in mol_views] == ["5793"]
+    assert "**compound**" in output.response.content and "**study**" in output.response.content
@@ -0,0 +1,54 @@
+import pytest
+from workflow_config.steps.intent_recognition.intent import AvailableSources
+from workflow_config.steps.intent_recognition.pre_classifier import pre_classify
+
+
+@pytest.mark.parametrize("query", [
+    "I want to harmonize my dataset",
+    "Can you standardize the columns in our file?",
+    "I'd like to upload my own data for schema matching",
+])
+def test_harmonization_requests(query):
+    intent = pre_classify(query)
+    assert intent is not None and intent.harmonization and intent.sources == []
+
+
+@pytest.mark.parametrize("query, source", [
+    ("Show me the details of study ST000001", AvailableSources.MWB),
+    ("What is PXD012345 about?", AvailableSources.PX),
+    ("Get the metadata of PDC000120 from PDC", AvailableSources.PDC),
+    ("TCGA-BRCA", AvailableSources.GDC),
+])
+def test_accession_lookups(query, source):
+    intent = pre_classify(query)
+    assert intent is not None and not intent.harmonization and not intent.plot
+    assert intent.sources == [source] and intent.source_contexts == {source: query}
+
+
+def test_plot_of_a_plottable_source():
+    intent = pre_classify("Plot PDC000120")
+    assert intent is not None and intent.plot and intent.sources == [AvailableSources.PDC]
+
+
+@pytest.mark.parametrize("query", [
+    # source names and acronyms alone
+    "I take pride in my work",
+    "What is the PDC?",
+    "weather in the GDC building",
+    "Find standardized PDC proteome data for breast cancer",
+    # more than one source, or topics beyond the accession lookup
+    "Compare glioblastoma proteomics in PDC with metabolomics studies",
+    "Compare ST000001 with PDC000120",
+    "Is PDC000120 in the GDC?",
+    "Which metabolites are shared between ST000001 and breast cancer samples?",
+    # plots of sources the plotting step does not support
+    "Plot ST000001",
+    # harmonization words without the user's own data, or with a source
+    "How is data standardized across repositories?",
+    "Which datasets were uploaded last month?",
+    "Which GDC studies were uploaded in 2023?",
+    "Harmonize my data to the GDC schema",
+    "Plot a heat map of my data",
+])
+def test_ambiguous_queries_are_left_to_the_llm(query):
+    assert pre_classify(query) is None
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from utils.prefetch_cache import PrefetchCache
+
+
+def make_cache(ttl_s=600, max_entries=2):
+    calls = []
+    cache = PrefetchCache(ttl_s=ttl_s, max_workers=1, max_entries=max_entries)
+
+    @cache.memoize
+    def lookup(accession):
+        calls.append(accession)
+        return accession.lower()
+
+    return cache, lookup, calls
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, lookup, calls = make_cache(max_entries=2)
+    lookup("ST000001")
+    lookup("ST000002")
+    lookup("ST000001")
+    lookup("ST000003")
+
+    assert len(cache._entries) == 2
+    lookup("ST000001")
+    lookup("ST000002")
+    assert calls == ["ST000001", "ST000002", "ST000003", "ST000002"]
+
+
+def test_expired_entries_are_swept_on_insert():
+    cache, lookup, calls = make_cache(ttl_s=0.01, max_entries=10)
+    lookup("ST000001")
+    lookup("ST000002")
+    time.sleep(0.02)
+    lookup("ST000003")
+
+    assert len(cache._entries) == 1
+
+
+def test_none_results_are_not_cached():
+    calls = []
+    cache = PrefetchCache(ttl_s=600, max_workers=1, max_entries=10)
+
+    @cache.memoize
+    def lookup(accession):
+        calls.append(accession)
+        return None
+
+    lookup("ST000001")
+    lookup("ST000001")
+
+    assert calls == ["ST000001", "ST000001"]
+    assert len(cache._entries) == 0
+
+
+def test_none_results_of_async_calls_are_not_cached():
+    calls = []
+    cache = PrefetchCache(ttl_s=600, max_workers=1, max_entries=10)
+
+    @cache.memoize
+    async def lookup(accession):
+        calls.append(accession)
+        return None
+
+    async def run():
+        await lookup("ST000001")
+        await lookup("ST000001")
+
+    asyncio.run(run())
+
+    assert calls == ["ST000001", "ST000001"]
@@ -0,0 +1,48 @@
+import asyncio
+from llama_index.core.agent.workflow import FunctionAgent
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse
+from llama_index.core.llms.llm import ToolSelection
+from data_sources.metabolomics_workbench.retry_agent_workflow import RetryAgentWorkflow
+from tests.test_parallel_handoff import ScriptedLLM
+
+
+# LLM turns taken by EndlessLLM
+turns = []
+
+
+class EndlessLLM(ScriptedLLM):
+    """Calls the first tool again on every turn, so the run never finishes on its own."""
+
+    def _respond(self, messages, tools):
+        turns.append(1)
+        turn = sum(1 for m in messages if m.role == "tool")
+        tool_call = ToolSelection(tool_id=f"call-{turn}", tool_name=tools[0].metadata.name, tool_kwargs={})
+        return ChatResponse(message=ChatMessage(role="assistant", content="", additional_kwargs={"tool_calls": [tool_call]}))
+
+
+def test_cancelled_run_stops_the_workflow():
+    async def lookup() -> str:
+        """Look up the study."""
+        await asyncio.sleep(0.05)
+        return "ST000001"
+
+    workflow = RetryAgentWorkflow(
+        agents=[FunctionAgent(name="study", description="Studies.", llm=EndlessLLM(), tools=[lookup])],
+        root_agent="study",
+        timeout=None,
+    )
+
+    async def run():
+        try:
+            await asyncio.wait_for(workflow.run("Find the study"), timeout=0.3)
+        except asyncio.TimeoutError:
+            pass
+        turns_at_deadline = len(turns)
+        await asyncio.sleep(0.5)
+        return turns_at_deadline
+
+    turns.clear()
+    turns_at_deadline = asyncio.run(run())
+
+    assert turns_at_deadline > 0
+    assert len(turns) == turns_at_deadline
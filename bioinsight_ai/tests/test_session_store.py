@@ -0,0 +1,16 @@
+import os
+import tempfile
+import pytest
+from storage.session_store import create_session_store
+
+
+def test_redis_store_rejects_local_temp_dataset_dir():
+    with pytest.raises(ValueError, match="DATASET_STORE_DIR"):
+        create_session_store(
+            "redis://localhost:6379/0", ttl_s=60, dataset_dir=os.path.join(tempfile.gettempdir(), "bioinsight_datasets")
+        )
+
+
+def test_sqlite_store_accepts_local_temp_dataset_dir(tmp_path):
+    store = create_session_store(f"sqlite:///{tmp_path / 'sessions.db'}", ttl_s=60, dataset_dir=str(tmp_path))
+    assert store is not None
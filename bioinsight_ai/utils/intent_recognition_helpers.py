@@ -4,7 +4,11 @@ from typing import Optional
 from pydantic import ValidationError
 import time
 
+from config import INTENT_CACHE_ENABLED, INTENT_PRECLASSIFIER_ENABLED
+from llama_index.core.llms import ChatMessage
 from workflow_config.steps.intent_recognition.intent import Intent
+from workflow_config.steps.intent_recognition.pre_classifier import pre_classify
+from workflow_config.steps.intent_recognition.semantic_cache import intent_cache, needs_conversation_context
 from log_helper.logger import get_logger
 logger = get_logger()
 
@@ -62,3 +66,55 @@ async def safe_intent_recognition(
     raise RuntimeError(
         f"[IntentRecognition] Failed to parse Intent after {retries+1} attempts and no fallback provided."
     )
+
+
+async def cached_intent_recognition(
+    intent_agent,
+    query: str,
+    retries: int = 2,
+    fallback_intent: Optional[Intent] = None,
+) -> Intent:
+    """
+    Local front for `safe_intent_recognition`.
+
+    When the query does not depend on the conversation so far, the intent is taken from the rule based
+    pre-classifier if it is confident, otherwise from a near-identical earlier query in the semantic cache, and
+    the intent LLM call is skipped. The query is still added to the intent agent's memory so later turns see it.
+    Intents recognized by the LLM for context-free queries are added to the cache.
+    """
+    if not (INTENT_CACHE_ENABLED or INTENT_PRECLASSIFIER_ENABLED):
+        return await safe_intent_recognition(intent_agent, query, retries, fallback_intent)
+
+    history = await intent_agent.memory.aget_all()
+    has_history = any(message.role == "user" for message in history)
+    if needs_conversation_context(query, has_history):
+        logger.info("[IntentRecognition] Query depends on conversation context, using the intent agent.")
+        return await safe_intent_recognition(intent_agent, query, retries, fallback_intent)
+
+    if INTENT_PRECLASSIFIER_ENABLED:
+        intent = pre_classify(query)
+        if intent is not None:
+            await intent_agent.memory.aput(ChatMessage(role="user", content=query))
+            return intent
+
+    if not INTENT_CACHE_ENABLED:
+        return await safe_intent_recognition(intent_agent, query, retries, fallback_intent)
+
+    start = time.time()
+    try:
+        intent = await intent_cache.lookup(query)
+    except Exception as e:
+        logger.warning(f"[IntentCache] Lookup failed, recognizing intent: {e}")
+        intent = None
+    if intent is not None:
+        await intent_agent.memory.aput(ChatMessage(role="user", content=query))
+        logger.info(f"[TIMER] Intent served from cache in {time.time() - start:.2f}s")
+        return intent
+
+    intent = await safe_intent_recognition(intent_agent, query, retries, fallback_intent)
+    if intent is not fallback_intent:
+        try:
+            await intent_cache.store(query, intent)
+        except Exception as e:
+            logger.warning(f"[IntentCache] Failed to cache intent: {e}")
+    return intent
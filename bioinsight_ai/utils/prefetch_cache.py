@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Process-wide memo for side-effect-free retrieval calls (accession lookups against public REST APIs). Calls can be
+# started speculatively with `prefetch`; when a source agent later makes the same call, it picks up the in-flight or
+# completed result instead of issuing the request again.
+#
+
+PREFETCH_TTL_S = 600
+PREFETCH_MAX_WORKERS = 8
+# Entries kept at most; the least recently used are evicted first
+PREFETCH_MAX_ENTRIES = 256
+
+
+class PrefetchCache:
+    def __init__(self, ttl_s: float, max_workers: int, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        # (function name, args) -> (expiry, concurrent Future | asyncio Task), in least recently used order
+        self._entries = OrderedDict()
+
+    def _key(self, fn, args, kwargs):
+        # bind to the signature so positional and keyword calls share an entry
+        bound = inspect.signature(fn).bind(*args, **kwargs)
+        bound.apply_defaults()
+        return (fn.__qualname__, tuple(bound.arguments.items()))
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiry, future = entry
+            if expiry < time.monotonic() or future.cancelled():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return future
+
+    def _put(self, key, future):
+        with self._lock:
+            now = time.monotonic()
+            for expired in [k for k, (expiry, _) in self._entries.items() if expiry < now]:
+                del self._entries[expired]
+            self._entries[key] = (now + self.ttl_s, future)
+            self._entries.move_to_end(key)
+            # evicted calls still complete for the callers already awaiting them
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _discard(self, key, future):
+        with self._lock:
+            if self._entries.get(key, (None, None))[1] is future:
+                del self._entries[key]
+
+    def memoize(self, fn):
+        """
+        Decorator for a side-effect-free retrieval function (sync or async). Results are shared for `ttl_s` seconds
+        across callers with the same arguments; failed calls, including the None the retrieval helpers return for a
+        failed request, are not cached.
+        """
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key = self._key(fn, args, kwargs)
+                task = self._get(key)
+                if task is None:
+                    task = asyncio.ensure_future(fn(*args, **kwargs))
+                    self._put(key, task)
+                else:
+                    logger.info(f"[Prefetch] Reusing {key}")
+                try:
+                    # shielded so a cancelled caller does not cancel the shared call
+                    result = await asyncio.shield(task)
+                    if result is None:
+                        self._discard(key, task)
+                    return result
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise
+                    # the speculative call was cancelled while we were waiting, call directly
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    self._discard(key, task)
+                    raise
+
+            async_wrapper.__prefetch_fn__ = fn
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = self._key(fn, args, kwargs)
+            future = self._get(key)
+            if future is None:
+                future = Future()
+                self._put(key, future)
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                logger.info(f"[Prefetch] Reusing {key}")
+            try:
+                result = future.result()
+            except Exception:
+                self._discard(key, future)
+                raise
+            if result is None:
+                self._discard(key, future)
+            return result
+
+        wrapper.__prefetch_fn__ = fn
+        return wrapper
+
+    def prefetch(self, memoized_fn, *args, **kwargs):
+        """
+        Start a memoized call in the background, unless the same call is already cached or in flight. Returns a
+        (key, future) handle for `cancel`, or None if nothing was started. Must be called from the event loop.
+        """
+        fn = memoized_fn.__prefetch_fn__
+        key = self._key(fn, args, kwargs)
+        if self._get(key) is not None:
+            return None
+        if inspect.iscoroutinefunction(fn):
+            future = asyncio.ensure_future(fn(*args, **kwargs))
+        else:
+            future = self._executor.submit(fn, *args, **kwargs)
+
+        def _drop_failed(done):
+            if done.cancelled() or done.exception() is not None or done.result() is None:
+                self._discard(key, done)
+
+        future.add_done_callback(_drop_failed)
+        self._put(key, future)
+        logger.info(f"[Prefetch] Started {key}")
+        return key, future
+
+    def cancel(self, handle) -> None:
+        """
+        Cancel a speculative call. Calls already running in a worker thread cannot be interrupted; their result is
+        kept since the call has no side effects.
+        """
+        key, future = handle
+        if future.cancel():
+            self._discard(key, future)
+            logger.info(f"[Prefetch] Cancelled {key}")
+
+
+prefetch_cache = PrefetchCache(
+    ttl_s=PREFETCH_TTL_S, max_workers=PREFETCH_MAX_WORKERS, max_entries=PREFETCH_MAX_ENTRIES
+)
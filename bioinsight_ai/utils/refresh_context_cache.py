@@ -0,0 +1,16 @@
+import asyncio
+import sys
+from workflow_config.steps.intent_recognition.agent import contextKB, response_synthesizer, CONTEXT_CACHE
+from workflow_config.steps.intent_recognition.context_prompts import query_dict
+from workflow_config.steps.intent_recognition.context_snapshot import refresh_snapshot
+from llama_index.core.query_engine import RetrieverQueryEngine
+
+# Offline job that rebuilds the intent context snapshot (context_cache.json) from the context knowledge base.
+# The file is replaced atomically; running processes swap in the new context for new sessions.
+#
+#   python -m utils.refresh_context_cache [path]
+
+engine = RetrieverQueryEngine(retriever=contextKB, response_synthesizer=response_synthesizer)
+path = sys.argv[1] if len(sys.argv) > 1 else CONTEXT_CACHE
+snapshot = asyncio.run(refresh_snapshot(path, engine, query_dict))
+print(f"Context snapshot {snapshot.version} ({snapshot.created_at}) at {path}")
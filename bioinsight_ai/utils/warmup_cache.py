@@ -1,17 +1,8 @@
 import os
-import pandas as pd
-import bdikit as bdi
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.biomedical_data_integration.harmonization.registry import harmonization_registry
 
-# Your data
-data = {
-   'Name': ['Alice', 'Bob', 'Charlie', 'Diana'],
-   'Age': [25, 30, 22, 28],
-   'City': ['New York', 'London', 'Paris', 'Tokyo']
-}
-source_dataset = pd.DataFrame(data)
-target_dataset = 'gdc'
-method = 'magneto_ft_bp'
-
-# Call BDI
-matches = bdi.match_schema(source_dataset, target=target_dataset, method=method)
-print(matches)
+# Downloads (on first use) and loads the schema matching model and the GDC schema, e.g. while building the image.
+# The app preloads the same registry at startup, see BDI_PRELOAD_MODELS.
+harmonization_registry.warmup()
@@ -29,12 +29,18 @@ class BDIEvent(Event):
     query: str
 
 class ResponseEvent(Event):
-    "Event to capture response from a data source agent/workflow."
+    "Event to capture response from a data source agent/workflow. timed_out marks a source dropped at its deadline."
     query: str
     response: str | dict
     src_name: str
+    timed_out: bool = False
 
 class EvaluateEvent(Event):
     "Event to capture LLM response and store corresponding user query."
     query: str
-    response: str | dict
\ No newline at end of file
+    response: str | dict
+
+class ResponseStreamEvent(Event):
+    "Event carrying a token delta of the final answer as it is generated. reset discards the deltas streamed so far."
+    delta: str
+    reset: bool = False
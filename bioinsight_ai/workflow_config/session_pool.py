@@ -0,0 +1,68 @@
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+from llama_index.core.llms import ChatMessage
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Warm pool of pre-built workflow sessions. Building a session (intent agent, BDI agent, MWB agent workflow) is done
+# ahead of time in the background, so chat start and resume only bind an idle session to the user's session id.
+# Sessions are not returned to the pool when a chat ends, since a run may still be using them.
+#
+
+
+class SessionPool:
+    """
+    Fields:
+    - factory: Async function building a workflow session for a session id (e.g. bioinsight_session).
+    - size: Number of idle sessions kept ready.
+    """
+
+    def __init__(self, factory: Callable[[str], Awaitable], size: int):
+        self.factory = factory
+        self.size = size
+        self._idle = []
+        self._refill_task: Optional[asyncio.Task] = None
+
+    async def acquire(self, session_id: str, history: Optional[list[ChatMessage]] = None):
+        """
+        Returns a workflow session bound to `session_id`, taken from the pool if one is ready and built otherwise.
+        The pool is refilled in the background.
+
+        Args:
+            session_id (str): Chainlit session id.
+            history (list[ChatMessage], optional): Earlier messages of a resumed conversation, restored into the
+                intent agent memory.
+        """
+        start = time.time()
+        if self._idle:
+            wf = self._idle.pop()
+            await wf.reset_session(session_id)
+            logger.info(f"[SessionPool] Session {session_id} taken from the pool ({len(self._idle)} left)")
+        else:
+            wf = await self.factory(session_id)
+            logger.info(f"[SessionPool] Pool empty, built session {session_id}")
+        self._schedule_refill()
+
+        if history:
+            await wf.intent_memory.aput_messages(history)
+            logger.info(f"[SessionPool] Restored {len(history)} messages into session {session_id}")
+        logger.info(f"[TIMER] Session {session_id} ready in {time.time() - start:.2f}s")
+        return wf
+
+    def _schedule_refill(self) -> None:
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        while len(self._idle) < self.size:
+            try:
+                # placeholder id, replaced when the session is acquired
+                self._idle.append(await self.factory(f"pool-{uuid.uuid4()}"))
+            except Exception as e:
+                logger.warning(f"[SessionPool] Building a pooled session failed: {e}")
+                return
+        logger.debug(f"[SessionPool] {len(self._idle)} idle sessions ready")
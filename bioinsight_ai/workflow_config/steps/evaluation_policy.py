@@ -0,0 +1,121 @@
+import asyncio
+import fcntl
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from config import RESPONSE_EVAL_BLOCKING, RESPONSE_EVAL_SAMPLE_RATE, RESPONSE_EVAL_STORE
+from workflow_config.steps.evaluate_response import CustomEvalResult, answer_evaluator
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Response evaluation policy. Decides which answers are judged by the answer relevancy evaluator and runs the judge
+# in the background after the answer has been returned, so it is off the critical path. Every evaluation is appended
+# to an offline JSONL store for quality dashboards. Blocking mode keeps the judge in line, so a failed evaluation can
+# still retry the source step.
+#
+
+# Answers with less prose than this once links, tables and markup are removed are tool output, not LLM text
+MIN_PROSE_CHARS = 40
+
+MARKDOWN_LINK = re.compile(r"!?\[[^\]]*\]\([^)]*\)")
+HTML_TAG = re.compile(r"<[^>]+>")
+TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$", re.M)
+BARE_URL = re.compile(r"https?://\S+")
+
+
+class EvaluationPolicy:
+    """
+    Fields:
+    - sample_rate: Fraction of eligible answers that are evaluated (0 disables evaluation, 1 evaluates all).
+    - blocking: Evaluate before the answer is returned (and retry on failure) instead of in the background.
+    - store_path: JSONL file the evaluations are appended to. Appends take an exclusive file lock, since the worker
+      processes of a host share the file.
+    """
+
+    def __init__(self, sample_rate: float, blocking: bool, store_path: str):
+        self.sample_rate = sample_rate
+        self.blocking = blocking
+        self.store_path = store_path
+        # references to running background evaluations, so they are not garbage collected
+        self._tasks = set()
+
+    @staticmethod
+    def skip_reason(response_text: str) -> Optional[str]:
+        """Returns why an answer does not need the judge, or None if it is eligible."""
+        if not response_text or not response_text.strip():
+            return "no text (elements or graphs only)"
+        prose = TABLE_ROW.sub("", response_text)
+        prose = MARKDOWN_LINK.sub("", prose)
+        prose = HTML_TAG.sub("", prose)
+        prose = BARE_URL.sub("", prose)
+        if len(re.sub(r"\W+", "", prose)) < MIN_PROSE_CHARS:
+            return "tool output (tables, links)"
+        return None
+
+    def should_evaluate(self, response_text: str) -> bool:
+        reason = self.skip_reason(response_text)
+        if reason is not None:
+            logger.info(f"[EvaluationPolicy] Skipping evaluation: {reason}")
+            return False
+        if random.random() >= self.sample_rate:
+            logger.info("[EvaluationPolicy] Skipping evaluation: not sampled")
+            return False
+        return True
+
+    async def evaluate(self, query: str, response_text: str, **metadata) -> CustomEvalResult:
+        """Run the judge and record the result in the offline store."""
+        start = time.time()
+        evaluation = await answer_evaluator.aevaluate(query=query, response=response_text)
+        latency = time.time() - start
+        logger.info(f"[TIMER] Response evaluation took {latency:.2f}s (passing={evaluation.passing})")
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "query": query,
+            "response": response_text,
+            "score": evaluation.score,
+            "passing": evaluation.passing,
+            "feedback": evaluation.detailed_feedback or evaluation.feedback,
+            "latency_s": round(latency, 2),
+            "blocking": self.blocking,
+            **metadata
+        }
+        await asyncio.to_thread(self._append, record)
+        return evaluation
+
+    def evaluate_in_background(self, query: str, response_text: str, **metadata) -> None:
+        """Schedule the judge on the event loop without waiting for it. Failures are logged, never raised."""
+
+        async def _run():
+            try:
+                await self.evaluate(query, response_text, **metadata)
+            except Exception as e:
+                logger.warning(f"[EvaluationPolicy] Background evaluation failed: {e}")
+
+        task = asyncio.create_task(_run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _append(self, record: dict) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), mode=0o700, exist_ok=True)
+        line = json.dumps(record, default=str) + "\n"
+        # the records hold user queries, so the file is created readable by the service user only
+        fd = os.open(self.store_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+evaluation_policy = EvaluationPolicy(
+    sample_rate=RESPONSE_EVAL_SAMPLE_RATE,
+    blocking=RESPONSE_EVAL_BLOCKING,
+    store_path=RESPONSE_EVAL_STORE
+)
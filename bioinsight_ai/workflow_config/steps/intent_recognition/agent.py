@@ -3,7 +3,10 @@ from config import (
     AWS_ACCESS_KEY,
     AWS_REGION,
     AWS_SECRET_KEY,
-    CONTEXT_KB_ID
+    CONTEXT_KB_ID,
+    FAST_MODEL,
+    INTENT_MEMORY_MAX_TURNS,
+    INTENT_PROMPT_CACHE
 )
 from workflow_config.default_settings import Settings
 from workflow_config.steps.intent_recognition.context_augmented_intent_recognition import (
@@ -11,6 +14,11 @@ from workflow_config.steps.intent_recognition.context_augmented_intent_recogniti
 )
 from workflow_config.steps.intent_recognition.context_prompts import query_dict
 from workflow_config.steps.intent_recognition.intent import Intent
+from workflow_config.steps.intent_recognition.prompt_cache import (
+    CACHE_POINT,
+    extend_response_token_counts,
+    intent_prompt_cache_metrics
+)
 from workflow_config.steps.intent_recognition.prompts.system_prompt import system_prompt
 from workflow_config.steps.intent_recognition.prompts.user_query_template import  USER_QUERY_TEMPLATE
 from llama_index.core.response_synthesizers import get_response_synthesizer
@@ -37,10 +45,22 @@ response_synthesizer = get_response_synthesizer(
     response_mode="compact"
 )
 
+# Dedicated fast LLM for intent recognition, so the patches below (forced Intent tool, prompt cache checkpoint and
+# cache metrics) do not leak into other users of Settings.fast_llm
+intent_llm = BedrockConverse(
+    model=FAST_MODEL,
+    aws_access_key_id=AWS_ACCESS_KEY,
+    aws_secret_access_key=AWS_SECRET_KEY,
+    region_name=AWS_REGION,
+    max_tokens=8192
+)
+
+# Static context snapshot, rebuilt with utils/refresh_context_cache.py
+CONTEXT_CACHE = "./workflow_config/steps/intent_recognition/context_cache.json"
+
 # Structured output that produces an Intent class output. See Intent module for more details about
 # output and configuration 
-#sllm = Settings.fast_llm.as_structured_llm(Intent)
-sllm = Settings.fast_llm.as_structured_llm(Intent)
+sllm = intent_llm.as_structured_llm(Intent)
 
 # `Intent` tool is defined automatically by LlamaIndex StructuredLLM, only need to define output_cls
 def extend_prepare_chat_with_tools(llm_instance: BedrockConverse):
@@ -50,6 +70,10 @@ def extend_prepare_chat_with_tools(llm_instance: BedrockConverse):
     https://docs.aws.amazon.com/bedrock/latest/APIReference/API_runtime_ToolChoice.html for more detail.
     
     Intended for use in custom agents to enforce tool usage, where the 'Intent' tool is defined. 
+
+    When INTENT_PROMPT_CACHE is enabled, a cache checkpoint is also appended after the system prompt so the
+    tool config, system prompt and static context blocks (identical on every intent call) are served from
+    Bedrock's prompt cache.
     """
     
     original_method = llm_instance._prepare_chat_with_tools
@@ -59,9 +83,17 @@ def extend_prepare_chat_with_tools(llm_instance: BedrockConverse):
         kwargs["tool_required"] = True
         kwargs["tool_choice"] = {"tool": {"name": "Intent"}}
         payload = original_method(**kwargs)
+        if INTENT_PROMPT_CACHE:
+            # Concatenated onto the converted system prompt by the Bedrock Converse request builder
+            payload["system"] = [CACHE_POINT]
         return payload
     
     llm_instance._prepare_chat_with_tools = MethodType(wrapped_prepare_chat_with_tools, llm_instance)
+
+# Patch the BedrockConverse inside the shared StructuredLLM once per process, rather than wrapping it
+# again for every session
+extend_prepare_chat_with_tools(intent_llm)
+extend_response_token_counts(intent_llm, intent_prompt_cache_metrics)
     
 async def create_intent_agent(session_id: str):
     logger.info('Augmenting intent agent memory')
@@ -70,11 +102,11 @@ async def create_intent_agent(session_id: str):
         response_synthesizer=response_synthesizer,
         context_retrieval_prompts=query_dict,
         force_refresh=False,
-        context_cache="./workflow_config/steps/intent_recognition/context_cache.json",      
+        context_cache=CONTEXT_CACHE,
         system_prompt=system_prompt,  
         llm=sllm,
-        session_id=session_id
+        session_id=session_id,
+        max_turns=INTENT_MEMORY_MAX_TURNS,
+        summary_llm=Settings.fast_llm
     )
-    # Patch the BedrockConverse inside StructuredLLM inside StructuredIntentChatEngine
-    extend_prepare_chat_with_tools(agent._chat_engine._llm.llm)
     return agent
\ No newline at end of file
@@ -0,0 +1,158 @@
+import asyncio
+import re
+from typing import Any, List, Optional
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import LLM, ChatMessage
+from llama_index.core.memory import Memory
+from llama_index.core.memory.memory import BaseMemoryBlock
+from llama_index.core.storage.chat_store.base_db import MessageStatus
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Intent agent memory with a bounded prompt size. The last `max_turns` turns are kept verbatim, older turns are
+# rolled into a running summary by a background task (off the request path) and archived, and bulky payloads
+# (HTML, tables, tool calls and tool outputs) are stripped from messages as they are stored.
+#
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a biomedical data assistant.
+Keep what later questions may refer back to: the data sources, studies, identifiers (e.g. PDC000123, ST000001,
+PXD000001), diseases, genes and metabolites discussed and what the user was trying to find out. Do not include data
+values. Reply with the updated summary only, at most 200 words.
+
+<CurrentSummary>
+{summary}
+</CurrentSummary>
+
+<NewTurns>
+{turns}
+</NewTurns>"""
+
+# Turns beyond max_turns that accumulate before a roll-up is started, so summaries are not rebuilt every turn
+ROLLUP_BATCH_TURNS = 2
+
+HTML_TAG = re.compile(r"<[^>]+>")
+DATA_URI = re.compile(r"data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+")
+TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$", re.M)
+# Chainlit elements and graphs included when a response dict is stringified
+RESPONSE_EXTRAS = re.compile(r",\s*'(elements|graph|graphs)':.*$", re.S)
+
+
+def compact_message(message: ChatMessage, max_chars: int) -> Optional[ChatMessage]:
+    """
+    Returns a text-only copy of the message without bulky payloads, or None for messages that carry no
+    conversational content (tool calls and tool outputs).
+    """
+    if message.role not in ("system", "user", "assistant") or message.additional_kwargs.get("tool_calls"):
+        return None
+    content = message.content or ""
+    if message.role == "assistant":
+        content = RESPONSE_EXTRAS.sub("", content)
+        content = DATA_URI.sub("[data]", content)
+        content = HTML_TAG.sub(" ", content)
+        content = TABLE_ROW.sub("", content)
+        content = re.sub(r"\n{3,}", "\n\n", re.sub(r"[ \t]+", " ", content)).strip()
+        if len(content) > max_chars:
+            content = content[:max_chars].rstrip() + " ... [truncated]"
+    if not content:
+        return None
+    return ChatMessage(role=message.role, content=content)
+
+
+class RollingSummaryMemoryBlock(BaseMemoryBlock[List[ChatMessage]]):
+    """
+    Holds the running summary of the turns rolled out of the intent memory. Returned as a chat message ahead of the
+    chat history, so the static system prefix of the intent prompt stays unchanged.
+    """
+
+    summary: str = Field(default="", description="Summary of the earlier conversation.")
+
+    async def _aget(self, messages: Optional[List[ChatMessage]] = None, **block_kwargs: Any) -> List[ChatMessage]:
+        if not self.summary:
+            return []
+        return [ChatMessage(role="user", content=f"<ChatHistorySummary>\n{self.summary}\n</ChatHistorySummary>")]
+
+    async def _aput(self, messages: List[ChatMessage]) -> None:
+        # updated by BoundedSummaryMemory, not from short term memory
+        pass
+
+
+class BoundedSummaryMemory(Memory):
+    """
+    Memory that keeps the last `max_turns` turns verbatim and summarizes older turns in the background.
+
+    A turn starts at a user message. The system prompt is held outside the chat store and merged into the system
+    message on `aget` exactly as a stored system prompt would be, so rolled turns can simply be archived.
+    """
+
+    max_turns: int = Field(default=6, description="Number of most recent turns kept verbatim.")
+    max_message_chars: int = Field(default=2000, description="Maximum characters kept of an assistant message.")
+    system_message: Optional[ChatMessage] = Field(default=None, description="System prompt, always kept.")
+    summary_llm: Optional[LLM] = Field(default=None, exclude=True, description="LLM used to summarize older turns.")
+
+    _rollup_task: Optional[asyncio.Task] = PrivateAttr(default=None)
+
+    @property
+    def summary_block(self) -> Optional[RollingSummaryMemoryBlock]:
+        return next((b for b in self.memory_blocks if isinstance(b, RollingSummaryMemoryBlock)), None)
+
+    async def aget(self, **block_kwargs: Any) -> List[ChatMessage]:
+        messages = await super().aget(**block_kwargs)
+        if self.system_message is None:
+            return messages
+        system_idx = next((i for i, m in enumerate(messages) if m.role == "system"), None)
+        if system_idx is None:
+            return [self.system_message.model_copy(), *messages]
+        # memory block content goes ahead of the system prompt, as for a system prompt stored in the chat history
+        messages[system_idx].blocks = [*messages[system_idx].blocks, *self.system_message.blocks]
+        return messages
+
+    async def areset_session(self, session_id: str) -> None:
+        """Clear the chat history and summary and bind the memory to another session (pooled agents)."""
+        if self._rollup_task is not None and not self._rollup_task.done():
+            self._rollup_task.cancel()
+        await self.sql_store.delete_messages(self.session_id)
+        self.session_id = session_id
+        if self.summary_block is not None:
+            self.summary_block.summary = ""
+
+    async def aput(self, message: ChatMessage) -> None:
+        await self.aput_messages([message])
+
+    async def aput_messages(self, messages: List[ChatMessage]) -> None:
+        compacted = [m for m in (compact_message(m, self.max_message_chars) for m in messages) if m is not None]
+        if not compacted:
+            return
+        await super().aput_messages(compacted)
+        self._schedule_rollup()
+
+    def _schedule_rollup(self) -> None:
+        if self.summary_llm is None or self.summary_block is None:
+            return
+        if self._rollup_task is not None and not self._rollup_task.done():
+            return
+        self._rollup_task = asyncio.create_task(self._rollup())
+
+    async def _rollup(self) -> None:
+        """Summarize the turns older than `max_turns` into the summary block and archive them."""
+        try:
+            messages = await self.sql_store.get_messages(self.session_id, status=MessageStatus.ACTIVE)
+            turn_starts = [i for i, m in enumerate(messages) if m.role == "user"]
+            if len(turn_starts) <= self.max_turns + ROLLUP_BATCH_TURNS:
+                return
+
+            rolled = messages[:turn_starts[-self.max_turns]]
+            turns = "\n".join(f"{m.role}: {m.content}" for m in rolled)
+            block = self.summary_block
+            prompt = SUMMARY_PROMPT.format(summary=block.summary or "(none)", turns=turns)
+            response = await self.summary_llm.acomplete(prompt)
+
+            # messages are only appended while summarizing, so the oldest messages are still the rolled ones
+            archived = await self.sql_store.archive_oldest_messages(self.session_id, len(rolled))
+            if archived != rolled:
+                logger.warning("[IntentMemory] Chat history changed during roll-up.")
+            block.summary = response.text.strip()
+            logger.info(f"[IntentMemory] Rolled {len(archived)} messages into the summary; "
+                        f"{len(messages) - len(archived)} messages kept.")
+        except Exception as e:
+            logger.warning(f"[IntentMemory] Roll-up failed: {e}")
@@ -1,8 +1,10 @@
 import asyncio
-import json
 import time
 import os
+from workflow_config.steps.intent_recognition.context_snapshot import ContextSnapshot, load_snapshot, refresh_snapshot
+from workflow_config.steps.intent_recognition.bounded_memory import BoundedSummaryMemory, RollingSummaryMemoryBlock
 from workflow_config.steps.intent_recognition.structured_intent_chat_engine import StructuredIntentChatEngine
+from llama_index.core.llms import LLM
 from llama_index.core.memory import Memory
 from llama_index.core.memory.memory_blocks import StaticMemoryBlock
 from llama_index.core.prompts import ChatMessage
@@ -27,6 +29,7 @@ DEFAULT_CONTEXT_RETRIEVAL_PROMPT= {
 }
 
 DEFAULT_TOKEN_LIMIT = 300000
+DEFAULT_MAX_TURNS = 6
 
 class ContextAugmentedIntentRecognitionAgent:
     """
@@ -34,7 +37,17 @@ class ContextAugmentedIntentRecognitionAgent:
         from an external knowledge base. This class extends `SimpleChatEngine` by injecting
         static context into the memory using a retriever and synthesizer.
         Uses StructuredIntentChatEngine internally to guarantee safe structured output.
+
+        The static context memory blocks are built once per process (per context cache) and
+        shared by every session; each session only allocates its own chat buffer.
     """
+
+    # Static context memory blocks shared by all instances, keyed by context cache path, with the
+    # snapshot file mtime and version they were built from
+    _shared_memory_blocks: dict[str, tuple[float, str, list[StaticMemoryBlock]]] = {}
+    _shared_memory_lock = asyncio.Lock()
+    # Background context snapshot refreshes, keyed by context cache path
+    _refresh_tasks: dict[str, asyncio.Task] = {}
         
     @classmethod
     async def from_defaults(
@@ -47,6 +60,8 @@ class ContextAugmentedIntentRecognitionAgent:
         context_cache: str = "context_cache.json",
         force_refresh: bool = False,
         session_id: str = None,
+        max_turns: int = DEFAULT_MAX_TURNS,
+        summary_llm: LLM | None = None,
         **kwargs
     ) -> "ContextAugmentedIntentRecognitionAgent":
 
@@ -66,8 +81,11 @@ class ContextAugmentedIntentRecognitionAgent:
             system_prompt (ChatMessage, optional): Initial system prompt to seed memory.
             token_limit (int, optional): Token limit for memory context. Defaults to DEFAULT_TOKEN_LIMIT.
             context_cache (str, optional): Path to cache file for storing/retrieving context. Defaults to "context_cache.json".
-            force_refresh (bool, optional): If True, bypasses cache and re-fetches context. Defaults to False.
+            force_refresh (bool, optional): If True, rebuilds the context snapshot in the background. Defaults to False.
             session_id (str): Unique session identifier used to isolate memory per user session.
+            max_turns (int, optional): Number of recent turns kept verbatim in memory. Defaults to DEFAULT_MAX_TURNS.
+            summary_llm (LLM, optional): LLM used to summarize older turns in the background. If None, older
+                turns are only dropped by the token limit.
             **kwargs: Additional arguments passed to StructuredIntentChatEngine.
 
         Returns:
@@ -84,6 +102,8 @@ class ContextAugmentedIntentRecognitionAgent:
         self.context_retrieval_prompts = context_retrieval_prompts
         self.token_limit = token_limit
         self.session_id = session_id
+        self.max_turns = max_turns
+        self.summary_llm = summary_llm
 
         # Initialize engine and memory
         self._create_engine()
@@ -126,6 +146,17 @@ class ContextAugmentedIntentRecognitionAgent:
     @property
     def memory(self) -> Memory:
         return self._chat_engine.memory
+
+    async def areset_session(self, session_id: str) -> None:
+        """
+        Rebinds a pre-built agent to another session with an empty chat history. The static context memory
+        blocks are kept.
+
+        Args:
+            session_id (str): Session the agent is handed to.
+        """
+        self.session_id = session_id
+        await self.memory.areset_session(session_id)
     
     # ----------------------
     # Internal Methods
@@ -140,84 +171,114 @@ class ContextAugmentedIntentRecognitionAgent:
             response_synthesizer=self.response_synthesizer
         )
 
-    async def _query_kb_for_memory_preload(self, block: str, message: ChatMessage) -> tuple[str, str]:
+    def _schedule_refresh(self, context_cache: str) -> None:
         """
-        Sends a query to the knowledge base to retrieve a response for memory preloading.
-
-        Args:
-            block (str): The name of the memory block associated with the query.
-            message (ChatMessage): The chat message containing the query content.
-
-        Returns:
-            tuple[str, str]: A tuple containing the block name and the response string.
+        Starts a background rebuild of the context snapshot from the knowledge base, unless one is already running
+        for this cache. Running processes pick up the new snapshot once it is written.
         """
-        try:
-            logger.debug(f"Retrieving context: {message.content}")
+        cls = type(self)
+        task = cls._refresh_tasks.get(context_cache)
+        if task is not None and not task.done():
+            return
 
-            start = time.time()
-            response = await self._engine.aquery(message.content)
-            duration = time.time() - start
-            logger.info(f"[TIMER] KB query for block '{block}' took {duration:.2f}s")
+        async def refresh():
+            try:
+                await refresh_snapshot(context_cache, self._engine, self.context_retrieval_prompts)
+            except Exception as e:
+                logger.error(f"Context snapshot refresh failed, keeping current snapshot: {e}")
 
-            return block, response.response
-        except Exception as e:
-            logger.error(f"Error querying for `{block}` query: {message.content}")
-            raise e
+        logger.info(f"Refreshing context snapshot {context_cache} in the background")
+        cls._refresh_tasks[context_cache] = asyncio.create_task(refresh())
 
-    async def _astatic_response(self, force_refresh: bool, context_cache: str) -> dict[str, list[str]]:
+    async def _astatic_response(self, force_refresh: bool, context_cache: str) -> ContextSnapshot:
         """
-        Asynchronously queries the knowledge base using the provided context retrieval prompts
-        and stores the responses in a cache file for reuse.
+        Loads the context snapshot (knowledge base responses for the context retrieval prompts).
 
-        If a cached version exists and `force_refresh` is False, it loads the responses from
-        the cache instead of querying again. Otherwise, it concurrently queries the knowledge
-        base for each prompt and saves the results.
+        Sessions never wait on the knowledge base: with `force_refresh` the snapshot is rebuilt in the
+        background and the current one is served meanwhile. Only when no snapshot exists yet is it built
+        before returning.
 
         Args:
-            force_refresh (bool): Whether to bypass the cache and re-fetch context.
-            context_cache (str): Path to the JSON file used for caching context responses.
+            force_refresh (bool): Whether to rebuild the snapshot from the knowledge base in the background.
+            context_cache (str): Path to the JSON file holding the context snapshot.
 
         Returns:
-            dict[str, list[str]]: A dictionary mapping each memory block name to a list of
+            ContextSnapshot: The current snapshot, mapping each memory block name to a list of
             retrieved response strings.
         """
 
-        if not force_refresh and os.path.exists(context_cache):
-            with open(context_cache, "r") as f:
-                self._context_response = json.load(f)
-                logger.debug("Loaded context from cache.")
-                return self._context_response
+        if os.path.exists(context_cache):
+            if force_refresh:
+                self._schedule_refresh(context_cache)
+            snapshot = load_snapshot(context_cache)
+            logger.debug(f"Loaded context snapshot {snapshot.version} from cache.")
         else:
-            # Run the queries and cache the result
-            tasks = []
-            for block in self.context_retrieval_prompts:
-                for message in self.context_retrieval_prompts[block]:
-                    tasks.append(self._query_kb_for_memory_preload(block, message))
+            logger.warning(f"No context snapshot at {context_cache}, building it from the knowledge base.")
+            snapshot = await refresh_snapshot(context_cache, self._engine, self.context_retrieval_prompts)
 
-            results = await asyncio.gather(*tasks)
+        self._context_response = snapshot.blocks
+        return snapshot
 
-            all_responses = {}
-            for block, response in results:
-                all_responses.setdefault(block, []).append(response)
+    async def _ashared_memory_blocks(self, force_refresh: bool, context_cache: str) -> list[StaticMemoryBlock]:
+        """
+        Returns the static context memory blocks for the given context cache, building them from the
+        context snapshot only once per process and again whenever a new snapshot version is written
+        (hot swap). Sessions created before a swap keep the blocks they started with.
 
-            with open(context_cache, "w") as f:
-                json.dump(all_responses, f)
+        Blocks are returned copy-on-read: each caller gets shallow copies that share the (read-only)
+        static content, so per-session block state can never leak between sessions.
 
-            self._context_response = all_responses
-            return all_responses
+        Args:
+            force_refresh (bool): Whether to rebuild the context snapshot in the background.
+            context_cache (str): Path to the JSON file holding the context snapshot.
 
+        Returns:
+            list[StaticMemoryBlock]: Copies of the shared static context memory blocks.
+        """
+        cls = type(self)
+        async with cls._shared_memory_lock:
+            cached = cls._shared_memory_blocks.get(context_cache)
+            mtime = os.path.getmtime(context_cache) if os.path.exists(context_cache) else None
+            if force_refresh or cached is None or cached[0] != mtime:
+                start = time.time()
+                snapshot = await self._astatic_response(force_refresh=force_refresh,
+                                                        context_cache=context_cache)
+                if cached is not None and cached[1] == snapshot.version:
+                    memory_blocks = cached[2]
+                else:
+                    if cached is not None:
+                        logger.info(f"Context snapshot changed ({cached[1]} -> {snapshot.version}), swapping memory blocks")
+                    logger.debug(f"Creating memory blocks: {', '.join(snapshot.blocks.keys())}")
+                    memory_blocks = []
+                    for block, responses in snapshot.blocks.items():
+                        combined_response = f"### {block}\n" + "\n\n".join(responses)
+                        # consider cleaning up blocks here (proposed prompt):
+                        # Please clean up the following text by removing any sentences or paragraphs where the model says it cannot answer, lacks context, or refuses to provide information. Keep only the informative, helpful, or content-rich parts of the text. 
+                        memory_blocks.append(
+                            StaticMemoryBlock(
+                                name=block,
+                                static_content=combined_response,
+                                priority=1,
+                                accept_short_term_memory=False
+                            )
+                        )
+                    duration = time.time() - start
+                    logger.info(f"[TIMER] Shared static memory blocks built in {duration:.2f}s")
+                cls._shared_memory_blocks[context_cache] = (os.path.getmtime(context_cache), snapshot.version,
+                                                            memory_blocks)
+
+        return [block.model_copy() for block in cls._shared_memory_blocks[context_cache][2]]
 
     async def _astatic_memory(self, force_refresh: bool, context_cache: str, session_id: str) -> Memory:
         """
-        Asynchronously constructs static memory blocks from retrieved context and initializes
-        a Memory object with those blocks and the system prompt.
+        Asynchronously initializes a session Memory object with the shared static context blocks
+        and the system prompt.
 
-        This method uses the context responses (either from cache or fresh retrieval)
-        to build `StaticMemoryBlock` instances, which are then used to create a `Memory`
-        object that supports structured intent recognition.
+        Only the chat buffer is allocated per session; the static context blocks are built once
+        per process by `_ashared_memory_blocks`.
 
         Args:
-            force_refresh (bool): Whether to bypass the cache and re-fetch context.
+            force_refresh (bool): Whether to rebuild the context snapshot in the background.
             context_cache (str): Path to the JSON file used for caching context responses.
             session_id (str): Unique session identifier used to create session-specific memory.
 
@@ -226,31 +287,27 @@ class ContextAugmentedIntentRecognitionAgent:
         """
 
         start = time.time()
-        context_dict = await self._astatic_response(force_refresh=force_refresh,
-                                                    context_cache=context_cache)
-        logger.debug(f"Creating memory blocks: {', '.join(context_dict.keys())}")
-        duration = time.time() - start
-        logger.info(f"[TIMER] _astatic_memory took {duration:.2f}s (memory construction from KB)")
-        memory_blocks = []
-        for block, responses in context_dict.items():
-            combined_response = f"### {block}\n" + "\n\n".join(responses)
-            # consider cleaning up blocks here (proposed prompt):
-            # Please clean up the following text by removing any sentences or paragraphs where the model says it cannot answer, lacks context, or refuses to provide information. Keep only the informative, helpful, or content-rich parts of the text. 
-            memory_blocks.append(
-                StaticMemoryBlock(
-                    name=block,
-                    static_content=combined_response,
-                    priority=1,
-                    accept_short_term_memory=False
-                )
+        memory_blocks = await self._ashared_memory_blocks(force_refresh=force_refresh,
+                                                          context_cache=context_cache)
+
+        # Per-session running summary of the turns rolled out of the verbatim window
+        memory_blocks.append(
+            RollingSummaryMemoryBlock(
+                name="conversation_summary",
+                priority=0,
+                accept_short_term_memory=False
             )
-
-        memory = Memory.from_defaults(
+        )
+        memory = BoundedSummaryMemory.from_defaults(
             memory_blocks=memory_blocks,
-            chat_history=[self.system_prompt],
             token_limit=self.token_limit,
             session_id=session_id
         )
+        memory.system_message = self.system_prompt
+        memory.max_turns = self.max_turns
+        memory.summary_llm = self.summary_llm
+        duration = time.time() - start
+        logger.info(f"[TIMER] _astatic_memory took {duration:.2f}s")
         logger.debug(f"Memory successfully augmented for session: {session_id}")
         return memory
 
@@ -0,0 +1,110 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from pydantic import BaseModel
+from llama_index.core.prompts import ChatMessage
+from llama_index.core.query_engine import BaseQueryEngine
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Versioned snapshots of the static intent context (context_cache.json). Snapshots are built from the context
+# knowledge base by a refresh job, written atomically under a file lock, and picked up by running processes when the
+# file's version changes.
+#
+
+
+class ContextSnapshot(BaseModel):
+    """
+    Static context retrieved from the knowledge base for intent recognition.
+
+    Fields:
+    - version: Content hash of the blocks, changes whenever the context changes.
+    - created_at: UTC time the snapshot was built.
+    - blocks: Memory block name -> retrieved responses.
+    """
+    version: str
+    created_at: str
+    blocks: dict[str, list[str]]
+
+    @classmethod
+    def from_blocks(cls, blocks: dict[str, list[str]], created_at: str | None = None) -> "ContextSnapshot":
+        digest = hashlib.sha256(json.dumps(blocks, sort_keys=True).encode()).hexdigest()
+        return cls(
+            version=digest[:16],
+            created_at=created_at or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            blocks=blocks
+        )
+
+
+def load_snapshot(path: str) -> ContextSnapshot:
+    """Load a snapshot, accepting the unversioned format (a plain block -> responses mapping) as well."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    if "version" in data and "blocks" in data:
+        return ContextSnapshot(**data)
+    created_at = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat(timespec="seconds")
+    return ContextSnapshot.from_blocks(data, created_at=created_at)
+
+
+def write_snapshot(path: str, snapshot: ContextSnapshot) -> None:
+    """
+    Atomically replace the snapshot file. Writers are serialized with an exclusive lock on a sidecar lock file and
+    the new content is written to a temporary file in the same directory, then renamed over the old file, so readers
+    always see a complete snapshot.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".context_cache.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(snapshot.model_dump(), f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    logger.info(f"[ContextSnapshot] Wrote snapshot {snapshot.version} to {path}")
+
+
+async def build_snapshot(engine: BaseQueryEngine, context_retrieval_prompts: dict[str, list[ChatMessage]]
+                         ) -> ContextSnapshot:
+    """Query the knowledge base concurrently with every context retrieval prompt and build a snapshot."""
+
+    async def query(block: str, message: ChatMessage) -> tuple[str, str]:
+        start = time.time()
+        response = await engine.aquery(message.content)
+        logger.info(f"[TIMER] KB query for block '{block}' took {time.time() - start:.2f}s")
+        return block, response.response
+
+    results = await asyncio.gather(*[
+        query(block, message)
+        for block, messages in context_retrieval_prompts.items()
+        for message in messages
+    ])
+    blocks = {}
+    for block, response in results:
+        blocks.setdefault(block, []).append(response)
+    return ContextSnapshot.from_blocks(blocks)
+
+
+async def refresh_snapshot(path: str, engine: BaseQueryEngine,
+                           context_retrieval_prompts: dict[str, list[ChatMessage]]) -> ContextSnapshot:
+    """Rebuild the snapshot from the knowledge base and write it, unless the content is unchanged."""
+    snapshot = await build_snapshot(engine, context_retrieval_prompts)
+    if os.path.exists(path) and load_snapshot(path).version == snapshot.version:
+        logger.info(f"[ContextSnapshot] Context unchanged ({snapshot.version}), keeping {path}")
+        return snapshot
+    await asyncio.to_thread(write_snapshot, path, snapshot)
+    return snapshot
@@ -0,0 +1,113 @@
+import re
+from typing import Optional
+from workflow_config.steps.intent_recognition.intent import AvailableSources, Intent
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Rule based intent pre-classifier. Decides the obvious cases (lookups of accession identifiers, harmonization
+# requests) from surface features of the query and returns a confident Intent without calling the intent LLM.
+# Anything ambiguous returns None and goes to the structured LLM.
+#
+
+# Accession identifiers that pin a query to a data source. Case-sensitive, like the identifiers themselves
+ACCESSION_PATTERNS = {
+    AvailableSources.PX: re.compile(r"\bPXD\d{6}\b"),
+    AvailableSources.MWB: re.compile(r"\b(ST|PR)\d{6}\b"),
+    AvailableSources.PDC: re.compile(r"\bPDC\d{6}\b"),
+    AvailableSources.GDC: re.compile(r"\bTCGA-[A-Z]{2,4}\b"),
+}
+# Source acronyms, case-sensitive. They may accompany an accession of the same source ("PDC000120 in PDC") but never
+# select a source on their own ("What is the PDC?" asks about the source, not for its data)
+ACRONYM_PATTERNS = {
+    AvailableSources.MWB: re.compile(r"\bMWB\b"),
+    AvailableSources.PDC: re.compile(r"\bPDC\b"),
+    AvailableSources.GDC: re.compile(r"\bGDC\b"),
+    AvailableSources.IDC: re.compile(r"\bIDC\b"),
+}
+# Any mention of a source, used to leave harmonization requests that name a source to the LLM
+SOURCE_MENTION_PATTERN = re.compile(
+    r"\b(PXD\d{6}|ST\d{6}|PR\d{6}|PDC\d{6}|TCGA-[A-Z]{2,4}|proteome ?xchange|proteome exchange|PRIDE|"
+    r"metabolomics workbench|MWB|proteomic data commons|PDC|genomic data commons|GDC|imaging data commons|IDC)\b",
+    re.I
+)
+# Words that carry no topic of their own in an accession lookup ("Show me the details of study ST000001"). A query
+# with any other word has content beyond the lookup (a comparison, a disease, another source) and goes to the LLM
+LOOKUP_WORDS = {
+    "a", "an", "the", "me", "us", "i", "we", "please", "can", "could", "would", "you", "show", "get", "give", "find",
+    "fetch", "retrieve", "list", "describe", "summarize", "summarise", "tell", "explain", "what", "which", "is", "are",
+    "about", "for", "of", "on", "in", "from", "and", "details", "detail", "information", "info", "summary", "overview",
+    "metadata", "study", "studies", "project", "projects", "dataset", "datasets", "data", "accession", "its", "this",
+    "s", "look", "up",
+}
+
+PLOT_PATTERN = re.compile(
+    r"\b(plot|chart|graph|heat ?map|histogram|scatter|bar ?chart|pie ?chart|visuali[sz]e|visuali[sz]ation)s?\b", re.I
+)
+
+# A harmonization request needs both a harmonization verb and a reference to the user's own data, since the verbs
+# alone also describe public data ("standardized PDC data", "studies uploaded in 2023")
+HARMONIZATION_VERB_PATTERN = re.compile(
+    r"\b(harmoni[sz]\w*|standardi[sz]\w*|upload\w*|schema match\w*|align)\b", re.I
+)
+OWN_DATA_PATTERN = re.compile(
+    r"\b(my|our) (own )?(data|dataset|datasets|file|files|table|tables|spreadsheet|csv|columns)\b", re.I
+)
+
+# Sources the plotting step (graph_query) can retrieve data from
+PLOTTABLE_SOURCES = {AvailableSources.PDC, AvailableSources.GDC}
+
+
+def pre_classify(query: str) -> Optional[Intent]:
+    """
+    Returns a confident Intent for queries whose intent is evident from their surface features, or None.
+
+    - A harmonization verb (harmonize, standardize, upload, align) together with the user's own data ("my data",
+      "our file") and no source mention -> harmonization Intent. With a source ("harmonize my data to GDC") the query
+      is left to the LLM.
+    - A lookup of accession identifiers of a single source (PXD..., ST..., PR..., PDC..., TCGA-...) with no other
+      topical content -> that source, with the query as its context. A plot cue is only accepted if the plotting step
+      supports the source.
+    """
+    if HARMONIZATION_VERB_PATTERN.search(query) and OWN_DATA_PATTERN.search(query):
+        if SOURCE_MENTION_PATTERN.search(query):
+            return None
+        logger.info("[IntentPreClassifier] Harmonization request.")
+        return Intent(
+            off_topic=False,
+            off_topic_reply=None,
+            context_enriched_query=None,
+            harmonization=True,
+            plot=False,
+            sources=[],
+            reply=None,
+            source_contexts={}
+        )
+
+    accession_sources = {source for source, pattern in ACCESSION_PATTERNS.items() if pattern.search(query)}
+    acronym_sources = {source for source, pattern in ACRONYM_PATTERNS.items() if pattern.search(query)}
+    # several sources need a context per source, which only the LLM can split out of the query
+    if len(accession_sources) != 1 or not acronym_sources <= accession_sources:
+        return None
+    source = accession_sources.pop()
+
+    rest = query
+    for pattern in [ACCESSION_PATTERNS[source], *ACRONYM_PATTERNS.values()]:
+        rest = pattern.sub(" ", rest)
+    plot = bool(PLOT_PATTERN.search(rest))
+    if plot and source in PLOTTABLE_SOURCES:
+        rest = PLOT_PATTERN.sub(" ", rest)
+    if any(word not in LOOKUP_WORDS for word in re.findall(r"[a-z]+", rest.lower())):
+        return None
+
+    logger.info(f"[IntentPreClassifier] Source: {source.value}; plot={plot}")
+    return Intent(
+        off_topic=False,
+        off_topic_reply=None,
+        context_enriched_query=None,
+        harmonization=False,
+        plot=plot,
+        sources=[source],
+        reply=None,
+        source_contexts={source: query}
+    )
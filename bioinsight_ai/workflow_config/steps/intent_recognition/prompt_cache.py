@@ -0,0 +1,75 @@
+import threading
+from llama_index.llms.bedrock_converse import BedrockConverse
+from types import MethodType
+from log_helper.logger import get_logger
+logger = get_logger()
+
+# Bedrock Converse cache checkpoint. Everything before the checkpoint (tool config and system prompt, which for the
+# intent agent holds the static context blocks) is cached by Bedrock and re-read at a reduced cost on later calls.
+# See https://docs.aws.amazon.com/bedrock/latest/userguide/prompt-caching.html
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+
+class PromptCacheMetrics:
+    """
+    Process-wide prompt cache counters for an LLM, accumulated from the `usage` block of Bedrock Converse responses.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_write_input_tokens = 0
+
+    def record(self, usage: dict) -> None:
+        read = usage.get("cacheReadInputTokens", 0) or 0
+        write = usage.get("cacheWriteInputTokens", 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.cache_hits += int(read > 0)
+            self.input_tokens += usage.get("inputTokens", 0) or 0
+            self.cache_read_input_tokens += read
+            self.cache_write_input_tokens += write
+            hit_rate = self.cache_hits / self.requests
+        logger.info(f"[{self.label} prompt cache] input={usage.get('inputTokens', 0)} cache_read={read} "
+                    f"cache_write={write} hit_rate={hit_rate:.2f}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "hit_rate": round(self.cache_hits / self.requests, 4) if self.requests else 0.0,
+                "input_tokens": self.input_tokens,
+                "cache_read_input_tokens": self.cache_read_input_tokens,
+                "cache_write_input_tokens": self.cache_write_input_tokens,
+            }
+
+
+def extend_response_token_counts(llm_instance: BedrockConverse, metrics: PromptCacheMetrics):
+    """
+    Monkey-patches the `_get_response_token_counts` method of a BedrockConverse LLM so the prompt cache read/write
+    token counts are reported alongside the regular token counts and recorded in `metrics`.
+
+    Only complete (non-streaming) responses carry a top-level `usage` block, so each call is recorded once.
+    """
+
+    original_method = llm_instance._get_response_token_counts
+
+    def wrapped_get_response_token_counts(self, response=None):
+        token_counts = original_method(response)
+        usage = response.get("usage") if isinstance(response, dict) else None
+        if usage:
+            metrics.record(usage)
+            token_counts["cache_read_input_tokens"] = usage.get("cacheReadInputTokens", 0)
+            token_counts["cache_write_input_tokens"] = usage.get("cacheWriteInputTokens", 0)
+        return token_counts
+
+    llm_instance._get_response_token_counts = MethodType(wrapped_get_response_token_counts, llm_instance)
+
+
+# Prompt cache metrics for the intent recognition LLM
+intent_prompt_cache_metrics = PromptCacheMetrics(label="Intent")
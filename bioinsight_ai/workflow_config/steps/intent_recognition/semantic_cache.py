@@ -0,0 +1,136 @@
+import asyncio
+import re
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from config import INTENT_CACHE_MAX_ENTRIES, INTENT_CACHE_MODEL, INTENT_CACHE_THRESHOLD
+from workflow_config.steps.intent_recognition.intent import Intent
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Semantic cache of recognized intents. Queries are normalized and embedded with a small local sentence embedding
+# model; the routing of an Intent recognized for one query (sources, plot, harmonization) is reused for later queries
+# whose embedding is close enough (cosine similarity above the threshold), skipping the structured intent LLM call.
+# Fields written for the query itself (source contexts, enriched query, replies) are never reused.
+#
+
+# Intent fields that only describe how a query is routed, the part of an Intent that is cached
+ROUTING_FIELDS = ("off_topic", "harmonization", "plot", "sources")
+
+# Words that usually refer back to earlier turns ("tell me more about that study", "plot them"). Queries containing
+# them need the conversation history and are never answered from the cache.
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|they|them|their|those|these|that|this|same|above|previous|previously|earlier|again|more|also|"
+    r"instead|another|other|first|second|last|former|latter)\b"
+)
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, drop punctuation (keeping identifiers such as PDC000123 intact) and collapse whitespace."""
+    query = re.sub(r"[^\w\s]", " ", query.casefold())
+    return " ".join(query.split())
+
+
+def needs_conversation_context(query: str, has_history: bool) -> bool:
+    """
+    Returns True when the intent for the query may depend on earlier turns. The first query of a conversation never
+    does; later queries do when they are very short or refer back to something.
+    """
+    if not has_history:
+        return False
+    normalized = normalize_query(query)
+    return len(normalized.split()) < 3 or bool(FOLLOW_UP_PATTERN.search(normalized))
+
+
+class SemanticIntentCache:
+    """
+    In-memory nearest neighbour index of query embeddings to recognized intents, shared by all sessions.
+
+    Embeddings are L2-normalized, so cosine similarity is a dot product against the embedding matrix. Entries are
+    evicted least-recently-used once max_entries is reached.
+    """
+
+    def __init__(self, model_name: str, threshold: float, max_entries: int):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._model: Optional[SentenceTransformer] = None
+        self._model_lock = asyncio.Lock()
+        # normalized query -> (embedding, routing fields of its intent)
+        self._entries: OrderedDict[str, tuple[np.ndarray, dict]] = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list[str] = []
+
+    async def _embed(self, text: str) -> np.ndarray:
+        async with self._model_lock:
+            if self._model is None:
+                logger.info(f"[IntentCache] Loading embedding model {self.model_name}")
+                self._model = await asyncio.to_thread(SentenceTransformer, self.model_name, device="cpu")
+        return await asyncio.to_thread(self._model.encode, text, normalize_embeddings=True)
+
+    def _rebuild_index(self) -> None:
+        self._keys = list(self._entries.keys())
+        self._matrix = np.vstack([embedding for embedding, _ in self._entries.values()]) if self._keys else None
+
+    @staticmethod
+    def _intent_for(query: str, routing: dict) -> Intent:
+        """Intent for the query with cached routing, each source getting the query itself as its context."""
+        return Intent(
+            **routing,
+            off_topic_reply=None,
+            context_enriched_query=None,
+            reply=None,
+            source_contexts={source: query for source in routing["sources"]}
+        )
+
+    async def lookup(self, query: str) -> Optional[Intent]:
+        """Returns an Intent with the routing of the most similar cached query, or None if none is similar enough."""
+        key = normalize_query(query)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            logger.info(f"[IntentCache] Exact hit for '{key}'")
+            return self._intent_for(query, self._entries[key][1])
+        if self._matrix is None:
+            return None
+
+        embedding = await self._embed(key)
+        # the index may have been rebuilt while embedding, so read it once
+        keys, matrix = self._keys, self._matrix
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            logger.debug(f"[IntentCache] Miss for '{key}' (closest '{keys[best]}', {scores[best]:.3f})")
+            return None
+
+        logger.info(f"[IntentCache] Hit for '{key}' -> '{keys[best]}' ({scores[best]:.3f})")
+        entry = self._entries.get(keys[best])
+        if entry is None:
+            return None
+        self._entries.move_to_end(keys[best])
+        return self._intent_for(query, entry[1])
+
+    async def store(self, query: str, intent: Intent) -> None:
+        """
+        Caches the routing of an intent. Off-topic and direct-reply intents (no sources, no harmonization) are not
+        cached, since their replies are written for the query.
+        """
+        key = normalize_query(query)
+        if not key or intent.off_topic or not (intent.sources or intent.harmonization):
+            return
+        embedding = await self._embed(key)
+        routing = {field: getattr(intent, field) for field in ROUTING_FIELDS}
+        routing["sources"] = list(routing["sources"])
+        self._entries[key] = (embedding, routing)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._rebuild_index()
+
+
+intent_cache = SemanticIntentCache(
+    model_name=INTENT_CACHE_MODEL,
+    threshold=INTENT_CACHE_THRESHOLD,
+    max_entries=INTENT_CACHE_MAX_ENTRIES
+)
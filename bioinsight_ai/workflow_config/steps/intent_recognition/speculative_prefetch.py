@@ -0,0 +1,60 @@
+import re
+from typing import Iterable
+from data_sources.cancer_research_data_commons.proteomic_data_commons.pdc_api import get_study_name
+from data_sources.metabolomics_workbench.mwb.tools import fetch_rest_endpoint
+from data_sources.proteome_exchange.tools import get_data_from_proteome_exchange
+from utils.prefetch_cache import prefetch_cache
+from workflow_config.steps.intent_recognition.intent import AvailableSources
+from log_helper.logger import get_logger
+logger = get_logger()
+
+#
+# Speculative source retrieval. While the intent LLM runs, accession identifiers in the query are used to guess the
+# sources that will be queried, and the lookups their agents make first are started in the background. Each call is
+# a cached, side-effect-free GET (see utils.prefetch_cache), so when the intent agrees the source agent picks up the
+# in-flight result; otherwise the speculative calls are cancelled.
+#
+
+MWB_STUDY_SUMMARY = "https://www.metabolomicsworkbench.org/rest/study/study_id/{study_id}/summary/json"
+
+# Source -> (accession pattern, memoized lookup, function building the lookup arguments from an accession)
+SPECULATIVE_LOOKUPS = {
+    AvailableSources.PX: (re.compile(r"\bPXD\d{6}\b", re.I), get_data_from_proteome_exchange,
+                          lambda accession: (accession,)),
+    AvailableSources.MWB: (re.compile(r"\bST\d{6}\b", re.I), fetch_rest_endpoint,
+                           lambda accession: (MWB_STUDY_SUMMARY.format(study_id=accession),)),
+    AvailableSources.PDC: (re.compile(r"\bPDC\d{6}\b", re.I), get_study_name,
+                           lambda accession: (accession,)),
+}
+
+
+class SpeculativePrefetch:
+    """Handle on the speculative lookups started for one query."""
+
+    def __init__(self, handles: dict[AvailableSources, list]):
+        self.handles = handles
+
+    @classmethod
+    def start(cls, query: str) -> "SpeculativePrefetch":
+        """Start the lookups for every accession identifier in the query. Must be called from the event loop."""
+        handles = {}
+        for source, (pattern, lookup, lookup_args) in SPECULATIVE_LOOKUPS.items():
+            accessions = dict.fromkeys(match.upper() for match in pattern.findall(query))
+            started = [prefetch_cache.prefetch(lookup, *lookup_args(accession)) for accession in accessions]
+            started = [handle for handle in started if handle is not None]
+            if started:
+                handles[source] = started
+        if handles:
+            logger.info(f"[SpeculativePrefetch] Started lookups for: {', '.join(s.value for s in handles)}")
+        return cls(handles)
+
+    def resolve(self, sources: Iterable[AvailableSources]) -> None:
+        """Keep the lookups for the sources the intent selected and cancel the rest."""
+        sources = set(sources)
+        for source, handles in self.handles.items():
+            if source in sources:
+                logger.info(f"[SpeculativePrefetch] Intent agrees on {source.value}, keeping {len(handles)} lookups")
+                continue
+            for handle in handles:
+                prefetch_cache.cancel(handle)
+        self.handles = {}
@@ -18,9 +18,12 @@ class StructuredIntentChatEngine(SimpleChatEngine):
         user_msg = ChatMessage(role="user", content=message)
         await self.memory.aput(user_msg)
 
-        chat_history = await self.memory.aget() # aget returns memory blocks, unlike aget_all()
+        # aget returns memory blocks, unlike aget_all(). The static context blocks and system prompt form a single
+        # system message that is identical on every call (the prompt-cached prefix), followed by the chat history,
+        # which already ends with the user message
+        chat_history = await self.memory.aget()
         prompt = ChatPromptTemplate(
-            message_templates=[*chat_history, user_msg]
+            message_templates=chat_history
         )
 
         #  time just the LLM prediction
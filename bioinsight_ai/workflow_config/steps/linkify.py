@@ -0,0 +1,91 @@
+import re
+
+#
+# Deterministic post-processing of source answers. Study and project identifiers and bare URLs are turned into
+# markdown links, leaving text that is already linked (markdown links, HTML anchors, autolinks) or code untouched.
+# The result is markdown, which Chainlit renders (HTML anchors included, see unsafe_allow_html in .chainlit/config.toml).
+#
+
+# Identifier pattern -> URL template, {id} is replaced with the matched identifier
+IDENTIFIER_LINKS = {
+    # Proteomic Data Commons study IDs, e.g. PDC000127
+    re.compile(r"\bPDC\d{6}\b"): "https://pdc.cancer.gov/pdc/study/{id}",
+    # ProteomeXchange dataset IDs, e.g. PXD000001
+    re.compile(r"\bPXD\d{6}\b"): "https://proteomecentral.proteomexchange.org/cgi/GetDataset?ID={id}",
+    # Metabolomics Workbench study IDs, e.g. ST000001
+    re.compile(r"\bST\d{6}\b"): "https://metabolomicsworkbench.org/data/DRCCMetadata.php?Mode=Study&StudyID={id}",
+    # Genomic Data Commons project IDs, e.g. TCGA-BRCA, CPTAC-3. Barcodes such as TCGA-A1-A0SB are not projects.
+    re.compile(
+        r"\b(?:TCGA|TARGET|CPTAC|CGCI|HCMI|MMRF|BEATAML1\.0|CMI|FM|NCICCR|OHSU|ORGANOID|REBC|VAREPOP|WCDT|APOLLO|"
+        r"MP2PRT|CDDP|TRIO|EXCEPTIONAL_RESPONDERS)-[A-Z0-9_]+\b(?![-.]\w)"
+    ): "https://portal.gdc.cancer.gov/projects/{id}",
+}
+
+# Spans that must not be rewritten: code, HTML anchors, any other HTML tag (URLs in attributes such as
+# <img src="...">), markdown links/images and autolinks
+PROTECTED_SPANS = re.compile(
+    r"```.*?```"
+    r"|`[^`\n]*`"
+    r"|<a\b[^>]*>.*?</a>"
+    r"|</?[a-z][\w-]*(?:\s(?:[^<>\"']|\"[^\"]*\"|'[^']*')*)?/?>"
+    r"|!?\[[^\]\n]*\]\([^)\s]*(?:\s+\"[^\"]*\")?\)"
+    r"|<https?://[^>\s]+>",
+    re.S | re.I
+)
+
+BARE_URL = re.compile(r"https?://[^\s<>\"'`]+")
+# Punctuation that ends a sentence rather than the URL
+URL_TRAILING_PUNCTUATION = ".,;:!?"
+
+
+def _link_url(match: re.Match) -> str:
+    url = match.group(0)
+    trailing = ""
+    while url and (url[-1] in URL_TRAILING_PUNCTUATION or (url[-1] == ")" and url.count("(") < url.count(")"))):
+        trailing = url[-1] + trailing
+        url = url[:-1]
+    return f"[{url}]({url}){trailing}"
+
+
+def _linkify_plain(text: str) -> str:
+    """Link identifiers and bare URLs in text without any existing links."""
+    # URLs first, the identifiers inside them (e.g. ?ID=PXD000001) are then protected by the markdown link
+    parts = []
+    last = 0
+    for match in BARE_URL.finditer(text):
+        parts.append(_linkify_identifiers(text[last:match.start()]))
+        parts.append(_link_url(match))
+        last = match.end()
+    parts.append(_linkify_identifiers(text[last:]))
+    return "".join(parts)
+
+
+# Single pass over all identifier patterns, so a generated link is never rewritten by another pattern
+IDENTIFIER = re.compile("|".join(f"(?P<id{i}>{pattern.pattern})" for i, pattern in enumerate(IDENTIFIER_LINKS)))
+IDENTIFIER_URLS = {f"id{i}": url for i, url in enumerate(IDENTIFIER_LINKS.values())}
+
+
+def _link_identifier(match: re.Match) -> str:
+    identifier = match.group(0)
+    return f"[{identifier}]({IDENTIFIER_URLS[match.lastgroup].format(id=identifier)})"
+
+
+def _linkify_identifiers(text: str) -> str:
+    return IDENTIFIER.sub(_link_identifier, text)
+
+
+def linkify(text: str) -> str:
+    """
+    Returns the text with PDC, PX, Metabolomics Workbench and GDC project identifiers and bare URLs linked.
+    Idempotent: linked identifiers are not linked again.
+    """
+    if not text:
+        return text
+    parts = []
+    last = 0
+    for match in PROTECTED_SPANS.finditer(text):
+        parts.append(_linkify_plain(text[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(_linkify_plain(text[last:]))
+    return "".join(parts)
@@ -12,6 +12,8 @@ class MWBOutput(AgentOutput):
         Convert an AgentWorkflow output object, AgentOutput, to a subclass with extension for specific Metabolomics Workbench post-processing.
         """
         instance = cls.model_validate(output.model_dump())
+        # validation turns ToolCallResults into ToolSelections, dropping the tool outputs that carry UI elements
+        instance.tool_calls = list(output.tool_calls)
         instance._hyperlink_study_ids()
         instance._fetch_elements()
         instance._hyperlink_PNG_URLs()